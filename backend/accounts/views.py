@@ -11,6 +11,8 @@ from .serializers import (
     EmailTokenObtainPairSerializer
 )
 from .models import User
+from config.instrumentation import InstrumentedViewMixin
+from config.pagination import CreatedAtCursorPagination
 
 
 class MeView(generics.RetrieveAPIView):
@@ -75,7 +77,12 @@ class IsOwnerOrAdmin(permissions.BasePermission):
         return obj == request.user
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserDirectoryPagination(CreatedAtCursorPagination):
+    """Directory order (name, then email)"""
+    ordering = ('first_name', 'last_name', 'email')
+
+
+class UserViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and managing user profiles (directory).
     
@@ -87,6 +94,7 @@ class UserViewSet(viewsets.ModelViewSet):
     
     queryset = User.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UserDirectoryPagination
     
     def get_serializer_class(self):
         if self.action == 'list':
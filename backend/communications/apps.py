@@ -5,3 +5,10 @@ class CommunicationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'communications'
 
+    def ready(self):
+        from . import signals, snowflake, write_behind  # noqa: F401
+
+        if write_behind.enabled():
+            # Refuse to start rather than hand out clashing message ids
+            snowflake.worker_id()
+            write_behind.install_exit_handler()
@@ -0,0 +1,126 @@
+"""
+JWT authentication for WebSocket handshakes.
+
+``JWTAuthMiddleware`` reads ``?token=`` and sets ``scope["user"]``. Access
+tokens are verified in-process (signature and expiry need no database), and
+the user behind a token is loaded once and then served from a per-process
+cache keyed by user id and token ``jti`` for ``WS_AUTH_CACHE_TTL`` seconds,
+so a reconnect storm does not queue a user query per socket on the thread
+pool.
+
+Saving or deleting a user drops their cached entries in this process (see
+``signals``); other processes, and ``QuerySet.update()`` writes, which send
+no signals, catch up within the TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+def cache_ttl():
+    return getattr(settings, 'WS_AUTH_CACHE_TTL', 60)
+
+
+def cache_max_users():
+    return getattr(settings, 'WS_AUTH_CACHE_USERS', 10000)
+
+
+_lock = threading.Lock()
+# user id -> {jti: (expires at, user)}, least recently used user first
+_cache = OrderedDict()
+# Bumped on every invalidation so a load that raced with it is not cached
+_versions = {}
+
+
+def _cached(user_id, jti):
+    with _lock:
+        entries = _cache.get(user_id)
+        if not entries or jti not in entries:
+            return None
+        expires, user = entries[jti]
+        if expires <= time.monotonic():
+            del entries[jti]
+            return None
+        _cache.move_to_end(user_id)
+        return user
+
+
+def _store(user_id, jti, user, version):
+    with _lock:
+        if _versions.get(user_id, 0) != version:
+            return
+        entries = _cache.setdefault(user_id, {})
+        entries[jti] = (time.monotonic() + cache_ttl(), user)
+        _cache.move_to_end(user_id)
+        while len(_cache) > cache_max_users():
+            _cache.popitem(last=False)
+
+
+def invalidate_user(user_id):
+    """Forget the cached handshakes of ``user_id`` (deactivated, deleted or edited)"""
+    user_id = str(user_id)
+    with _lock:
+        _cache.pop(user_id, None)
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+@database_sync_to_async
+def _load_user(token):
+    try:
+        return JWTAuthentication().get_user(token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def get_user(raw_token):
+    """The active user ``raw_token`` belongs to, or AnonymousUser"""
+    if not raw_token:
+        return AnonymousUser()
+    try:
+        token = JWTAuthentication().get_validated_token(raw_token)
+    except InvalidToken:
+        return AnonymousUser()
+
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    jti = token.get(api_settings.JTI_CLAIM)
+    if user_id is None or jti is None:
+        user = await _load_user(token)
+        return user or AnonymousUser()
+
+    # The claim may be an int or a string depending on how the token was issued
+    user_id = str(user_id)
+    user = _cached(user_id, jti)
+    if user is None:
+        version = _versions.get(user_id, 0)
+        user = await _load_user(token)
+        if user is None:
+            return AnonymousUser()
+        _store(user_id, jti, user, version)
+    return user
+
+
+def _token_from(scope):
+    values = parse_qs(scope.get("query_string", b"").decode()).get("token", [])
+    return values[0] if values else None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Populates scope["user"] from the ?token= query parameter"""
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope, user=await get_user(_token_from(scope)))
+        return await super().__call__(scope, receive, send)
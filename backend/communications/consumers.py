@@ -1,119 +1,270 @@
+import asyncio
 import json
+import re
+from collections import deque
+from datetime import datetime
 from urllib.parse import parse_qs
 
-import redis.asyncio as aioredis
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 
-from .models import ChatMessage
+from .models import ChatMessage, ConversationMember
+from . import framing, history, inbox, outbox, presence, snowflake, throttle, write_behind
 
 
-User = get_user_model()
+ROOM_KEY_RE = re.compile(r"\d+_\d+")
 
 
-class ChatConsumer(AsyncJsonWebsocketConsumer):
+class BaseChatConsumer(AsyncJsonWebsocketConsumer):
     """
-    WebSocket consumer for real-time messaging.
-    - Authenticate via JWT token supplied as query param (?token=...)
+    Authentication, presence and chat plumbing shared by the chat endpoints.
+    - Authenticated by JWTAuthMiddleware from the ?token=... query param
     - Room key is a string built from the two participant IDs, sorted: "<min>_<max>"
-    - Only participants in the room key are allowed to connect/send
+    - Every socket joins user_<id> and the presence groups of the users it watches
+    - Inbound frames and messages are rate limited; outbound frames go through a
+      bounded queue (see communications.throttle)
+    - JSON text frames, or msgpack with the chat.msgpack subprotocol (see communications.framing)
     """
 
-    async def connect(self):
-        self.room = str(self.scope["url_route"]["kwargs"]["room"])
-        token = self._get_token_from_scope()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frame_bucket = throttle.frame_bucket()
+        self.packed = False
 
-        self.user = await self._authenticate(token)
-        if not self.user:
-            await self.close(code=4001)
-            return
+    async def _accept(self):
+        """Accept the socket, in msgpack framing if the client offered it"""
+        self.packed = framing.SUBPROTOCOL in self.scope.get("subprotocols", ()) and framing.available()
+        await self.accept(subprotocol=framing.SUBPROTOCOL if self.packed else None)
 
-        if not self._is_user_in_room(self.room, self.user.id):
-            await self.close(code=4003)
-            return
-
-        self.group_name = f"chat_{self.room}"
+    async def _start_session(self, rooms=()):
+        """Join the per-user group, watch conversation partners and count this socket as online"""
         self.user_group = f"user_{self.user.id}"
-        self.presence_group = "presence"
+        self.watched = set()
+        self.presence_pending = {}
+        self.presence_flush = None
 
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
         # Join a per-user group so we can broadcast deletions/presence even when not in this room
         await self.channel_layer.group_add(self.user_group, self.channel_name)
-        await self.channel_layer.group_add(self.presence_group, self.channel_name)
+        # Presence of conversation partners only, not the whole division
+        await self._watch(await self._conversation_partners(rooms))
 
         online_now = await self._mark_online(self.user.id)
+        self.presence_counted = True
+        presence.get_sweeper().add(self.user.id, self.channel_name)
         if online_now:
             await self._broadcast_presence(self.user.id, "online")
 
-        await self.accept()
-
-        # send recent history
-        history = await self._get_recent_messages()
-        for msg in history:
-            await self.send_json(self._serialize_message(msg))
-        await self._send_presence_snapshot()
-
-    async def disconnect(self, close_code):
-        if hasattr(self, "group_name"):
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+    async def _end_session(self):
         if hasattr(self, "user_group"):
             await self.channel_layer.group_discard(self.user_group, self.channel_name)
-        if hasattr(self, "presence_group"):
-            await self.channel_layer.group_discard(self.presence_group, self.channel_name)
-
+        for user_id in getattr(self, "watched", ()):
+            await self.channel_layer.group_discard(presence.presence_group(user_id), self.channel_name)
+        if getattr(self, "presence_flush", None):
+            self.presence_flush.cancel()
+        if getattr(self, "writer_task", None):
+            self.writer_task.cancel()
+
+        # Only release the presence count this socket actually took
+        if not getattr(self, "presence_counted", False):
+            return
+        self.presence_counted = False
+        presence.get_sweeper().remove(self.user.id, self.channel_name)
         went_offline = await self._mark_offline(self.user.id)
         if went_offline:
             await self._broadcast_presence(self.user.id, "offline")
 
-    async def receive_json(self, content, **kwargs):
-        text = (content.get("text") or "").strip()
-        if not text or not getattr(self, "user", None):
+    async def _handle_control(self, content):
+        """Heartbeat and presence subscription frames; returns True if ``content`` was one"""
+        if content.get("type") == "heartbeat":
+            # Keeps presence alive; no reply
+            if getattr(self, "presence_counted", False):
+                back_online = await presence.get_store().touch(self.user.id, self.channel_name)
+                if back_online:
+                    await self._broadcast_presence(self.user.id, "online")
+            return True
+
+        if content.get("type") in ("presence.subscribe", "presence.unsubscribe"):
+            if getattr(self, "presence_counted", False):
+                await self._handle_subscription(content)
+            return True
+
+        if content.get("type") == "history":
+            await self._handle_history_request(content)
+            return True
+
+        return False
+
+    async def _handle_history_request(self, content):
+        """{"type": "history", "room": ..., "before": <cursor> | "since": <id>, "limit": n}"""
+        room = str(content.get("room") or getattr(self, "room", ""))
+        if not ROOM_KEY_RE.fullmatch(room) or not self._is_user_in_room(room, self.user.id):
+            await self.send_json({"event": "error", "room": room, "detail": "Not permitted to read this conversation."})
+            return
+        try:
+            await self._send_history(
+                room, before=content.get("before"), since=content.get("since"), limit=content.get("limit")
+            )
+        except ValueError:
+            await self.send_json({"event": "error", "room": room, "detail": "Invalid history cursor."})
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        # Over the per-socket budget: dropped unhandled
+        retry_after = self.frame_bucket.take()
+        if retry_after:
+            throttle.counters["frames_throttled"] += 1
+            # A dropped chat message gets the same reply as the per-user limit
+            message = self._chat_message(self._decode(text_data, bytes_data))
+            if message:
+                await self._send_throttled(*message, retry_after)
+            return
+        if bytes_data is not None and self.packed:
+            try:
+                content = framing.unpack(bytes_data)
+            except Exception:
+                return
+            if isinstance(content, dict):
+                await self.receive_json(content)
             return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
 
-        if not self._is_user_in_room(self.room, self.user.id):
-            await self.close(code=4003)
+    def _decode(self, text_data, bytes_data):
+        """The frame as a dict, or None"""
+        try:
+            if bytes_data is not None and self.packed:
+                content = framing.unpack(bytes_data)
+            else:
+                content = json.loads(text_data if text_data is not None else bytes_data)
+        except Exception:
+            return None
+        return content if isinstance(content, dict) else None
+
+    def _chat_message(self, content):
+        """(room, text) if ``content`` is a chat message frame"""
+        return None
+
+    async def send_json(self, content, close=False):
+        # Replies to this client's own frames are queued, never dropped
+        self._queue_frame(self._encode(content))
+        if close:
+            await self.close()
+
+    def _encode(self, content):
+        if self.packed:
+            return {"bytes": framing.pack(content)}
+        return {"text": json.dumps(content)}
+
+    def _queue_frame(self, frame, droppable=False):
+        """
+        Queue an encoded frame ({"text": ...} or {"bytes": ...}) for this
+        socket's writer task. Broadcasts (``droppable``)
+        are dropped once ``CHAT_SEND_QUEUE_SIZE`` frames are waiting, and all
+        later ones until the queue has drained; the client then gets one
+        {"event": "lagged"} frame and catches up from history.
+        """
+        if not hasattr(self, "outbound"):
+            self.outbound = deque()
+            self.outbound_ready = asyncio.Event()
+            self.lagging = False
+            self.writer_task = asyncio.get_running_loop().create_task(self._write_frames())
+        if droppable and (self.lagging or len(self.outbound) >= throttle.send_queue_size()):
+            if not self.lagging:
+                self.lagging = True
+                throttle.counters["sockets_lagged"] += 1
+            throttle.counters["frames_dropped"] += 1
+            return
+        self.outbound.append(frame)
+        self.outbound_ready.set()
+
+    async def _write_frames(self):
+        # A slow client holds up only this task, not the consumer's channel-layer handlers
+        while True:
+            await self.outbound_ready.wait()
+            while self.outbound:
+                frame = self.outbound.popleft()
+                await self.send(text_data=frame.get("text"), bytes_data=frame.get("bytes"))
+            self.outbound_ready.clear()
+            if self.lagging:
+                self.lagging = False
+                frame = self._encode({"event": "lagged"})
+                await self.send(text_data=frame.get("text"), bytes_data=frame.get("bytes"))
+
+    async def _post_message(self, room, text):
+        retry_after = await throttle.get_limiter().acquire(self.user.id)
+        if retry_after:
+            throttle.counters["messages_throttled"] += 1
+            await self._send_throttled(room, text, retry_after)
             return
 
-        message = await self._create_message(text)
+        message = await self._create_message(room, text)
+        payload = self._serialize_message(message)
         await self.channel_layer.group_send(
-            self.group_name,
-            {
-                "type": "chat.message",
-                "payload": self._serialize_message(message),
-            },
+            f"chat_{room}",
+            # Encoded here once for every socket in the room
+            {"type": "chat.message", **framing.broadcast(payload)},
         )
+        # Recipients' other sockets and outboxes, whether or not they are in the room
+        await outbox.notify(self.channel_layer, message)
+
+    async def _send_throttled(self, room, text, retry_after):
+        # The text comes back so the client can put it back in the box
+        await self.send_json({
+            "event": "error",
+            "room": room,
+            "detail": "Sending messages too fast.",
+            "retry_after": round(retry_after, 2),
+            "text": text,
+        })
+
+    async def _send_history(self, room, before=None, since=None, limit=None):
+        # One batched frame per page rather than a frame per message
+        await self.send_json(await self._history_page(room, before, since, limit))
 
     async def chat_message(self, event):
-        await self.send_json(event["payload"])
+        text = event["text"]
+        frame = {"bytes": framing.packed(text)} if self.packed else {"text": text}
+        self._queue_frame(frame, droppable=True)
+
+    async def chat_notification(self, event):
+        # New message in any of this user's conversations (outbox envelope). A socket
+        # in that room already gets the message itself
+        room = event["payload"].get("room")
+        if room == getattr(self, "room", None) or room in getattr(self, "rooms", ()):
+            return
+        self._queue_frame(self._encode(event["payload"]), droppable=True)
 
     async def chat_deletion(self, event):
+        # Buffered messages sent before the delete must not be written after it
+        payload = event["payload"]
+        if write_behind.enabled() and payload.get("room") and payload.get("through"):
+            write_behind.get_writer().discard(payload["room"], datetime.fromisoformat(payload["through"]))
         # Broadcast deletion event to clients in the room
-        await self.send_json(event["payload"])
+        await self.send_json(payload)
 
     async def presence_update(self, event):
+        # Coalesce into one presence_delta frame per tick
+        payload = event["payload"]
+        self.presence_pending[payload["user_id"]] = payload["status"]
+        if self.presence_flush is None:
+            self.presence_flush = asyncio.get_running_loop().create_task(self._flush_presence())
+
+    async def report_status(self, event):
+        # Background report job finished for this user
         await self.send_json(event["payload"])
 
     # Helpers
-    def _get_token_from_scope(self):
+    def _get_query_param(self, name):
         query_string = self.scope.get("query_string", b"").decode()
         params = parse_qs(query_string)
-        tokens = params.get("token", [])
-        return tokens[0] if tokens else None
+        values = params.get(name, [])
+        return values[0] if values else None
 
-    @database_sync_to_async
-    def _authenticate(self, raw_token):
-        if not raw_token:
-            return None
-        jwt_auth = JWTAuthentication()
-        try:
-            validated = jwt_auth.get_validated_token(raw_token)
-            return jwt_auth.get_user(validated)
-        except (InvalidToken, AuthenticationFailed):
-            return None
+    def _scope_user(self):
+        # Set by JWTAuthMiddleware during the handshake
+        user = self.scope.get("user")
+        return user if user is not None and user.is_authenticated else None
 
     def _is_user_in_room(self, room_key, user_id):
         try:
@@ -123,84 +274,268 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         except Exception:
             return False
 
-    def _redis(self):
-        # Assumes Redis is reachable at default host/port; adjust if needed.
-        return aioredis.from_url("redis://127.0.0.1:6379", decode_responses=True)
-
     async def _mark_online(self, user_id: int) -> bool:
         """
-        Mark user online (idempotent).
+        Register this socket towards the user's presence.
         Returns True if user transitioned to online.
         """
-        r = self._redis()
-        existed = await r.exists(f"presence:count:{user_id}")
-        # set a TTL so stale entries self-clean if the process crashes (5 minutes)
-        await r.set(f"presence:count:{user_id}", 1, ex=300)
-        await r.sadd("presence:online_users", user_id)
-        return not existed
+        return await presence.get_store().connect(user_id, self.channel_name)
 
     async def _mark_offline(self, user_id: int) -> bool:
         """
-        Mark user offline (idempotent).
-        Returns True if user transitioned to offline.
+        Release this socket's presence entry.
+        Returns True if user transitioned to offline (no sockets left).
         """
-        r = self._redis()
-        existed = await r.delete(f"presence:count:{user_id}")
-        await r.srem("presence:online_users", user_id)
-        return bool(existed)
+        return await presence.get_store().disconnect(user_id, self.channel_name)
 
     async def _send_presence_snapshot(self):
-        """Send current online users snapshot to this client, pruning stale entries."""
+        """Send which watched users are online to this client."""
         try:
-            r = self._redis()
-            online = await r.smembers("presence:online_users")
-            alive = []
-            for uid in online:
-                ttl = await r.ttl(f"presence:count:{uid}")
-                if ttl is None or ttl < 0:
-                    # stale, drop from set
-                    await r.srem("presence:online_users", uid)
-                    await r.delete(f"presence:count:{uid}")
-                else:
-                    alive.append(uid)
+            alive = await presence.get_store().watched_snapshot(sorted(self.watched))
             await self.send_json({"event": "presence_snapshot", "online": alive})
         except Exception:
             pass
 
     async def _broadcast_presence(self, user_id: int, status: str):
-        payload = {"event": "presence", "user_id": user_id, "status": status}
-        await self.channel_layer.group_send(
-            self.presence_group,
-            {"type": "presence.update", "payload": payload},
-        )
-        await self.channel_layer.group_send(
-            f"user_{user_id}",
-            {"type": "presence.update", "payload": payload},
-        )
+        # Batched and delivered only to sockets watching this user
+        presence.get_broadcaster(self.channel_layer).publish(user_id, status)
+
+    async def _watch(self, user_ids):
+        """Join the presence groups of ``user_ids``; returns the newly watched ones"""
+        limit = getattr(settings, "PRESENCE_MAX_WATCHED", 500)
+        added = []
+        for user_id in user_ids:
+            if user_id in self.watched or user_id == self.user.id or len(self.watched) >= limit:
+                continue
+            await self.channel_layer.group_add(presence.presence_group(user_id), self.channel_name)
+            self.watched.add(user_id)
+            added.append(user_id)
+        return added
+
+    async def _watch_and_report(self, user_ids):
+        """Watch more users and tell the client which of them are online"""
+        added = await self._watch(sorted(user_ids))
+        if added:
+            alive = set(await presence.get_store().watched_snapshot(added))
+            await self.send_json({
+                "event": "presence_delta",
+                "online": [uid for uid in added if uid in alive],
+                "offline": [uid for uid in added if uid not in alive],
+            })
+
+    async def _handle_subscription(self, content):
+        """{"type": "presence.subscribe" | "presence.unsubscribe", "user_ids": [...]}"""
+        try:
+            user_ids = {int(uid) for uid in content.get("user_ids") or []}
+        except (TypeError, ValueError):
+            return
+        if content["type"] == "presence.unsubscribe":
+            # Conversation partners stay watched
+            for user_id in (user_ids & self.watched) - self.partners:
+                await self.channel_layer.group_discard(presence.presence_group(user_id), self.channel_name)
+                self.watched.discard(user_id)
+            return
+        await self._watch_and_report(user_ids)
+
+    async def _flush_presence(self):
+        await asyncio.sleep(presence.batch_interval())
+        pending, self.presence_pending = self.presence_pending, {}
+        self.presence_flush = None
+        await self.send_json({
+            "event": "presence_delta",
+            "online": [uid for uid, status in pending.items() if status == "online"],
+            "offline": [uid for uid, status in pending.items() if status == "offline"],
+        })
+
+    def _room_partners(self, rooms):
+        me = str(self.user.id)
+        return {int(part) for room in rooms for part in room.split("_") if part.isdigit() and part != me}
 
     @database_sync_to_async
-    def _create_message(self, text):
-        return ChatMessage.objects.create(
-            conversation_id=self.room,
-            sender=self.user,
-            text=text,
-            created_at=timezone.now(),
-        )
+    def _conversation_partners(self, rooms=()):
+        """Users this user has chatted with, plus the other participants of ``rooms``"""
+        peers = ConversationMember.objects.filter(user=self.user).values_list("peer_id", flat=True)
+        self.partners = (set(peers) | self._room_partners(rooms)) - {self.user.id}
+        return self.partners
+
+    async def _create_message(self, room, text):
+        if write_behind.enabled():
+            # Broadcast now, saved with the next batch
+            message = ChatMessage(
+                id=snowflake.next_id(),
+                conversation_id=room,
+                sender=self.user,
+                text=text,
+                created_at=timezone.now(),
+            )
+            return write_behind.get_writer().add(message)
+        return await self._save_message(room, text)
 
     @database_sync_to_async
-    def _get_recent_messages(self, limit=30):
-        return list(
-            ChatMessage.objects.filter(conversation_id=self.room)
-            .select_related("sender")
-            .order_by("-created_at")[:limit][::-1]
-        )
+    def _save_message(self, room, text):
+        with transaction.atomic():
+            message = ChatMessage.objects.create(
+                conversation_id=room,
+                sender=self.user,
+                text=text,
+                created_at=timezone.now(),
+            )
+            inbox.record_messages([message])
+        return message
+
+    @database_sync_to_async
+    def _history_page(self, room, before=None, since=None, limit=None):
+        return history.history_payload(room, before=before, since=since, limit=limit)
 
     def _serialize_message(self, msg):
-        return {
-            "id": msg.id,
-            "conversation_id": msg.conversation_id,
-            "text": msg.text,
-            "sender_id": msg.sender_id,
-            "sender_name": getattr(msg.sender, "email", str(msg.sender)),
-            "created_at": msg.created_at.isoformat(),
-        }
+        return history.serialize_message(msg)
+
+
+class ChatConsumer(BaseChatConsumer):
+    """
+    WebSocket for a single conversation: ws/messages/<room>/
+    - Only participants in the room key are allowed to connect/send
+    - Frames: {"text": ...} to send, plus heartbeat/presence/history control frames
+    - ?since=<message id> on reconnect sends only the messages after it
+    """
+
+    async def connect(self):
+        self.room = str(self.scope["url_route"]["kwargs"]["room"])
+        self.user = self._scope_user()
+        if not self.user:
+            await self.close(code=4001)
+            return
+
+        if not self._is_user_in_room(self.room, self.user.id):
+            await self.close(code=4003)
+            return
+
+        self.group_name = f"chat_{self.room}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self._start_session(rooms=[self.room])
+
+        await self._accept()
+
+        # send recent history, or only what was missed since the client's last message
+        try:
+            await self._send_history(self.room, since=self._get_query_param("since"))
+        except ValueError:
+            await self._send_history(self.room)
+        await self._send_presence_snapshot()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self._end_session()
+
+    async def receive_json(self, content, **kwargs):
+        if await self._handle_control(content):
+            return
+
+        text = (content.get("text") or "").strip()
+        if not text or not getattr(self, "user", None):
+            return
+
+        if not self._is_user_in_room(self.room, self.user.id):
+            await self.close(code=4003)
+            return
+
+        await self._post_message(self.room, text)
+
+    def _chat_message(self, content):
+        text = content.get("text") if content and "type" not in content else None
+        if isinstance(text, str) and text.strip():
+            return self.room, text.strip()
+        return None
+
+
+class StreamConsumer(BaseChatConsumer):
+    """
+    One multiplexed WebSocket per user: ws/stream/
+    Chat for any number of subscribed rooms, presence and notifications share
+    the connection, so the JWT handshake and per-user groups happen once.
+
+    Client frames:
+    - {"type": "subscribe", "rooms": ["1_7", ...], "since": {"1_7": 812}}
+      join rooms and receive their recent history (or what came after ``since``)
+    - {"type": "unsubscribe", "rooms": ["1_7", ...]}
+    - {"type": "message", "room": "1_7", "text": "..."}
+    - {"type": "history", "room": "1_7", "before": "<cursor>"}    page back through a room
+    - {"type": "heartbeat"}, {"type": "presence.subscribe" | "presence.unsubscribe", "user_ids": [...]}
+    """
+
+    async def connect(self):
+        self.user = self._scope_user()
+        if not self.user:
+            await self.close(code=4001)
+            return
+
+        self.rooms = set()
+        await self._start_session()
+        await self._accept()
+        await self._send_presence_snapshot()
+
+    async def disconnect(self, close_code):
+        for room in getattr(self, "rooms", ()):
+            await self.channel_layer.group_discard(f"chat_{room}", self.channel_name)
+        await self._end_session()
+
+    async def receive_json(self, content, **kwargs):
+        if not getattr(self, "user", None) or await self._handle_control(content):
+            return
+
+        frame_type = content.get("type")
+        if frame_type == "subscribe":
+            since = content.get("since")
+            await self._subscribe(self._rooms_from(content), since if isinstance(since, dict) else {})
+        elif frame_type == "unsubscribe":
+            for room in self._rooms_from(content) & self.rooms:
+                await self.channel_layer.group_discard(f"chat_{room}", self.channel_name)
+                self.rooms.discard(room)
+            await self.send_json({"event": "unsubscribed", "rooms": sorted(self._rooms_from(content))})
+        elif frame_type == "message":
+            room = str(content.get("room") or "")
+            text = (content.get("text") or "").strip()
+            if not text:
+                return
+            if room not in self.rooms:
+                await self.send_json({"event": "error", "room": room, "detail": "Not subscribed to this room."})
+                return
+            await self._post_message(room, text)
+
+    def _chat_message(self, content):
+        text = content.get("text") if content and content.get("type") == "message" else None
+        if isinstance(text, str) and text.strip():
+            return str(content.get("room") or ""), text.strip()
+        return None
+
+    def _rooms_from(self, content):
+        rooms = content.get("rooms")
+        if rooms is None:
+            rooms = [content.get("room")]
+        if not isinstance(rooms, list):
+            return set()
+        # Room keys are "<id>_<id>"; anything else can't be a valid group name either
+        return {str(room) for room in rooms if ROOM_KEY_RE.fullmatch(str(room))}
+
+    async def _subscribe(self, rooms, since):
+        limit = getattr(settings, "STREAM_MAX_ROOMS", 500)
+        accepted, rejected = [], []
+        for room in sorted(rooms - self.rooms):
+            if not self._is_user_in_room(room, self.user.id) or len(self.rooms) >= limit:
+                rejected.append(room)
+                continue
+            await self.channel_layer.group_add(f"chat_{room}", self.channel_name)
+            self.rooms.add(room)
+            accepted.append(room)
+
+        await self.send_json({"event": "subscribed", "rooms": accepted, "rejected": rejected})
+        for room in accepted:
+            try:
+                await self._send_history(room, since=since.get(room))
+            except ValueError:
+                await self._send_history(room)
+
+        partners = self._room_partners(accepted)
+        self.partners |= partners
+        await self._watch_and_report(partners)
@@ -0,0 +1,66 @@
+"""
+Opt-in msgpack framing for chat sockets.
+
+A client that offers the ``chat.msgpack`` WebSocket subprotocol gets binary
+msgpack frames instead of JSON text. In them, ``created_at`` is an integer
+(milliseconds since the epoch) and messages carry ``sender_id`` but no
+``sender_name``. The client may send msgpack or JSON frames. JSON stays the
+default for everyone else.
+
+A broadcast message travels through the channel layer once, as the JSON
+text the sending consumer encoded (``broadcast``). JSON sockets forward that
+text as is; msgpack sockets share one encoding per process (``packed``), made
+the first time one of them needs it, so rooms without msgpack clients never
+pay for it.
+"""
+import functools
+import json
+from datetime import datetime
+
+
+SUBPROTOCOL = "chat.msgpack"
+
+
+def available():
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _epoch_ms(value):
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def compact(content):
+    """The msgpack form of a frame: integer timestamps, no sender emails"""
+    content = {key: value for key, value in content.items() if key != "sender_name"}
+    if isinstance(content.get("created_at"), str):
+        content["created_at"] = _epoch_ms(content["created_at"])
+    if isinstance(content.get("messages"), list):
+        content["messages"] = [compact(message) for message in content["messages"]]
+    return content
+
+
+def pack(content):
+    import msgpack
+
+    return msgpack.packb(compact(content), use_bin_type=True)
+
+
+def unpack(data):
+    import msgpack
+
+    return msgpack.unpackb(data, raw=False)
+
+
+def broadcast(payload):
+    """The fields carrying a broadcast frame in the group message"""
+    return {"text": json.dumps(payload)}
+
+
+@functools.lru_cache(maxsize=256)
+def packed(text):
+    """The msgpack form of a broadcast's JSON ``text``; every socket in the process reuses it"""
+    return pack(json.loads(text))
@@ -0,0 +1,125 @@
+"""
+Paged chat history.
+
+Pages walk a conversation backwards along the ``(conversation_id,
+created_at)`` index, ordered by ``(created_at, id)`` so that messages sharing
+a timestamp are neither skipped nor repeated. The cursor handed to clients is
+an opaque token for the oldest message of the page; passing it back as
+``before`` returns the page preceding it.
+
+Reconnecting clients pass the id of the newest message they hold as
+``since`` and receive only what they missed.
+"""
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import ChatMessage
+from .purge import visible_messages
+
+
+MAX_PAGE_SIZE = 100
+
+
+def page_size(limit=None):
+    """``limit`` clamped to 1..MAX_PAGE_SIZE, defaulting to CHAT_HISTORY_PAGE_SIZE"""
+    default = getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 30)
+    try:
+        limit = int(limit) if limit not in (None, '') else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(message):
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def _room_messages(room):
+    return visible_messages(room).select_related('sender')
+
+
+def page_before(room, cursor=None, limit=None):
+    """
+    The ``limit`` messages preceding ``cursor`` (the latest ones if None),
+    oldest first, and the cursor for the page before them (None at the start)
+    """
+    limit = page_size(limit)
+    queryset = _room_messages(room)
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+        )
+
+    # One extra row tells us whether an older page exists
+    rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    has_more = len(rows) > limit
+    messages = rows[:limit][::-1]
+    next_cursor = encode_cursor(messages[0]) if has_more else None
+    return messages, next_cursor
+
+
+def messages_since(room, since_id, limit=None):
+    """
+    Messages after the one with id ``since_id``, oldest first, and whether
+    newer ones remain. If that message is gone, the latest page is returned.
+    """
+    limit = page_size(limit)
+    anchor = ChatMessage.objects.filter(conversation_id=room, id=since_id).only('created_at').first()
+    if anchor is None:
+        messages, _ = page_before(room, limit=limit)
+        return messages, False
+
+    rows = list(
+        _room_messages(room)
+        .filter(Q(created_at__gt=anchor.created_at) | Q(created_at=anchor.created_at, id__gt=since_id))
+        .order_by('created_at', 'id')[:limit + 1]
+    )
+    return rows[:limit], len(rows) > limit
+
+
+def serialize_message(message):
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "text": message.text,
+        "sender_id": message.sender_id,
+        "sender_name": getattr(message.sender, "email", str(message.sender)),
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+def history_payload(room, before=None, since=None, limit=None):
+    """
+    One batched ``history`` frame for a room: a page before ``before``, or
+    the messages after id ``since``. ``has_more`` means older messages remain
+    for a backward page and newer ones for ``since``.
+    Raises ValueError on a bad cursor or id.
+    """
+    if since not in (None, ''):
+        messages, has_more = messages_since(room, int(since), limit)
+        next_cursor = None
+    else:
+        messages, next_cursor = page_before(room, before or None, limit)
+        has_more = next_cursor is not None
+    return {
+        "event": "history",
+        "room": room,
+        "messages": [serialize_message(m) for m in messages],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
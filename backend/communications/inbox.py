@@ -0,0 +1,197 @@
+"""
+Conversation index kept alongside ChatMessage.
+
+Every message write goes through ``record_messages``, which advances the
+conversation's last message and bumps the unread count of the participants
+who did not send it. Inbox pages then read ``ConversationMember`` along its
+``(user, -last_message_at)`` index. ``mark_read`` moves a participant's
+last-read pointer.
+"""
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .models import ChatMessage, Conversation, ConversationMember
+
+
+PREVIEW_LENGTH = 200
+
+
+def room_participants(room):
+    """The user ids encoded in a room key ("<min>_<max>")"""
+    try:
+        return sorted({int(part) for part in room.split('_')})
+    except ValueError:
+        return []
+
+
+def _members_for(conversation, user_ids, last_message):
+    """Unsaved members of a new conversation, caught up to ``last_message``"""
+    if len(user_ids) == 1:
+        pairs = [(user_ids[0], user_ids[0])]
+    else:
+        pairs = [(user_ids[0], user_ids[1]), (user_ids[1], user_ids[0])]
+    return [
+        ConversationMember(
+            conversation=conversation,
+            user_id=user_id,
+            peer_id=peer_id,
+            last_message_at=last_message.created_at if last_message else None,
+            last_read_message_id=last_message.id if last_message else None,
+        )
+        for user_id, peer_id in pairs
+    ]
+
+
+def get_conversation(room):
+    """The room's conversation, created with its members on first use"""
+    conversation, created = Conversation.objects.get_or_create(room=room)
+    if created:
+        # Room keys are client supplied; only index rooms whose participants all exist
+        participants = room_participants(room)
+        user_ids = list(
+            get_user_model().objects.filter(id__in=participants).order_by('id').values_list('id', flat=True)
+        )
+        if user_ids and len(user_ids) == len(participants):
+            ConversationMember.objects.bulk_create(
+                _members_for(conversation, user_ids, None), ignore_conflicts=True
+            )
+    return conversation
+
+
+def record_messages(messages):
+    """Fold just-saved messages into their conversations (call in the same transaction)"""
+    by_room = defaultdict(list)
+    for message in messages:
+        by_room[message.conversation_id].append(message)
+
+    for room, room_messages in by_room.items():
+        conversation = get_conversation(room)
+        latest = max(room_messages, key=lambda m: (m.created_at, m.id))
+
+        # Conditional so concurrent writers never move the pointer backwards
+        newer = (
+            Q(last_message_at__isnull=True)
+            | Q(last_message_at__lt=latest.created_at)
+            | Q(last_message_at=latest.created_at, last_message_id__lt=latest.id)
+        )
+        Conversation.objects.filter(newer, pk=conversation.pk).update(
+            last_message_id=latest.id,
+            last_message_at=latest.created_at,
+            last_message_text=latest.text[:PREVIEW_LENGTH],
+            last_sender_id=latest.sender_id,
+        )
+        ConversationMember.objects.filter(
+            Q(last_message_at__isnull=True) | Q(last_message_at__lt=latest.created_at),
+            conversation=conversation,
+        ).update(last_message_at=latest.created_at)
+
+        sent_by = Counter(m.sender_id for m in room_messages)
+        for user_id in room_participants(room):
+            unread = len(room_messages) - sent_by[user_id]
+            if unread:
+                ConversationMember.objects.filter(conversation=conversation, user_id=user_id).update(
+                    unread_count=F('unread_count') + unread
+                )
+
+
+def mark_read(room, user, message_id=None):
+    """
+    Move ``user``'s last-read pointer to ``message_id`` (the latest message
+    if None) and recount what is left unread. Returns the member, or None if
+    the user has no such conversation.
+    """
+    member = (
+        ConversationMember.objects.select_related('conversation')
+        .filter(conversation__room=room, user=user)
+        .first()
+    )
+    if member is None:
+        return None
+
+    conversation = member.conversation
+    if message_id is None or message_id == conversation.last_message_id:
+        pointer, unread = conversation.last_message_id, 0
+    else:
+        anchor = ChatMessage.objects.filter(conversation_id=room, id=message_id).only('created_at').first()
+        if anchor is None:
+            return member
+        pointer = anchor.id
+        remaining = (
+            ChatMessage.objects.filter(conversation_id=room)
+            .filter(Q(created_at__gt=anchor.created_at) | Q(created_at=anchor.created_at, id__gt=anchor.id))
+            .exclude(sender=user)
+        )
+        if conversation.cleared_through_at:
+            # Deleted messages awaiting purge are not unread
+            from .purge import cleared
+
+            remaining = remaining.exclude(cleared(conversation))
+        unread = remaining.count()
+
+    ConversationMember.objects.filter(pk=member.pk).update(last_read_message_id=pointer, unread_count=unread)
+    member.last_read_message_id, member.unread_count = pointer, unread
+    return member
+
+
+def rebuild_conversations():
+    """
+    Create missing conversations and refresh every conversation's last
+    message from ChatMessage. New members start with everything read;
+    existing members keep their pointers and unread counts. Returns the
+    number of conversations.
+    """
+    newest = (
+        ChatMessage.objects.filter(conversation_id=OuterRef('conversation_id'))
+        .order_by('-created_at', '-id')
+        .values('id')[:1]
+    )
+    last_ids = (
+        ChatMessage.objects.order_by()
+        .values('conversation_id')
+        .annotate(last_id=Subquery(newest))
+        .values_list('last_id', flat=True)
+    )
+    latest = {m.conversation_id: m for m in ChatMessage.objects.filter(id__in=list(last_ids))}
+
+    existing = Conversation.objects.in_bulk(latest, field_name='room')
+    Conversation.objects.bulk_create(
+        [Conversation(room=room) for room in latest if room not in existing], batch_size=500
+    )
+    conversations = Conversation.objects.in_bulk(latest, field_name='room')
+    for room, conversation in conversations.items():
+        message = latest[room]
+        if conversation.cleared_through_at and (message.created_at, message.id) <= (
+            conversation.cleared_through_at, conversation.cleared_through_id
+        ):
+            # Deleted and awaiting purge
+            continue
+        conversation.last_message_id = message.id
+        conversation.last_message_at = message.created_at
+        conversation.last_message_text = message.text[:PREVIEW_LENGTH]
+        conversation.last_sender_id = message.sender_id
+    Conversation.objects.bulk_update(
+        conversations.values(),
+        ['last_message_id', 'last_message_at', 'last_message_text', 'last_sender'],
+        batch_size=500,
+    )
+
+    user_ids = set(get_user_model().objects.values_list('id', flat=True))
+    members = set(ConversationMember.objects.values_list('conversation_id', 'user_id'))
+    missing = []
+    for room, conversation in conversations.items():
+        participants = room_participants(room)
+        if participants and user_ids.issuperset(participants):
+            missing += [
+                m for m in _members_for(conversation, participants, latest[room])
+                if (conversation.pk, m.user_id) not in members
+            ]
+    ConversationMember.objects.bulk_create(missing, batch_size=500)
+
+    ConversationMember.objects.update(
+        last_message_at=Subquery(
+            Conversation.objects.filter(pk=OuterRef('conversation_id')).values('last_message_at')[:1]
+        )
+    )
+    return len(conversations)
@@ -0,0 +1,16 @@
+from . import write_behind
+from .redis_client import aclose_redis, close_redis
+
+
+async def lifespan(scope, receive, send):
+    """ASGI lifespan handler saving buffered chat messages and closing the Redis pools when the server stops"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await write_behind.aflush()
+            await aclose_redis()
+            close_redis()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
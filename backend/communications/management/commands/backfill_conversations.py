@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from communications.inbox import rebuild_conversations
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the conversation index (inbox rows, last messages) from existing chat messages. "
+        "Safe to re-run: existing read pointers and unread counts are kept."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_conversations()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} conversations."))
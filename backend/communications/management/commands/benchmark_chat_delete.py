@@ -0,0 +1,111 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from communications import purge
+from communications.models import ChatMessage, Conversation
+
+
+BENCH_EMAIL = "bench-chat-delete@example.invalid"
+ROOM = "bench_chat_delete"
+WRITER_ROOM = "bench_chat_delete_writer"
+
+
+def _delete_all(room):
+    """The previous single ORM delete of the whole room, kept here as the baseline."""
+    deleted, _ = ChatMessage.objects.filter(conversation_id=room).delete()
+    return deleted
+
+
+def _clear_and_purge(room):
+    cleared = purge.clear_history(room)
+    # The purge runs on its worker thread; wait for it so both modes are timed to the last row
+    while ChatMessage.objects.filter(conversation_id=room).exists():
+        time.sleep(0.01)
+    return cleared
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete a large chat conversation while another thread keeps writing messages, and "
+        "report how long the delete took and how long the writer's inserts waited, for the "
+        "single ORM delete and the tombstone + chunked purge. Writes to the configured "
+        "database under its own user and removes everything afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages', type=int, default=200000, help='Messages in the deleted room (default: 200000)'
+        )
+        parser.add_argument('--chunk', type=int, default=1000, help='Purge chunk size (default: 1000)')
+
+    def handle(self, *args, **options):
+        sender, _ = User.objects.get_or_create(email=BENCH_EMAIL, defaults={'role': User.Role.FACULTY})
+        try:
+            self.stdout.write(
+                f"{'mode':>9} {'messages':>9} {'delete s':>9} {'writes':>7} {'errors':>7} "
+                f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+            )
+            with override_settings(CHAT_PURGE_CHUNK_SIZE=options['chunk']):
+                for mode, delete in (('single', _delete_all), ('chunked', _clear_and_purge)):
+                    self._seed(sender, options['messages'])
+                    self._run(mode, delete, sender)
+        finally:
+            Conversation.objects.filter(room__in=[ROOM, WRITER_ROOM]).delete()
+            # Cascades to the remaining benchmark messages
+            sender.delete()
+
+    def _seed(self, sender, messages):
+        Conversation.objects.filter(room=ROOM).delete()
+        now = timezone.now()
+        ChatMessage.objects.bulk_create(
+            (
+                ChatMessage(conversation_id=ROOM, sender=sender, text=f"message {n}", created_at=now)
+                for n in range(messages)
+            ),
+            batch_size=5000,
+        )
+
+    def _run(self, mode, delete, sender):
+        stop = threading.Event()
+        waits, errors = [], []
+
+        def writer():
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        ChatMessage.objects.create(conversation_id=WRITER_ROOM, sender=sender, text="writer")
+                        waits.append(time.perf_counter() - started)
+                    except OperationalError:
+                        errors.append(time.perf_counter() - started)
+                    time.sleep(0.005)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            time.sleep(0.2)
+            started = time.perf_counter()
+            deleted = delete(ROOM)
+            elapsed = time.perf_counter() - started
+            time.sleep(0.2)
+        finally:
+            stop.set()
+            thread.join()
+
+        waits.sort()
+        p95 = waits[max(int(len(waits) * 0.95) - 1, 0)] if waits else 0
+        self.stdout.write(
+            f"{mode:>9} {deleted:>9} {elapsed:>9.2f} {len(waits):>7} {len(errors):>7} "
+            f"{statistics.median(waits) * 1000 if waits else 0:>8.2f} {p95 * 1000:>8.2f} "
+            f"{max(waits + errors, default=0) * 1000:>8.2f}"
+        )
+        ChatMessage.objects.filter(conversation_id=WRITER_ROOM).delete()
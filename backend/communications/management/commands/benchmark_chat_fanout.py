@@ -0,0 +1,178 @@
+import asyncio
+import json
+import statistics
+import time
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from communications import framing, write_behind
+from communications.models import Conversation
+from communications.redis_client import aclose_redis, get_async_redis
+
+
+BENCH_EMAIL = "bench-chat-fanout-{}@example.invalid"
+
+BACKENDS = {
+    'memory': {
+        'PRESENCE_BACKEND': 'communications.presence.MemoryPresenceStore',
+        'CHAT_OUTBOX_BACKEND': 'communications.outbox.MemoryOutbox',
+        'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    },
+    'redis': {
+        'PRESENCE_BACKEND': 'communications.presence.RedisPresenceStore',
+        'CHAT_OUTBOX_BACKEND': 'communications.outbox.RedisOutbox',
+        'CHANNEL_LAYERS': {
+            'default': {
+                'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                'CONFIG': {'hosts': [getattr(settings, 'REDIS_URL', 'redis://127.0.0.1:6379/0')]},
+            },
+        },
+    },
+}
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[max(int(len(sorted_values) * fraction) - 1, 0)] if sorted_values else 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the chat WebSocket path in-process: open sockets on ws/messages/<room>/ "
+        "with channels' WebsocketCommunicator, post messages and time each delivery to every "
+        "socket in the room, for the in-memory and/or Redis channel layer and presence store. "
+        "Creates its own users and messages in the configured database and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', nargs='+', choices=sorted(BACKENDS), default=['memory'],
+            help='Realtime backends to run (default: memory; redis needs settings.REDIS_URL)'
+        )
+        parser.add_argument('--rooms', type=int, default=20, help='Conversations, two users each (default: 20)')
+        parser.add_argument('--tabs', type=int, default=2, help='Sockets per user and room (default: 2)')
+        parser.add_argument('--messages', type=int, default=50, help='Messages posted per room (default: 50)')
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Messages per second per room; 0 posts as fast as the sockets accept (default: 0)'
+        )
+        parser.add_argument('--write-behind', action='store_true', help='Persist with CHAT_WRITE_BEHIND')
+        parser.add_argument('--msgpack', action='store_true', help='Sockets use the chat.msgpack subprotocol')
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds to wait for a delivery (default: 10)')
+
+    def handle(self, *args, **options):
+        from config.asgi import application
+
+        users = [
+            User.objects.get_or_create(email=BENCH_EMAIL.format(n), defaults={'role': User.Role.FACULTY})[0]
+            for n in range(2 * options['rooms'])
+        ]
+        rooms = {}
+        for low, high in zip(users[::2], users[1::2]):
+            a, b = sorted((low.id, high.id))
+            rooms[f"{a}_{b}"] = (a, b)
+        tokens = {user.id: str(AccessToken.for_user(user)) for user in users}
+
+        self.stdout.write(
+            f"{'backend':>8} {'rooms':>6} {'sockets':>8} {'sent':>7} {'delivered':>10} {'total s':>8} "
+            f"{'frames/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        try:
+            for backend in options['backends']:
+                # Rate limits off: this measures fan-out, not the limiter. The only
+                # process writing messages may take any worker id
+                with override_settings(
+                    CHAT_WRITE_BEHIND=options['write_behind'], CHAT_FRAME_RATE=None, CHAT_MESSAGE_RATE=None,
+                    CHAT_WORKER_ID=getattr(settings, 'CHAT_WORKER_ID', None) or 0, **BACKENDS[backend],
+                ):
+                    try:
+                        asyncio.run(self._main(application, backend, rooms, tokens, options))
+                    except (RedisConnectionError, OSError) as exc:
+                        raise CommandError(f"Redis is not reachable: {exc}")
+        finally:
+            Conversation.objects.filter(room__in=rooms).delete()
+            # Cascades to the benchmark's messages
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    async def _main(self, application, backend, rooms, tokens, options):
+        if backend == 'redis':
+            await get_async_redis().ping()
+        try:
+            row = await self._run(application, rooms, tokens, options)
+        finally:
+            await write_behind.aflush()
+            if backend == 'redis':
+                await get_channel_layer().close_pools()
+                await aclose_redis()
+
+        sent, delivered, expected, total, latencies = row
+        latencies.sort()
+        self.stdout.write(
+            f"{backend:>8} {len(rooms):>6} {len(rooms) * 2 * options['tabs']:>8} {sent:>7} "
+            f"{f'{delivered}/{expected}':>10} {total:>8.2f} {delivered / total:>9.0f} "
+            f"{statistics.median(latencies) * 1000 if latencies else 0:>8.2f} "
+            f"{_percentile(latencies, 0.95) * 1000:>8.2f} {_percentile(latencies, 0.99) * 1000:>8.2f}"
+        )
+
+    async def _run(self, application, rooms, tokens, options):
+        subprotocols = [framing.SUBPROTOCOL] if options['msgpack'] else None
+        sockets = {
+            room: [
+                WebsocketCommunicator(
+                    application, f"/ws/messages/{room}/?token={tokens[user_id]}", subprotocols=subprotocols
+                )
+                for user_id in pair
+                for _ in range(options['tabs'])
+            ]
+            for room, pair in rooms.items()
+        }
+        everyone = [socket for room_sockets in sockets.values() for socket in room_sockets]
+        results = await asyncio.gather(*(socket.connect() for socket in everyone))
+        if not all(connected for connected, _ in results):
+            raise CommandError("Some benchmark sockets were refused")
+
+        messages = options['messages']
+        sent_at = {}
+        latencies = []
+        last_delivery = [0.0]
+
+        async def read(socket):
+            received = 0
+            while received < messages:
+                try:
+                    data = await socket.receive_from(timeout=options['timeout'])
+                except asyncio.TimeoutError:
+                    break
+                frame = framing.unpack(data) if isinstance(data, bytes) else json.loads(data)
+                started = sent_at.get(frame.get("text"))
+                # History and presence frames carry no matching text
+                if started is not None:
+                    last_delivery[0] = time.perf_counter()
+                    latencies.append(last_delivery[0] - started)
+                    received += 1
+            return received
+
+        async def post(room, socket):
+            for n in range(messages):
+                text = f"bench {room} {n}"
+                sent_at[text] = time.perf_counter()
+                await socket.send_to(text_data=json.dumps({"text": text}))
+                if options['rate']:
+                    await asyncio.sleep(1 / options['rate'])
+
+        readers = [asyncio.ensure_future(read(socket)) for socket in everyone]
+        started = time.perf_counter()
+        await asyncio.gather(*(post(room, room_sockets[0]) for room, room_sockets in sockets.items()))
+        delivered = sum(await asyncio.gather(*readers))
+        # Up to the last delivery, not the timeout spent waiting for lost ones
+        total = max(last_delivery[0] - started, 1e-9)
+
+        # A socket whose read timed out has already been torn down by the communicator
+        await asyncio.gather(*(socket.disconnect() for socket in everyone), return_exceptions=True)
+        return len(sent_at), delivered, len(everyone) * messages, total, latencies
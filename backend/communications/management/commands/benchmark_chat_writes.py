@@ -0,0 +1,84 @@
+import asyncio
+import statistics
+import time
+
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import User
+from communications import snowflake, write_behind
+from communications.models import ChatMessage
+
+
+BENCH_EMAIL = "bench-chat-writes@example.invalid"
+ROOM = "bench_chat_writes"
+
+
+@database_sync_to_async
+def _create_one(sender, text):
+    """One INSERT per message on the thread pool, as consumers do without write-behind."""
+    return ChatMessage.objects.create(conversation_id=ROOM, sender=sender, text=text, created_at=timezone.now())
+
+
+async def _buffer_one(writer, sender, text):
+    message = ChatMessage(
+        id=snowflake.next_id(), conversation_id=ROOM, sender=sender, text=text, created_at=timezone.now()
+    )
+    return writer.add(message)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare chat message persistence with one INSERT per message against write-behind "
+        "bulk inserts: concurrent senders post messages, timing each send (what a sender "
+        "waits for before the broadcast) and the total time until every row is saved. "
+        "Writes to the configured database under its own user and deletes the rows afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='Messages per mode (default: 2000)')
+        parser.add_argument('--senders', type=int, default=20, help='Concurrent senders (default: 20)')
+
+    def handle(self, *args, **options):
+        sender, _ = User.objects.get_or_create(email=BENCH_EMAIL, defaults={'role': User.Role.FACULTY})
+        try:
+            asyncio.run(self._main(sender, options))
+        finally:
+            # Cascades to the benchmark's messages
+            sender.delete()
+
+    async def _main(self, sender, options):
+        self.stdout.write(
+            f"{'mode':>13} {'messages':>9} {'senders':>8} {'total s':>8} {'msg/s':>9} {'p50 ms':>8} {'p95 ms':>8}"
+        )
+        writer = write_behind.MessageWriter()
+        modes = (
+            ('per-message', lambda text: _create_one(sender, text), None),
+            ('write-behind', lambda text: _buffer_one(writer, sender, text), writer.flush),
+        )
+        for mode, send, finish in modes:
+            total, timings = await self._run(send, finish, options['messages'], options['senders'])
+            saved = await database_sync_to_async(ChatMessage.objects.filter(conversation_id=ROOM).count)()
+            timings.sort()
+            p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+            self.stdout.write(
+                f"{mode:>13} {saved:>9} {options['senders']:>8} {total:>8.2f} {saved / total:>9.0f} "
+                f"{statistics.median(timings) * 1000:>8.2f} {p95 * 1000:>8.2f}"
+            )
+            await database_sync_to_async(ChatMessage.objects.filter(conversation_id=ROOM).delete)()
+
+    async def _run(self, send, finish, messages, senders):
+        timings = []
+
+        async def sender_loop(n):
+            for i in range(n, messages, senders):
+                started = time.perf_counter()
+                await send(f"benchmark message {i}")
+                timings.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender_loop(n) for n in range(senders)))
+        if finish is not None:
+            await finish()
+        return time.perf_counter() - started, timings
@@ -0,0 +1,106 @@
+import asyncio
+import random
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from communications.presence import PresenceBroadcaster, presence_group
+
+
+class CountingChannelLayer(InMemoryChannelLayer):
+    """In-memory layer that counts group sends and per-socket deliveries instead of queueing them"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.group_sends = 0
+        self.deliveries = 0
+
+    async def group_send(self, group, message):
+        self.group_sends += 1
+        await super().group_send(group, message)
+
+    async def send(self, channel, message):
+        self.deliveries += 1
+
+    def _clean_expired(self):
+        # Nothing is queued, so nothing expires; skip the scan over every group
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate presence churn across many chat sockets and count channel-layer "
+        "messages for the old global 'presence' group and for targeted, batched fan-out."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sockets', nargs='+', type=int, default=[1000, 5000],
+            help='Concurrent sockets, one user each (default: 1000 5000)'
+        )
+        parser.add_argument('--contacts', type=int, default=20, help='Conversation partners per user (default: 20)')
+        parser.add_argument(
+            '--churn', type=float, default=0.2,
+            help='Fraction of users that reconnect (offline then online) during the run (default: 0.2)'
+        )
+        parser.add_argument('--ticks', type=int, default=10, help='Batch ticks the churn is spread over (default: 10)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'sockets':>8} {'model':>9} {'changes':>8} {'group_sends':>12} {'deliveries':>12} {'per change':>11}"
+        )
+        for sockets in options['sockets']:
+            rng = random.Random(options['seed'])
+            contacts = self._contacts(sockets, options['contacts'], rng)
+            reconnecting = rng.sample(range(1, sockets + 1), int(sockets * options['churn']))
+            ticks = [reconnecting[i::options['ticks']] for i in range(options['ticks'])]
+            for model in ('global', 'targeted'):
+                layer = asyncio.run(getattr(self, f'_run_{model}')(sockets, contacts, ticks))
+                changes = 2 * len(reconnecting)
+                self.stdout.write(
+                    f"{sockets:>8} {model:>9} {changes:>8} {layer.group_sends:>12} {layer.deliveries:>12} "
+                    f"{layer.deliveries / max(changes, 1):>11.1f}"
+                )
+
+    def _contacts(self, users, per_user, rng):
+        contacts = {user: set() for user in range(1, users + 1)}
+        for user in contacts:
+            while len(contacts[user]) < min(per_user, users - 1):
+                other = rng.randint(1, users)
+                if other != user:
+                    contacts[user].add(other)
+                    contacts[other].add(user)
+        return contacts
+
+    async def _run_global(self, users, contacts, ticks):
+        """Previous behaviour: every socket in 'presence', each change sent to it and to user_<id>"""
+        layer = CountingChannelLayer()
+        for user in contacts:
+            channel = f'socket.{user}'
+            await layer.group_add('presence', channel)
+            await layer.group_add(f'user_{user}', channel)
+        for tick in ticks:
+            for user in tick:
+                for status in ('offline', 'online'):
+                    payload = {'event': 'presence', 'user_id': user, 'status': status}
+                    await layer.group_send('presence', {'type': 'presence.update', 'payload': payload})
+                    await layer.group_send(f'user_{user}', {'type': 'presence.update', 'payload': payload})
+        return layer
+
+    async def _run_targeted(self, users, contacts, ticks):
+        """Each socket watches its partners; a reconnect within one tick coalesces to one update"""
+        layer = CountingChannelLayer()
+        for user, partners in contacts.items():
+            for partner in partners:
+                await layer.group_add(presence_group(partner), f'socket.{user}')
+        with override_settings(PRESENCE_BATCH_INTERVAL=0.001):
+            broadcaster = PresenceBroadcaster(layer)
+            for tick in ticks:
+                for user in tick:
+                    broadcaster.publish(user, 'offline')
+                    broadcaster.publish(user, 'online')
+                while broadcaster.pending or broadcaster._task:
+                    await asyncio.sleep(0.002)
+        return layer
@@ -0,0 +1,108 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from communications.presence import LIVE_SCRIPT, count_key, get_store
+from communications.redis_client import aclose_redis, get_async_redis, get_script
+
+
+BACKENDS = {
+    'memory': 'communications.presence.MemoryPresenceStore',
+    'redis': 'communications.presence.RedisPresenceStore',
+}
+# Far above real user ids, so the Redis run only touches its own presence:conns:* keys
+FIRST_USER = 10 ** 9
+
+
+async def _sequential_snapshot(user_ids):
+    """One LIVE_SCRIPT round trip per user, kept here as the baseline for the pipeline."""
+    r = get_async_redis()
+    script = get_script(r, LIVE_SCRIPT)
+    return [user_id for user_id in user_ids if await script(keys=[count_key(user_id)])]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the presence snapshot sent to each new chat socket (get_store().watched_snapshot) "
+        "against the number of watched users, for the memory and Redis presence stores. The "
+        "Redis run needs settings.REDIS_URL, also times one round trip per user as a baseline, "
+        "and deletes its keys afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', nargs='+', type=int, default=[100, 1000, 3000],
+            help='Watched-user counts to benchmark (default: 100 1000 3000)'
+        )
+        parser.add_argument(
+            '--backend', nargs='+', choices=sorted(BACKENDS), default=['memory', 'redis'],
+            help='Presence stores to benchmark (default: memory redis)'
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Snapshots timed per size (default: 20)')
+        parser.add_argument(
+            '--stale', type=float, default=0.05,
+            help='Fraction of watched users whose only socket has expired (default: 0.05)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'users':>7} {'mode':>16} {'online':>7} {'first ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for backend in options['backend']:
+            with override_settings(PRESENCE_BACKEND=BACKENDS[backend]):
+                try:
+                    asyncio.run(self._run(backend, options))
+                except RedisConnectionError as exc:
+                    raise CommandError(f"Redis is not reachable: {exc}")
+
+    async def _run(self, backend, options):
+        store = get_store()
+        modes = [(backend, store.watched_snapshot)]
+        if backend == 'redis':
+            modes.append(('redis-sequential', _sequential_snapshot))
+        try:
+            for users in options['users']:
+                user_ids = list(range(FIRST_USER, FIRST_USER + users))
+                try:
+                    await self._seed(store, user_ids, options['stale'])
+                    for mode, snapshot in modes:
+                        self._report(users, mode, await self._time(snapshot, user_ids, options['repeat']))
+                finally:
+                    await self._clear(store, user_ids)
+        finally:
+            if backend == 'redis':
+                await aclose_redis()
+
+    async def _time(self, snapshot, user_ids, repeat):
+        timings = []
+        online = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            online = await snapshot(user_ids)
+            timings.append(time.perf_counter() - started)
+        return online, timings
+
+    def _report(self, users, mode, result):
+        online, timings = result
+        first = timings[0]
+        timings.sort()
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f"{users:>7} {mode:>16} {len(online):>7} {first * 1000:>9.2f} "
+            f"{statistics.median(timings) * 1000:>8.2f} {p95 * 1000:>8.2f}"
+        )
+
+    async def _seed(self, store, user_ids, stale):
+        live = len(user_ids) - int(len(user_ids) * stale)
+        for user_id in user_ids[:live]:
+            await store.connect(user_id, f"bench-{user_id}")
+        # Registered with no time to live: expired by the time of the first snapshot
+        with override_settings(PRESENCE_TTL=0):
+            for user_id in user_ids[live:]:
+                await store.connect(user_id, f"bench-{user_id}")
+
+    async def _clear(self, store, user_ids):
+        for user_id in user_ids:
+            await store.disconnect(user_id, f"bench-{user_id}")
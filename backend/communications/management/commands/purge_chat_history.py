@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from communications.purge import purge_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove chat messages hidden by a history delete whose background purge did not finish "
+        "(e.g. the server restarted). Deletes in chunks of CHAT_PURGE_CHUNK_SIZE."
+    )
+
+    def handle(self, *args, **options):
+        removed = purge_all()
+        self.stdout.write(self.style.SUCCESS(f"Purged {removed} chat messages."))
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_conversations(apps, schema_editor):
+    """One conversation per existing room, with everything so far counted as read"""
+    ChatMessage = apps.get_model('communications', 'ChatMessage')
+    Conversation = apps.get_model('communications', 'Conversation')
+    ConversationMember = apps.get_model('communications', 'ConversationMember')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    newest = (
+        ChatMessage.objects.filter(conversation_id=OuterRef('conversation_id'))
+        .order_by('-created_at', '-id')
+        .values('id')[:1]
+    )
+    last_ids = (
+        ChatMessage.objects.order_by()
+        .values('conversation_id')
+        .annotate(last_id=Subquery(newest))
+        .values_list('last_id', flat=True)
+    )
+    user_ids = set(User.objects.values_list('id', flat=True))
+
+    for message in ChatMessage.objects.filter(id__in=list(last_ids)).iterator():
+        conversation = Conversation.objects.create(
+            room=message.conversation_id,
+            last_message_id=message.id,
+            last_message_at=message.created_at,
+            last_message_text=message.text[:200],
+            last_sender_id=message.sender_id,
+        )
+        try:
+            participants = sorted({int(part) for part in message.conversation_id.split('_')})
+        except ValueError:
+            continue
+        if not user_ids.issuperset(participants):
+            continue
+        pairs = [(participants[0], participants[-1]), (participants[-1], participants[0])]
+        ConversationMember.objects.bulk_create([
+            ConversationMember(
+                conversation=conversation,
+                user_id=user_id,
+                peer_id=peer_id,
+                last_message_at=message.created_at,
+                last_read_message_id=message.id,
+            )
+            for user_id, peer_id in dict(pairs).items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0002_chatmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room', models.CharField(max_length=255, unique=True)),
+                ('last_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('last_message_text', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConversationMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('last_read_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='communications.conversation')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='communicati_user_id_68c77e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'user'), name='unique_conversation_member')],
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
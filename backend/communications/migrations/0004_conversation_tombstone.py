@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0003_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='cleared_through_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='cleared_through_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -197,3 +197,58 @@ class ChatMessage(models.Model):
     def __str__(self):
         return f"{self.sender} @ {self.created_at:%Y-%m-%d %H:%M}: {self.text[:30]}"
 
+
+class Conversation(models.Model):
+    """
+    Index row for a chat room, updated on every message write so inboxes
+    read it instead of aggregating ChatMessage.
+    """
+    room = models.CharField(max_length=255, unique=True)
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_text = models.CharField(max_length=200, blank=True)
+    last_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    # Tombstone: messages up to and including this (created_at, id) were deleted and
+    # are hidden until the background purge removes them
+    cleared_through_at = models.DateTimeField(null=True, blank=True)
+    cleared_through_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.room
+
+
+class ConversationMember(models.Model):
+    """
+    A participant's view of a conversation: who the other participant is,
+    their last-read pointer and unread count. ``last_message_at`` mirrors the
+    conversation's so the inbox is one index scan per page.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='members')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='conversation_memberships'
+    )
+    # The other participant; the user themself in their notes-to-self room
+    peer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_read_message_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-last_message_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='unique_conversation_member'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in {self.conversation}"
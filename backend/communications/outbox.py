@@ -0,0 +1,152 @@
+"""
+Message notifications for the recipients of a chat message.
+
+Besides the ``chat_<room>`` broadcast, every new message is sent to each
+recipient's ``user_<id>`` group as a compact ``notification`` envelope, so
+one socket per user hears about every conversation. Sockets subscribed to the
+message's room drop the envelope, as they already get the message itself.
+
+Each envelope is first appended to the recipient's outbox, which keeps the
+last ``CHAT_OUTBOX_SIZE`` entries. A client that was away drains what it
+missed with one ``GET /api/chat/outbox/?after=<cursor>``; every envelope
+carries its ``cursor``. The outbox lives where ``CHAT_OUTBOX_BACKEND`` says:
+``RedisOutbox`` (one capped stream per user, shared by all processes) or
+``MemoryOutbox`` (this process only).
+"""
+import asyncio
+import itertools
+import json
+import logging
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import inbox
+from .redis_client import get_async_redis, get_redis
+
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_LENGTH = 100
+KEY_PREFIX = "outbox:"
+STREAM_ID_RE = re.compile(r"\d+-\d+")
+
+
+def outbox_size():
+    return getattr(settings, 'CHAT_OUTBOX_SIZE', 200)
+
+
+def outbox_ttl():
+    return getattr(settings, 'CHAT_OUTBOX_TTL', 7 * 24 * 3600)
+
+
+def envelope_for(message):
+    return {
+        "event": "notification",
+        "room": message.conversation_id,
+        "message_id": message.id,
+        "sender_id": message.sender_id,
+        "preview": message.text[:PREVIEW_LENGTH],
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+class Outbox(ABC):
+    """Bounded per-user envelope log; cursors are opaque, increasing strings"""
+
+    @abstractmethod
+    async def push(self, user_ids, envelope):
+        """Append ``envelope`` for each user; returns {user id: cursor}"""
+
+    @abstractmethod
+    def read(self, user_id, after=None):
+        """Envelopes after cursor ``after`` (all kept if None), oldest first; ValueError on a bad cursor"""
+
+
+class RedisOutbox(Outbox):
+    """A capped Redis stream per user, expiring ``CHAT_OUTBOX_TTL`` after its last entry"""
+
+    async def push(self, user_ids, envelope):
+        data = json.dumps(envelope)
+        pipe = get_async_redis().pipeline(transaction=False)
+        for user_id in user_ids:
+            key = f"{KEY_PREFIX}{user_id}"
+            pipe.xadd(key, {"e": data}, maxlen=outbox_size(), approximate=True)
+            pipe.expire(key, outbox_ttl())
+        results = await pipe.execute()
+        return dict(zip(user_ids, results[::2]))
+
+    def read(self, user_id, after=None):
+        if after is not None and not STREAM_ID_RE.fullmatch(after):
+            raise ValueError("Invalid outbox cursor")
+        key = f"{KEY_PREFIX}{user_id}"
+        if after is None:
+            # Approximate trimming can leave more than the cap; the newest count
+            entries = get_redis().xrevrange(key, max="+", min="-", count=outbox_size())[::-1]
+        else:
+            entries = get_redis().xrange(key, min=f"({after}", max="+", count=outbox_size())
+        return [dict(json.loads(fields["e"]), cursor=entry_id) for entry_id, fields in entries]
+
+
+class MemoryOutbox(Outbox):
+    """Envelopes kept in this process only; pair it with the in-memory channel layer"""
+
+    def __init__(self):
+        # The consumer pushes from the event loop, the outbox view reads from request threads
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._seq = itertools.count(1)
+
+    async def push(self, user_ids, envelope):
+        cursors = {}
+        with self._lock:
+            for user_id in user_ids:
+                entries = self._entries.get(user_id)
+                if entries is None:
+                    entries = self._entries[user_id] = deque(maxlen=outbox_size())
+                seq = next(self._seq)
+                entries.append((seq, envelope))
+                cursors[user_id] = str(seq)
+        return cursors
+
+    def read(self, user_id, after=None):
+        after = int(after) if after else 0
+        with self._lock:
+            return [dict(envelope, cursor=str(seq)) for seq, envelope in self._entries.get(user_id, ()) if seq > after]
+
+
+_outbox_lock = threading.Lock()
+_outbox = None
+
+
+def get_outbox():
+    """The process-wide outbox named by ``CHAT_OUTBOX_BACKEND``"""
+    global _outbox
+    path = getattr(settings, 'CHAT_OUTBOX_BACKEND', 'communications.outbox.RedisOutbox')
+    with _outbox_lock:
+        if _outbox is None or _outbox[0] != path:
+            _outbox = (path, import_string(path)())
+        return _outbox[1]
+
+
+async def notify(channel_layer, message):
+    """Record ``message``'s envelope for its recipients and push it to their user groups"""
+    recipients = [uid for uid in inbox.room_participants(message.conversation_id) if uid != message.sender_id]
+    if not recipients:
+        return
+    envelope = envelope_for(message)
+    try:
+        cursors = await get_outbox().push(recipients, envelope)
+        await asyncio.gather(*(
+            channel_layer.group_send(
+                f"user_{user_id}", {"type": "chat.notification", "payload": dict(envelope, cursor=cursors[user_id])}
+            )
+            for user_id in recipients
+        ))
+    except Exception:
+        # The message itself is saved and broadcast; only the notification is lost
+        logger.exception("Could not notify recipients of message %s", message.id)
@@ -0,0 +1,397 @@
+"""
+Chat presence: who is online, and the groups that hear about it.
+
+Open sockets live in a ``PresenceStore`` chosen by ``PRESENCE_BACKEND``:
+``RedisPresenceStore`` shares them between server processes,
+``MemoryPresenceStore`` keeps them in this process for a single-node deploy
+without Redis and for tests.
+
+Each open socket is an entry of its own (``presence:conns:<id>`` in Redis, a
+sorted set scored by expiry) and a user is online while any of their entries
+is live, so closing one of several tabs does not mark the user offline.
+Entries expire ``PRESENCE_TTL`` seconds after the socket's last heartbeat or
+its process's last sweep, so those left behind by a crashed process go away
+on their own. A heartbeat after expiry re-registers only its own socket, so
+the other tabs come back with their own heartbeats instead of being lost
+from a shared count.
+
+Status changes are not broadcast to everyone: each socket joins
+``presence_<id>`` for the users it watches (its conversation partners plus
+any it subscribes to), and a per-process ``PresenceBroadcaster`` coalesces
+transitions and publishes each user's final status to that group once per
+``PRESENCE_BATCH_INTERVAL``.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .redis_client import get_async_redis, get_redis, get_script
+
+
+logger = logging.getLogger(__name__)
+
+COUNT_KEY_PREFIX = "presence:conns:"
+
+# Every script touches only the keys passed in KEYS (one per call), so the
+# keys may live on any Redis Cluster node and callers pipeline one call per user.
+
+# Milliseconds on the Redis clock, so every process agrees on expiry
+NOW_MS = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+"""
+
+# KEYS[1] = connections key; returns the number of live connections
+LIVE_SCRIPT = NOW_MS + """
+return redis.call('ZCOUNT', KEYS[1], '(' .. now, '+inf')
+"""
+
+# Register (or re-register) one connection until now + TTL and drop expired ones.
+# KEYS[1] = connections key, ARGV[1] = connection id, ARGV[2] = TTL seconds
+# Returns 1 if the user already had a live connection (was online), 0 otherwise
+REGISTER_SCRIPT = NOW_MS + """
+local ttl = tonumber(ARGV[2]) * 1000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local online = redis.call('ZCARD', KEYS[1]) > 0
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ttl)
+if online then
+    return 1
+end
+return 0
+"""
+
+# KEYS[1] = connections key, ARGV[1] = connection id, ARGV[2] = login entry
+# Returns the live connections left, or -1 if this one had already expired
+DISCONNECT_SCRIPT = NOW_MS + """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return -1
+end
+-- A login without a socket only counts until the user's sockets come and go
+redis.call('ZREM', KEYS[1], ARGV[2])
+local remaining = redis.call('ZCARD', KEYS[1])
+if remaining == 0 then
+    redis.call('DEL', KEYS[1])
+end
+return remaining
+"""
+
+# Extend one live connection; an expired one is left for its next heartbeat to re-register
+# KEYS[1] = connections key, ARGV[1] = connection id, ARGV[2] = TTL seconds
+RENEW_SCRIPT = NOW_MS + """
+local ttl = tonumber(ARGV[2]) * 1000
+local expires = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if expires and tonumber(expires) > now then
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], ttl)
+end
+return 0
+"""
+
+# Stands in for a socket between login and the first socket (see set_online)
+LOGIN_ENTRY = "login"
+
+
+def count_key(user_id):
+    """Sorted set of the user's live connections, scored by expiry (Redis ms)"""
+    return f"{COUNT_KEY_PREFIX}{user_id}"
+
+
+def presence_group(user_id):
+    """Channel-layer group of the sockets watching ``user_id``"""
+    return f"presence_{user_id}"
+
+
+def presence_ttl():
+    return getattr(settings, 'PRESENCE_TTL', 120)
+
+
+def batch_interval():
+    return getattr(settings, 'PRESENCE_BATCH_INTERVAL', 0.5)
+
+
+async def watched_snapshot(r, user_ids):
+    """Those of ``user_ids`` with a live connection, in one pipelined round trip"""
+    if not user_ids:
+        return []
+    script = get_script(r, LIVE_SCRIPT)
+    pipe = r.pipeline(transaction=False)
+    for user_id in user_ids:
+        await script(keys=[count_key(user_id)], client=pipe)
+    live = await pipe.execute()
+    return [user_id for user_id, count in zip(user_ids, live) if count]
+
+
+async def connect(r, user_id, connection_id):
+    """Register one open socket for the user; True if they just came online"""
+    script = get_script(r, REGISTER_SCRIPT)
+    existed = await script(keys=[count_key(user_id)], args=[connection_id, presence_ttl()])
+    return not existed
+
+
+async def disconnect(r, user_id, connection_id):
+    """Drop one socket of the user; True if that was their last one"""
+    script = get_script(r, DISCONNECT_SCRIPT)
+    remaining = await script(keys=[count_key(user_id)], args=[connection_id, LOGIN_ENTRY])
+    return remaining == 0
+
+
+async def touch(r, user_id, connection_id):
+    """
+    Heartbeat: extend this socket, re-registering it if it had expired.
+    True if the user had no live socket left and is back online.
+    """
+    return await connect(r, user_id, connection_id)
+
+
+async def renew(r, connections):
+    """Extend many (user id, connection id) pairs in one pipelined round trip"""
+    script = get_script(r, RENEW_SCRIPT)
+    ttl = presence_ttl()
+    pipe = r.pipeline(transaction=False)
+    for user_id, connection_id in connections:
+        await script(keys=[count_key(user_id)], args=[connection_id, ttl], client=pipe)
+    await pipe.execute()
+
+
+class PresenceStore(ABC):
+    """
+    Open sockets per user, each identified by a connection id (the socket's
+    channel name). Consumers use the async methods; views use
+    ``set_online``/``set_offline``. User ids come back as ints.
+    """
+
+    @abstractmethod
+    async def connect(self, user_id, connection_id):
+        """Register one open socket for the user; True if they just came online"""
+
+    @abstractmethod
+    async def disconnect(self, user_id, connection_id):
+        """Drop one socket of the user; True if that was their last one"""
+
+    @abstractmethod
+    async def touch(self, user_id, connection_id):
+        """Heartbeat: extend (or re-register) this socket; True if the user is back online"""
+
+    @abstractmethod
+    async def renew(self, connections):
+        """Extend the live sockets among (user id, connection id) pairs"""
+
+    @abstractmethod
+    async def watched_snapshot(self, user_ids):
+        """Which of the given users are online"""
+
+    @abstractmethod
+    def set_online(self, user_id):
+        """Online for one TTL window without a socket (login)"""
+
+    @abstractmethod
+    def set_offline(self, user_id):
+        """Offline now, whatever sockets are registered (logout)"""
+
+
+class RedisPresenceStore(PresenceStore):
+    """Sockets in Redis (``REDIS_URL``), shared by every server process"""
+
+    async def connect(self, user_id, connection_id):
+        return await connect(get_async_redis(), user_id, connection_id)
+
+    async def disconnect(self, user_id, connection_id):
+        return await disconnect(get_async_redis(), user_id, connection_id)
+
+    async def touch(self, user_id, connection_id):
+        return await touch(get_async_redis(), user_id, connection_id)
+
+    async def renew(self, connections):
+        await renew(get_async_redis(), connections)
+
+    async def watched_snapshot(self, user_ids):
+        return [int(uid) for uid in await watched_snapshot(get_async_redis(), user_ids)]
+
+    def set_online(self, user_id):
+        script = get_script(get_redis(), REGISTER_SCRIPT)
+        script(keys=[count_key(user_id)], args=[LOGIN_ENTRY, presence_ttl()])
+
+    def set_offline(self, user_id):
+        get_redis().delete(count_key(user_id))
+
+
+class MemoryPresenceStore(PresenceStore):
+    """
+    Sockets in this process only, with the same TTL rules as Redis. Use it
+    with the in-memory channel layer on a single server process.
+    """
+
+    def __init__(self):
+        # Views call in from request threads, consumers from the event loop
+        self._lock = threading.Lock()
+        # user id -> {connection id: expires at (monotonic)}
+        self._connections = {}
+
+    def _live(self, user_id, now):
+        """The user's unexpired entries, dropping the rest"""
+        entries = self._connections.get(user_id)
+        if entries is None:
+            return {}
+        for connection_id in [cid for cid, expires in entries.items() if expires <= now]:
+            del entries[connection_id]
+        if not entries:
+            del self._connections[user_id]
+            return {}
+        return entries
+
+    def _register(self, user_id, connection_id):
+        now = time.monotonic()
+        online = bool(self._live(user_id, now))
+        self._connections.setdefault(user_id, {})[connection_id] = now + presence_ttl()
+        return online
+
+    async def connect(self, user_id, connection_id):
+        with self._lock:
+            return not self._register(user_id, connection_id)
+
+    async def disconnect(self, user_id, connection_id):
+        with self._lock:
+            entries = self._live(user_id, time.monotonic())
+            if entries.pop(connection_id, None) is None:
+                return False
+            entries.pop(LOGIN_ENTRY, None)
+            if not entries:
+                self._connections.pop(user_id, None)
+                return True
+            return False
+
+    async def touch(self, user_id, connection_id):
+        return await self.connect(user_id, connection_id)
+
+    async def renew(self, connections):
+        with self._lock:
+            now = time.monotonic()
+            for user_id, connection_id in connections:
+                entries = self._live(user_id, now)
+                if connection_id in entries:
+                    entries[connection_id] = now + presence_ttl()
+
+    async def watched_snapshot(self, user_ids):
+        with self._lock:
+            now = time.monotonic()
+            return [user_id for user_id in user_ids if self._live(user_id, now)]
+
+    def set_online(self, user_id):
+        with self._lock:
+            self._register(user_id, LOGIN_ENTRY)
+
+    def set_offline(self, user_id):
+        with self._lock:
+            self._connections.pop(user_id, None)
+
+
+_store_lock = threading.Lock()
+_store = None
+
+
+def get_store():
+    """The process-wide store named by ``PRESENCE_BACKEND``"""
+    global _store
+    path = getattr(settings, 'PRESENCE_BACKEND', 'communications.presence.RedisPresenceStore')
+    with _store_lock:
+        if _store is None or _store[0] != path:
+            _store = (path, import_string(path)())
+        return _store[1]
+
+
+class PresenceSweeper:
+    """
+    Renews every socket open on this process, every
+    ``PRESENCE_SWEEP_INTERVAL`` seconds, in one pipeline. Runs only while
+    there are local connections.
+    """
+
+    def __init__(self):
+        # (user id, connection id) of each local socket
+        self.local = set()
+        self._task = None
+
+    def add(self, user_id, connection_id):
+        self.local.add((user_id, connection_id))
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def remove(self, user_id, connection_id):
+        self.local.discard((user_id, connection_id))
+
+    async def _run(self):
+        interval = getattr(settings, 'PRESENCE_SWEEP_INTERVAL', 30)
+        try:
+            while self.local:
+                await asyncio.sleep(interval)
+                if not self.local:
+                    break
+                try:
+                    await get_store().renew(list(self.local))
+                except Exception:
+                    logger.exception("Could not renew presence for %d sockets", len(self.local))
+        finally:
+            self._task = None
+
+
+class PresenceBroadcaster:
+    """
+    Collects presence transitions and, once per ``PRESENCE_BATCH_INTERVAL``,
+    sends each changed user's latest status to their ``presence_<id>``
+    group. A user who flaps online/offline within one tick costs one
+    message, not one per transition.
+    """
+
+    def __init__(self, channel_layer):
+        self.channel_layer = channel_layer
+        self.pending = {}
+        self._task = None
+
+    def publish(self, user_id, status):
+        self.pending[user_id] = status
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(batch_interval())
+        pending, self.pending = self.pending, {}
+        # Anything published while we send below schedules the next tick
+        self._task = None
+        for user_id, status in pending.items():
+            try:
+                await self.channel_layer.group_send(
+                    presence_group(user_id),
+                    {"type": "presence.update", "payload": {"event": "presence", "user_id": user_id, "status": status}},
+                )
+            except Exception:
+                logger.exception("Could not publish presence for user %s", user_id)
+
+
+_sweepers = weakref.WeakKeyDictionary()
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+def get_sweeper():
+    """The sweeper of the running event loop"""
+    loop = asyncio.get_running_loop()
+    sweeper = _sweepers.get(loop)
+    if sweeper is None:
+        sweeper = _sweepers[loop] = PresenceSweeper()
+    return sweeper
+
+
+def get_broadcaster(channel_layer):
+    """The broadcaster of the running event loop"""
+    loop = asyncio.get_running_loop()
+    broadcaster = _broadcasters.get(loop)
+    if broadcaster is None or broadcaster.channel_layer is not channel_layer:
+        broadcaster = _broadcasters[loop] = PresenceBroadcaster(channel_layer)
+    return broadcaster
@@ -0,0 +1,141 @@
+"""
+Deleting chat history without holding the database for the whole delete.
+
+``clear_history`` only writes a tombstone on the room's Conversation: every
+message sent before the delete is hidden from history reads at once. A
+background worker then removes those rows in primary-key chunks of
+``CHAT_PURGE_CHUNK_SIZE``, each a single ``DELETE ... WHERE id IN (SELECT
+... LIMIT n)`` statement committed on its own, so other writers interleave
+with a large purge. No model instances are loaded and no per-row signals
+are sent; nothing has a foreign key to ChatMessage, so there is nothing to
+cascade. A purge cut short by a restart is finished by
+``python manage.py purge_chat_history``.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import inbox
+from .models import ChatMessage, Conversation, ConversationMember
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-purge')
+    return _executor
+
+
+def chunk_size():
+    return getattr(settings, 'CHAT_PURGE_CHUNK_SIZE', 1000)
+
+
+def cleared(conversation):
+    """Filter matching the messages hidden by ``conversation``'s tombstone"""
+    return Q(created_at__lt=conversation.cleared_through_at) | Q(
+        created_at=conversation.cleared_through_at, id__lte=conversation.cleared_through_id
+    )
+
+
+def visible_messages(room):
+    """The room's messages minus those awaiting purge"""
+    queryset = ChatMessage.objects.filter(conversation_id=room)
+    conversation = Conversation.objects.filter(room=room, cleared_through_at__isnull=False).first()
+    if conversation is not None:
+        queryset = queryset.exclude(cleared(conversation))
+    return queryset
+
+
+def clear_history(room, through=None):
+    """
+    Hide every message of ``room`` sent up to ``through`` (default now) and
+    schedule their removal. Returns how many messages were cleared.
+    """
+    last = ChatMessage.objects.filter(conversation_id=room).order_by('-created_at', '-id').first()
+    if last is None:
+        return 0
+
+    count = visible_messages(room).filter(
+        Q(created_at__lt=last.created_at) | Q(created_at=last.created_at, id__lte=last.id)
+    ).count()
+    # Past the latest saved message, so messages still buffered by the
+    # write-behind writers are hidden as well
+    tombstone = {
+        'cleared_through_at': max(last.created_at, through or timezone.now()),
+        'cleared_through_id': last.id,
+        'last_message_id': None,
+        'last_message_at': None,
+        'last_message_text': '',
+        'last_sender': None,
+    }
+
+    with transaction.atomic():
+        # Write first: on SQLite a transaction that reads before its first write
+        # cannot take the write lock while another writer is waiting for it
+        if not Conversation.objects.filter(room=room).update(**tombstone):
+            Conversation.objects.filter(pk=inbox.get_conversation(room).pk).update(**tombstone)
+        # Drops out of inboxes until the next message
+        ConversationMember.objects.filter(conversation__room=room).update(last_message_at=None, unread_count=0)
+        transaction.on_commit(lambda: _get_executor().submit(purge_room, room))
+
+    return count
+
+
+def purge_messages(room):
+    """Delete the room's tombstoned messages in bounded chunks; returns how many were removed"""
+    conversation = Conversation.objects.filter(room=room, cleared_through_at__isnull=False).first()
+    if conversation is None:
+        return 0
+
+    # Oldest first along the (conversation_id, created_at) index, so each chunk
+    # stops after `size` rows instead of sorting the whole backlog
+    chunk = (
+        ChatMessage.objects.filter(cleared(conversation), conversation_id=room)
+        .order_by('created_at')
+        .values('pk')[:chunk_size()]
+    )
+    select_sql, params = chunk.query.sql_with_params()
+    # Raw on purpose: one statement per chunk, as a separate SELECT would hold a
+    # read lock that SQLite cannot upgrade while another writer is waiting, and
+    # QuerySet.delete() would load every row to send post_delete (search listens
+    # for every model)
+    delete_sql = 'DELETE FROM {} WHERE {} IN ({})'.format(
+        connection.ops.quote_name(ChatMessage._meta.db_table),
+        connection.ops.quote_name(ChatMessage._meta.pk.column),
+        select_sql,
+    )
+    removed = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(delete_sql, params)
+            deleted = cursor.rowcount
+        if not deleted:
+            return removed
+        removed += deleted
+
+
+def purge_room(room):
+    """Purge one room (runs on the purge worker thread)"""
+    close_old_connections()
+    try:
+        removed = purge_messages(room)
+        logger.info("Purged %d messages from %s", removed, room)
+    except Exception:
+        logger.exception("Could not purge chat history of %s", room)
+    finally:
+        connection.close()
+
+
+def purge_all():
+    """Finish every pending purge in this thread; returns how many messages were removed"""
+    rooms = Conversation.objects.filter(cleared_through_at__isnull=False).values_list('room', flat=True)
+    return sum(purge_messages(room) for room in rooms)
@@ -0,0 +1,97 @@
+"""
+Process-wide Redis clients for chat presence.
+
+``get_redis()`` returns a synchronous client for views, and
+``get_async_redis()`` an asyncio client for consumers. Each is backed by a
+single blocking connection pool sized by ``REDIS_MAX_CONNECTIONS``, so
+connects and disconnects reuse sockets instead of opening a new pool per
+call. asyncio connections belong to the event loop that opened them, so
+there is one async client per running loop (in practice one per server
+process).
+
+``get_script()`` registers a Lua script on a client once and keeps the
+Script, which holds its SHA and reloads it if the server has lost it.
+
+Pools are closed on ASGI lifespan shutdown (see ``communications.lifespan``)
+and, for the sync pool, at interpreter exit.
+"""
+import asyncio
+import atexit
+import threading
+import weakref
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+
+_lock = threading.Lock()
+_sync_client = None
+_async_clients = weakref.WeakKeyDictionary()
+# client -> {script source: Script}
+_scripts = weakref.WeakKeyDictionary()
+
+
+def _pool_options():
+    return {
+        'max_connections': getattr(settings, 'REDIS_MAX_CONNECTIONS', 50),
+        'timeout': getattr(settings, 'REDIS_POOL_TIMEOUT', 5),
+        'decode_responses': True,
+    }
+
+
+def _url():
+    return getattr(settings, 'REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+
+def get_redis():
+    """Shared synchronous client"""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                pool = redis.BlockingConnectionPool.from_url(_url(), **_pool_options())
+                _sync_client = redis.Redis(connection_pool=pool)
+    return _sync_client
+
+
+def get_async_redis():
+    """Shared asyncio client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        pool = aioredis.BlockingConnectionPool.from_url(_url(), **_pool_options())
+        client = _async_clients[loop] = aioredis.Redis(connection_pool=pool)
+    return client
+
+
+def get_script(client, source):
+    """``source`` registered on ``client``, once per client rather than per call"""
+    scripts = _scripts.get(client)
+    if scripts is None:
+        scripts = _scripts[client] = {}
+    script = scripts.get(source)
+    if script is None:
+        script = scripts[source] = client.register_script(source)
+    return script
+
+
+def close_redis():
+    """Disconnect the shared synchronous pool"""
+    global _sync_client
+    with _lock:
+        client, _sync_client = _sync_client, None
+    if client is not None:
+        client.connection_pool.disconnect()
+
+
+async def aclose_redis():
+    """Disconnect the asyncio pool of the running event loop"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+        await client.connection_pool.disconnect()
+
+
+atexit.register(close_redis)
+
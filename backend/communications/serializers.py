@@ -4,9 +4,20 @@ from .models import (
     Memo,
     Circular,
     CommunicationDocument,
-    CommunicationEvent
+    CommunicationEvent,
+    ConversationMember
 )
 from accounts.models import User
+from accounts.serializers import UserListSerializer
+
+
+# Reverse one-to-one accessor holding the child row for each communication type
+CHILD_RELATIONS = {
+    Communication.CommunicationType.MEMO: 'memo',
+    Communication.CommunicationType.CIRCULAR: 'circular',
+    Communication.CommunicationType.DOCUMENT: 'document',
+    Communication.CommunicationType.EVENT: 'event',
+}
 
 
 class CommunicationSerializer(serializers.ModelSerializer):
@@ -52,38 +63,52 @@ class CommunicationSerializer(serializers.ModelSerializer):
             return full_name if full_name else obj.created_by.email
         return None
     
+    def _child(self, obj, comm_type):
+        """
+        Return the child row for ``comm_type`` if this communication is of that type.
+        Viewsets select_related() the child relations, so this never queries;
+        other types are skipped without touching their reverse accessors.
+        """
+        if obj.type != comm_type:
+            return None
+        return getattr(obj, CHILD_RELATIONS[comm_type], None)
+    
     def get_memo_data(self, obj):
         """Get memo child data if exists"""
-        if hasattr(obj, 'memo'):
+        memo = self._child(obj, Communication.CommunicationType.MEMO)
+        if memo:
             return {
-                'reqs_ack': obj.memo.reqs_ack
+                'reqs_ack': memo.reqs_ack
             }
         return None
     
     def get_circular_data(self, obj):
         """Get circular child data if exists"""
-        if hasattr(obj, 'circular'):
+        circular = self._child(obj, Communication.CommunicationType.CIRCULAR)
+        if circular:
             return {
-                'reqs_ack': obj.circular.reqs_ack
+                'reqs_ack': circular.reqs_ack
             }
         return None
     
     def get_document_data(self, obj):
         """Get document child data if exists"""
-        if hasattr(obj, 'document'):
+        document = self._child(obj, Communication.CommunicationType.DOCUMENT)
+        if document:
             return {
-                'document_ID': obj.document.document_ID,
-                'route_to': obj.document.route_to
+                'document_ID': document.document_ID,
+                'route_to': document.route_to
             }
         return None
     
     def get_event_data(self, obj):
         """Get event child data if exists"""
-        if hasattr(obj, 'event'):
+        event = self._child(obj, Communication.CommunicationType.EVENT)
+        if event:
             return {
-                'start_date': obj.event.start_date,
-                'end_date': obj.event.end_date,
-                'location': obj.event.location
+                'start_date': event.start_date,
+                'end_date': event.end_date,
+                'location': event.location
             }
         return None
     
@@ -115,7 +140,7 @@ class CommunicationListSerializer(serializers.ModelSerializer):
 
 class MemoSerializer(serializers.ModelSerializer):
     """Serializer for Memo child model"""
-    communication = CommunicationSerializer(read_only=True)
+    communication = CommunicationSerializer(source='commID', read_only=True)
     
     class Meta:
         model = Memo
@@ -125,7 +150,7 @@ class MemoSerializer(serializers.ModelSerializer):
 
 class CircularSerializer(serializers.ModelSerializer):
     """Serializer for Circular child model"""
-    communication = CommunicationSerializer(read_only=True)
+    communication = CommunicationSerializer(source='commID', read_only=True)
     
     class Meta:
         model = Circular
@@ -135,7 +160,7 @@ class CircularSerializer(serializers.ModelSerializer):
 
 class CommunicationDocumentSerializer(serializers.ModelSerializer):
     """Serializer for CommunicationDocument child model"""
-    communication = CommunicationSerializer(read_only=True)
+    communication = CommunicationSerializer(source='commID', read_only=True)
     
     class Meta:
         model = CommunicationDocument
@@ -145,7 +170,7 @@ class CommunicationDocumentSerializer(serializers.ModelSerializer):
 
 class CommunicationEventSerializer(serializers.ModelSerializer):
     """Serializer for CommunicationEvent child model"""
-    communication = CommunicationSerializer(read_only=True)
+    communication = CommunicationSerializer(source='commID', read_only=True)
     
     class Meta:
         model = CommunicationEvent
@@ -220,3 +245,24 @@ class CommunicationCreateSerializer(serializers.ModelSerializer):
         
         return communication
 
+
+class InboxSerializer(serializers.ModelSerializer):
+    """One row of a user's chat inbox"""
+    room = serializers.CharField(source='conversation.room', read_only=True)
+    peer = UserListSerializer(read_only=True)
+    last_message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ConversationMember
+        fields = ['room', 'peer', 'last_message', 'last_message_at', 'last_read_message_id', 'unread_count']
+
+    def get_last_message(self, obj):
+        conversation = obj.conversation
+        if conversation.last_message_id is None:
+            return None
+        return {
+            'id': conversation.last_message_id,
+            'text': conversation.last_message_text,
+            'sender_id': conversation.last_sender_id,
+            'created_at': conversation.last_message_at,
+        }
@@ -0,0 +1,79 @@
+"""
+Time-ordered 53-bit ids assigned without a database round trip.
+
+Layout, high to low: 41 bits of milliseconds since ``EPOCH_MS``, 5 bits of
+worker id and 7 bits of per-millisecond sequence. The ids sort by creation
+time like a snowflake or ULID, but stay below 2**53 so browsers can hold
+them as plain JavaScript numbers. Each server process needs its own
+``CHAT_WORKER_ID`` (0-31). It is required when ``CHAT_WRITE_BEHIND`` saves
+these ids; otherwise (tests, benchmarks) it defaults to bits of the process id.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+WORKER_BITS = 5
+SEQUENCE_BITS = 7
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class SnowflakeGenerator:
+    """Thread-safe generator of increasing ids for one worker"""
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}, got {worker_id}")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        with self._lock:
+            # Never step back, even if the wall clock does
+            now = max(self._now_ms(), self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Used up this millisecond: wait for the next one
+                    while now <= self._last_ms:
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            timestamp = (now - EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)
+            return timestamp | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def _now_ms(self):
+        return time.time_ns() // 1_000_000
+
+
+def worker_id():
+    """``CHAT_WORKER_ID``; raises ImproperlyConfigured if write-behind needs it and it is unset"""
+    value = getattr(settings, 'CHAT_WORKER_ID', None)
+    if value is not None:
+        return int(value)
+    if getattr(settings, 'CHAT_WRITE_BEHIND', False):
+        # Process ids collide in 5 bits, and so would the ids of messages saved later
+        raise ImproperlyConfigured("CHAT_WRITE_BEHIND needs a distinct CHAT_WORKER_ID (0-31) for every server process")
+    return os.getpid() & MAX_WORKER_ID
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def next_id():
+    """Next id from this process's generator"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = SnowflakeGenerator(worker_id())
+    return _generator.next_id()
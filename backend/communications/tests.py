@@ -1,4 +1,1052 @@
-from django.test import TestCase
+import asyncio
+import json
+import signal
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import ApplicationCommunicator, WebsocketCommunicator
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from redis.asyncio.client import Pipeline
+from redis.commands.core import AsyncScript, Script
+from rest_framework.test import APIClient
 
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from . import auth, framing, inbox, outbox, presence, purge, snowflake, throttle, write_behind
+from .consumers import StreamConsumer
+from .models import ChatMessage, Communication, Circular, CommunicationDocument, CommunicationEvent, Memo
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "fakeredis[lua] is not installed")
+class FakeRedisTestCase(TestCase):
+    """Runs the Redis backends against an in-process fakeredis server"""
+
+    def setUp(self):
+        super().setUp()
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        self._async_clients = {}
+        for module in (outbox, presence, throttle):
+            for name, client in (('get_redis', lambda: self.redis), ('get_async_redis', self._async_redis)):
+                if hasattr(module, name):
+                    patcher = mock.patch.object(module, name, client)
+                    patcher.start()
+                    self.addCleanup(patcher.stop)
+
+    def _async_redis(self):
+        # One client per event loop, as in redis_client
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_clients:
+            self._async_clients[loop] = fakeredis.FakeAsyncRedis(server=self.server, decode_responses=True)
+        return self._async_clients[loop]
+
+
+class CommunicationDetailQueryTests(TestCase):
+    """Communication detail loads its typed child row in the same query"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author@example.com', 'password', role=User.Role.ADMIN)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create(self, comm_type, title):
+        return Communication.objects.create(type=comm_type, title=title, created_by=self.user)
+
+    def test_retrieve_is_a_single_query_for_every_type(self):
+        memo = self._create(Communication.CommunicationType.MEMO, 'Memo')
+        Memo.objects.create(commID=memo, reqs_ack=True)
+        circular = self._create(Communication.CommunicationType.CIRCULAR, 'Circular')
+        Circular.objects.create(commID=circular)
+        document = self._create(Communication.CommunicationType.DOCUMENT, 'Document')
+        CommunicationDocument.objects.create(commID=document, route_to='Registrar')
+        event = self._create(Communication.CommunicationType.EVENT, 'Event')
+        CommunicationEvent.objects.create(commID=event, start_date='2025-01-01T09:00Z', end_date='2025-01-01T10:00Z')
+
+        expected = {
+            memo.pk: ('memo_data', {'reqs_ack': True}),
+            circular.pk: ('circular_data', {'reqs_ack': False}),
+            document.pk: ('document_data', {'document_ID': None, 'route_to': 'Registrar'}),
+        }
+        for comm in (memo, circular, document, event):
+            with self.assertNumQueries(1):
+                response = self.client.get(f'/api/communications/{comm.pk}/')
+            self.assertEqual(response.status_code, 200)
+            if comm.pk in expected:
+                field, value = expected[comm.pk]
+                self.assertEqual(response.data[field], value)
+        self.assertEqual(response.data['memo_data'], None)
+        self.assertEqual(response.data['event_data']['location'], None)
+
+
+class ChatHistoryPagingTests(TestCase):
+    """Cursor paging walks a conversation back to its start without gaps or repeats"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'password', role=User.Role.FACULTY)
+        self.bob = User.objects.create_user('bob@example.com', 'password', role=User.Role.FACULTY)
+        self.room = f'{min(self.alice.id, self.bob.id)}_{max(self.alice.id, self.bob.id)}'
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+        # Pairs of messages share a timestamp, so paging must tie-break on id
+        start = timezone.now() - timedelta(hours=1)
+        self.messages = [
+            ChatMessage.objects.create(
+                conversation_id=self.room,
+                sender=self.alice if n % 2 else self.bob,
+                text=f'message {n}',
+                created_at=start + timedelta(seconds=n // 2),
+            )
+            for n in range(25)
+        ]
+
+    def test_pages_back_to_the_first_message(self):
+        url = f'/api/chat/{self.room}/history/'
+        response = self.client.get(url, {'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        seen = [m['id'] for m in response.data['results']]
+
+        while response.data['has_more']:
+            response = self.client.get(url, {'limit': 10, 'before': response.data['next_cursor']})
+            seen = [m['id'] for m in response.data['results']] + seen
+
+        self.assertEqual(seen, [m.id for m in self.messages])
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_since_returns_only_newer_messages(self):
+        response = self.client.get(f'/api/chat/{self.room}/history/', {'since': self.messages[20].id})
+        self.assertEqual([m['id'] for m in response.data['results']], [m.id for m in self.messages[21:]])
+        self.assertFalse(response.data['has_more'])
+
+    def test_rejects_outsiders_and_bad_cursors(self):
+        outsider = User.objects.create_user('eve@example.com', 'password', role=User.Role.FACULTY)
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(f'/api/chat/{self.room}/history/').status_code, 403)
+
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(f'/api/chat/{self.room}/history/', {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class WriteBehindTests(TestCase):
+    """Buffered chat messages keep their snowflake ids and survive a bad row in the batch"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('writer@example.com', 'password', role=User.Role.FACULTY)
+
+    def _message(self, text, message_id=None):
+        return ChatMessage(
+            id=message_id or snowflake.next_id(),
+            conversation_id='1_2',
+            sender=self.user,
+            text=text,
+            created_at=timezone.now(),
+        )
+
+    def test_flush_saves_buffered_messages(self):
+        existing = ChatMessage.objects.create(conversation_id='1_2', sender=self.user, text='saved before')
+        messages = [self._message(f'message {n}') for n in range(5)]
+        # Clashes with a saved row: the rest of the batch must still land
+        messages.insert(2, self._message('duplicate', message_id=existing.id))
+
+        async def send():
+            writer = write_behind.MessageWriter()
+            for message in messages:
+                writer.add(message)
+            await writer.flush()
+            return writer.pending
+
+        with self.assertLogs('communications.write_behind', level='WARNING') as logs:
+            self.assertEqual(async_to_sync(send)(), [])
+        self.assertIn(f"Chat message id {existing.id} is taken", logs.output[-1])
+        expected = [m.id for m in messages if m.text != 'duplicate']
+        self.assertEqual(expected, sorted(expected))
+        self.assertLess(max(expected), 2 ** 53)
+        saved = ChatMessage.objects.filter(id__in=expected).values_list('id', flat=True)
+        self.assertEqual(sorted(saved), expected)
+
+        # The clashing message was saved under a fresh id, the older row left alone
+        self.assertEqual(ChatMessage.objects.get(id=existing.id).text, 'saved before')
+        renumbered = ChatMessage.objects.get(text='duplicate')
+        self.assertEqual(renumbered.id, messages[2].id)
+        self.assertNotEqual(renumbered.id, existing.id)
+
+    def test_retried_batch_does_not_save_twice(self):
+        messages = [self._message(f'message {n}') for n in range(3)]
+        write_behind.save_batch(messages[:2])
+
+        with self.assertLogs('communications.write_behind', level='WARNING'):
+            write_behind.save_batch(messages)
+        self.assertEqual(ChatMessage.objects.count(), 3)
+
+    @override_settings(CHAT_WRITE_BEHIND_BATCH=2)
+    def test_flush_tasks_are_kept_until_done(self):
+        async def send():
+            writer = write_behind.MessageWriter()
+            writer.add(self._message('first'))
+            writer.add(self._message('second'))
+            running = len(writer._tasks)
+            await asyncio.gather(*writer._tasks)
+            await asyncio.sleep(0)
+            return running, len(writer._tasks)
+
+        self.assertEqual(async_to_sync(send)(), (2, 0))
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+    def test_discard_keeps_messages_sent_after_the_delete(self):
+        through = timezone.now()
+        before, after, other = self._message('before'), self._message('after'), self._message('other room')
+        before.created_at, after.created_at = through - timedelta(seconds=1), through + timedelta(seconds=1)
+        other.conversation_id, other.created_at = '1_3', before.created_at
+
+        writer = write_behind.MessageWriter()
+        writer.pending = [before, after, other]
+        writer.discard('1_2', through)
+        self.assertEqual(writer.pending, [after, other])
+
+    @override_settings(CHAT_WRITE_BEHIND=True, CHAT_WORKER_ID=None)
+    def test_refuses_to_run_without_a_worker_id(self):
+        with self.assertRaises(ImproperlyConfigured):
+            snowflake.worker_id()
+
+
+class InboxTests(TestCase):
+    """The inbox follows message writes, read pointers and the backfill"""
+
+    def setUp(self):
+        self.me = User.objects.create_user('me@example.com', 'password', role=User.Role.FACULTY)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.others = [
+            User.objects.create_user(f'peer{n}@example.com', 'password', role=User.Role.FACULTY) for n in range(3)
+        ]
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def _room(self, other):
+        return f'{min(self.me.id, other.id)}_{max(self.me.id, other.id)}'
+
+    def _send(self, sender, other, minutes, record=True):
+        room = self._room(other if sender == self.me else sender)
+        message = ChatMessage.objects.create(
+            conversation_id=room,
+            sender=sender,
+            text=f'at {minutes}',
+            created_at=self.start + timedelta(minutes=minutes),
+        )
+        if record:
+            inbox.record_messages([message])
+        return message
+
+    def _inbox(self):
+        response = self.client.get('/api/chat/inbox/')
+        self.assertEqual(response.status_code, 200)
+        return [
+            (row['peer']['id'], row['unread_count'], row['last_message']['text'])
+            for row in response.data['results']
+        ]
+
+    def test_inbox_orders_by_latest_message_with_unread_counts(self):
+        first, second, third = self.others
+        self._send(first, self.me, 1)
+        self._send(second, self.me, 2)
+        self._send(second, self.me, 3)
+        self._send(self.me, third, 4)
+
+        self.assertEqual(self._inbox(), [(third.id, 0, 'at 4'), (second.id, 2, 'at 3'), (first.id, 1, 'at 1')])
+
+        self._send(first, self.me, 5)
+        response = self.client.post(f'/api/chat/{self._room(second)}/read/')
+        self.assertEqual(response.data['unread_count'], 0)
+        self.assertEqual(self._inbox(), [(first.id, 2, 'at 5'), (third.id, 0, 'at 4'), (second.id, 0, 'at 3')])
+
+        # Reading up to an older message leaves the later ones unread
+        older = ChatMessage.objects.filter(conversation_id=self._room(first)).order_by('created_at').first()
+        response = self.client.post(f'/api/chat/{self._room(first)}/read/', {'message_id': older.id})
+        self.assertEqual(response.data['unread_count'], 1)
+
+    def test_inbox_query_count_does_not_grow_with_conversations(self):
+        self._send(self.others[0], self.me, 1)
+        with CaptureQueriesContext(connection) as few:
+            self._inbox()
+        for n, other in enumerate(self.others[1:], start=2):
+            self._send(other, self.me, n)
+        with CaptureQueriesContext(connection) as many:
+            self._inbox()
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+    def test_backfill_builds_conversations_from_messages(self):
+        for n, other in enumerate(self.others):
+            self._send(other, self.me, n, record=False)
+            self._send(self.me, other, n + 10, record=False)
+
+        self.assertEqual(inbox.rebuild_conversations(), 3)
+        self.assertEqual(inbox.rebuild_conversations(), 3)
+        expected = [(other.id, 0, f'at {n + 10}') for n, other in enumerate(self.others)]
+        self.assertEqual(self._inbox(), expected[::-1])
+
+
+@override_settings(
+    CHAT_PURGE_CHUNK_SIZE=7,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class ChatHistoryDeletionTests(TestCase):
+    """Deleting history hides it at once; the purge removes the rows in chunks"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'password', role=User.Role.FACULTY)
+        self.bob = User.objects.create_user('bob@example.com', 'password', role=User.Role.FACULTY)
+        self.room = f'{min(self.alice.id, self.bob.id)}_{max(self.alice.id, self.bob.id)}'
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        for n in range(30):
+            self._send(f'old {n}')
+
+    def _send(self, text):
+        message = ChatMessage.objects.create(conversation_id=self.room, sender=self.bob, text=text)
+        inbox.record_messages([message])
+        return message
+
+    def _history(self):
+        response = self.client.get(f'/api/chat/{self.room}/history/', {'limit': 100})
+        return [m['text'] for m in response.data['results']]
+
+    def test_delete_hides_history_then_purges_it(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(f'/api/chat/{self.room}/delete/')
+        self.assertEqual(response.data['deleted'], 30)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._history(), [])
+        self.assertEqual(self.client.get('/api/chat/inbox/').data['results'], [])
+
+        self._send('after')
+        self.assertEqual(self._history(), ['after'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(purge.purge_messages(self.room), 30)
+        deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE')]
+        # Five chunks of at most 7, then one that finds nothing left; each chunk is
+        # a single statement, with no SELECT of the ids before it
+        self.assertEqual(len(deletes), 6)
+        self.assertTrue(all(' IN (SELECT ' in sql for sql in deletes))
+        self.assertEqual(len(ctx.captured_queries), 1 + len(deletes))
+        self.assertEqual(list(ChatMessage.objects.values_list('text', flat=True)), ['after'])
+        self.assertEqual(self.client.get('/api/chat/inbox/').data['results'][0]['unread_count'], 1)
+
+    def test_messages_sent_before_the_delete_but_saved_after_stay_hidden(self):
+        sent = timezone.now()
+        with self.captureOnCommitCallbacks():
+            response = self.client.delete(f'/api/chat/{self.room}/delete/')
+        self.assertEqual(response.data['deleted'], 30)
+
+        # Flushed by a write-behind writer after the delete
+        ChatMessage.objects.create(conversation_id=self.room, sender=self.bob, text='buffered', created_at=sent)
+        self._send('after')
+        self.assertEqual(self._history(), ['after'])
+
+    def test_read_pointer_in_deleted_history_counts_only_visible_messages(self):
+        first = ChatMessage.objects.filter(conversation_id=self.room).order_by('created_at', 'id').first()
+        with self.captureOnCommitCallbacks():
+            self.client.delete(f'/api/chat/{self.room}/delete/')
+        self._send('after')
+
+        # A client still holding the cleared messages marks one of them read before the purge
+        member = inbox.mark_read(self.room, self.alice, first.id)
+        self.assertEqual(member.unread_count, 1)
+        self.assertEqual(self.client.get('/api/chat/inbox/').data['results'][0]['unread_count'], 1)
+
+
+class HandshakeAuthCacheTests(TestCase):
+    """WebSocket handshakes load a token's user once until the user changes"""
+
+    def setUp(self):
+        auth.clear_cache()
+        self.user = User.objects.create_user('ws@example.com', 'password', role=User.Role.STAFF)
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_user_is_cached_per_token(self):
+        self.assertEqual(async_to_sync(auth.get_user)(self.token), self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(async_to_sync(auth.get_user)(self.token), self.user)
+        self.assertEqual(len(queries), 0)
+
+        # A different token of the same user is resolved on its own
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(auth.get_user)(str(AccessToken.for_user(self.user)))
+        self.assertEqual(len(queries), 1)
+
+    def test_deactivation_invalidates(self):
+        async_to_sync(auth.get_user)(self.token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(async_to_sync(auth.get_user)(self.token).is_authenticated)
+
+    def test_invalid_token_is_anonymous(self):
+        self.assertFalse(async_to_sync(auth.get_user)('not-a-token').is_authenticated)
+        self.assertFalse(async_to_sync(auth.get_user)(None).is_authenticated)
+
+
+class MemoryPresenceStoreTests(TestCase):
+    """The in-process presence store tracks sockets like the Redis one"""
+
+    def test_counts_sockets(self):
+        store = presence.MemoryPresenceStore()
+        self.assertTrue(async_to_sync(store.connect)(1, 'tab-1'))
+        self.assertFalse(async_to_sync(store.connect)(1, 'tab-2'))
+        self.assertEqual(async_to_sync(store.watched_snapshot)([1, 2]), [1])
+
+        self.assertFalse(async_to_sync(store.disconnect)(1, 'tab-1'))
+        self.assertTrue(async_to_sync(store.disconnect)(1, 'tab-2'))
+        self.assertEqual(async_to_sync(store.watched_snapshot)([1]), [])
+
+    def test_expires_without_renewal(self):
+        store = presence.MemoryPresenceStore()
+        with override_settings(PRESENCE_TTL=0):
+            async_to_sync(store.connect)(1, 'tab-1')
+        self.assertEqual(async_to_sync(store.watched_snapshot)([1]), [])
+        # Renewal does not revive an expired socket; its heartbeat does
+        async_to_sync(store.renew)([(1, 'tab-1')])
+        self.assertEqual(async_to_sync(store.watched_snapshot)([1]), [])
+        self.assertTrue(async_to_sync(store.touch)(1, 'tab-1'))
+
+    def test_heartbeats_after_expiry_restore_every_tab(self):
+        store = presence.MemoryPresenceStore()
+        with override_settings(PRESENCE_TTL=0):
+            async_to_sync(store.connect)(1, 'tab-1')
+            async_to_sync(store.connect)(1, 'tab-2')
+        self.assertTrue(async_to_sync(store.touch)(1, 'tab-1'))
+        self.assertFalse(async_to_sync(store.touch)(1, 'tab-2'))
+        # Closing one tab leaves the user online
+        self.assertFalse(async_to_sync(store.disconnect)(1, 'tab-1'))
+        self.assertEqual(async_to_sync(store.watched_snapshot)([1]), [1])
+        self.assertTrue(async_to_sync(store.disconnect)(1, 'tab-2'))
+
+    def test_login_and_logout(self):
+        store = presence.MemoryPresenceStore()
+        store.set_online(1)
+        self.assertEqual(async_to_sync(store.watched_snapshot)([1]), [1])
+        self.assertFalse(async_to_sync(store.connect)(1, 'tab-1'))
+        # The login stand-in goes with the user's last socket
+        self.assertTrue(async_to_sync(store.disconnect)(1, 'tab-1'))
+        store.set_online(1)
+        store.set_offline(1)
+        self.assertEqual(async_to_sync(store.watched_snapshot)([1]), [])
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    PRESENCE_BACKEND='communications.presence.MemoryPresenceStore',
+    CHAT_OUTBOX_BACKEND='communications.outbox.MemoryOutbox',
+    PRESENCE_BATCH_INTERVAL=0.05,
+)
+class ChatSocketTestCase(TransactionTestCase):
+    """
+    Drives the chat consumers through the ASGI app with WebsocketCommunicator.
+    Consumers reach the database from worker threads, so no test transaction.
+    """
+
+    def setUp(self):
+        # Fresh process-wide stores for every test
+        presence._store = None
+        outbox._outbox = None
+        self.alice = User.objects.create_user('alice-ws@example.com', 'password', role=User.Role.STAFF)
+        self.bob = User.objects.create_user('bob-ws@example.com', 'password', role=User.Role.STAFF)
+        self.room = f"{self.alice.id}_{self.bob.id}"
+
+    async def _open(self, user, path):
+        from config.asgi import application
+
+        socket = WebsocketCommunicator(application, f"{path}?token={AccessToken.for_user(user)}")
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    async def _frame(self, socket, event, timeout=1):
+        """The next frame with this ``event``, skipping others"""
+        while True:
+            frame = await socket.receive_json_from(timeout=timeout)
+            if frame.get("event") == event:
+                return frame
+
+    async def _frames(self, socket, wait=0.2):
+        """Every frame that arrives within ``wait`` seconds"""
+        frames = []
+        while not await socket.receive_nothing(timeout=wait):
+            frames.append(await socket.receive_json_from())
+        return frames
+
+
+
+class RedisPresenceStoreTests(FakeRedisTestCase):
+    """Each socket is one member of its user's connections set, scored by expiry"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = presence.RedisPresenceStore()
+
+    def _expire(self, user_id):
+        key = presence.count_key(user_id)
+        self.redis.zadd(key, {member: 0 for member in self.redis.zrange(key, 0, -1)})
+
+    def test_two_tabs_are_counted_apart(self):
+        async def run():
+            came_online = [await self.store.connect(1, 'tab-1'), await self.store.connect(1, 'tab-2')]
+            went_offline = [await self.store.disconnect(1, 'tab-1')]
+            online = await self.store.watched_snapshot([1, 2])
+            went_offline.append(await self.store.disconnect(1, 'tab-2'))
+            return came_online, went_offline, online, await self.store.watched_snapshot([1])
+
+        self.assertEqual(async_to_sync(run)(), ([True, False], [False, True], [1], []))
+        # The last socket takes the key with it
+        self.assertFalse(self.redis.exists(presence.count_key(1)))
+
+    def test_heartbeats_after_expiry_re_register_each_tab(self):
+        async_to_sync(self.store.connect)(1, 'tab-1')
+        async_to_sync(self.store.connect)(1, 'tab-2')
+        self._expire(1)
+        self.assertEqual(async_to_sync(self.store.watched_snapshot)([1]), [])
+
+        # Renewal leaves expired sockets alone; each heartbeat brings back its own
+        async_to_sync(self.store.renew)([(1, 'tab-1'), (1, 'tab-2')])
+        self.assertEqual(async_to_sync(self.store.watched_snapshot)([1]), [])
+        self.assertTrue(async_to_sync(self.store.touch)(1, 'tab-1'))
+        self.assertFalse(async_to_sync(self.store.touch)(1, 'tab-2'))
+        self.assertEqual(self.redis.zrange(presence.count_key(1), 0, -1), ['tab-1', 'tab-2'])
+        self.assertGreater(self.redis.pttl(presence.count_key(1)), 0)
+
+        self.assertFalse(async_to_sync(self.store.disconnect)(1, 'tab-1'))
+        self.assertTrue(async_to_sync(self.store.disconnect)(1, 'tab-2'))
+
+    def test_disconnect_of_an_expired_last_socket(self):
+        async_to_sync(self.store.connect)(1, 'tab-1')
+        self._expire(1)
+        # Already offline: no second offline transition
+        self.assertFalse(async_to_sync(self.store.disconnect)(1, 'tab-1'))
+        self.assertEqual(async_to_sync(self.store.watched_snapshot)([1]), [])
+
+    def test_login_and_logout(self):
+        self.store.set_online(1)
+        self.assertFalse(async_to_sync(self.store.connect)(1, 'tab-1'))
+        self.assertTrue(async_to_sync(self.store.disconnect)(1, 'tab-1'))
+        self.store.set_online(1)
+        self.store.set_offline(1)
+        self.assertEqual(async_to_sync(self.store.watched_snapshot)([1]), [])
+
+    def test_every_script_gets_only_its_users_key(self):
+        calls = []
+
+        def spy(original):
+            def record(script, keys=None, args=None, client=None):
+                calls.append(keys)
+                return original(script, keys=keys, args=args, client=client)
+            return record
+
+        async def run():
+            await self.store.connect(1, 'tab-1')
+            await self.store.touch(2, 'tab-2')
+            await self.store.renew([(1, 'tab-1'), (2, 'tab-2')])
+            await self.store.watched_snapshot([1, 2, 3])
+            await self.store.disconnect(1, 'tab-1')
+
+        with (
+            mock.patch.object(AsyncScript, '__call__', spy(AsyncScript.__call__)),
+            mock.patch.object(Script, '__call__', spy(Script.__call__)),
+        ):
+            async_to_sync(run)()
+            self.store.set_online(4)
+
+        self.assertEqual(calls, [
+            ['presence:conns:1'], ['presence:conns:2'],
+            ['presence:conns:1'], ['presence:conns:2'],
+            ['presence:conns:1'], ['presence:conns:2'], ['presence:conns:3'],
+            ['presence:conns:1'],
+            ['presence:conns:4'],
+        ])
+
+
+class PresenceSocketTests(ChatSocketTestCase):
+    """Presence as seen by a conversation partner's socket"""
+
+    def test_closing_one_of_two_tabs_keeps_the_user_online(self):
+        async def run():
+            watcher = await self._open(self.bob, f"/ws/messages/{self.room}/")
+            self.assertEqual((await self._frame(watcher, "presence_snapshot"))["online"], [])
+
+            tab_1 = await self._open(self.alice, "/ws/stream/")
+            tab_2 = await self._open(self.alice, "/ws/stream/")
+            self.assertEqual((await self._frame(watcher, "presence_delta"))["online"], [self.alice.id])
+
+            await tab_1.disconnect()
+            self.assertEqual(await self._frames(watcher), [])
+            await tab_2.disconnect()
+            self.assertEqual((await self._frame(watcher, "presence_delta"))["offline"], [self.alice.id])
+            await watcher.disconnect()
+
+        async_to_sync(run)()
+
+    def test_presence_reaches_only_watching_sockets(self):
+        carol = User.objects.create_user('carol-ws@example.com', 'password', role=User.Role.STAFF)
+
+        async def run():
+            partner = await self._open(self.bob, f"/ws/messages/{self.room}/")
+            await self._frame(partner, "presence_snapshot")
+            stranger = await self._open(carol, "/ws/stream/")
+            await self._frame(stranger, "presence_snapshot")
+
+            alice = await self._open(self.alice, "/ws/stream/")
+            self.assertEqual((await self._frame(partner, "presence_delta"))["online"], [self.alice.id])
+            # Not a conversation partner, so not in presence_<alice>
+            self.assertEqual(await self._frames(stranger), [])
+
+            await stranger.send_json_to({"type": "presence.subscribe", "user_ids": [self.alice.id]})
+            self.assertEqual(
+                await self._frame(stranger, "presence_delta"), {
+                    "event": "presence_delta", "online": [self.alice.id], "offline": [],
+                }
+            )
+            await stranger.send_json_to({"type": "presence.unsubscribe", "user_ids": [self.alice.id]})
+            await stranger.receive_nothing(timeout=0.1)
+
+            await alice.disconnect()
+            self.assertEqual((await self._frame(partner, "presence_delta"))["offline"], [self.alice.id])
+            self.assertEqual(await self._frames(stranger), [])
+            await partner.disconnect()
+            await stranger.disconnect()
+
+        async_to_sync(run)()
+
+    def test_heartbeats_after_expiry_restore_both_tabs(self):
+        async def run():
+            watcher = await self._open(self.bob, f"/ws/messages/{self.room}/")
+            await self._frame(watcher, "presence_snapshot")
+            with override_settings(PRESENCE_TTL=0):
+                # Both tabs expire at once, as if every heartbeat had been missed
+                tab_1 = await self._open(self.alice, "/ws/stream/")
+                tab_2 = await self._open(self.alice, "/ws/stream/")
+            await self._frames(watcher)
+
+            await tab_1.send_json_to({"type": "heartbeat"})
+            self.assertEqual((await self._frame(watcher, "presence_delta"))["online"], [self.alice.id])
+            await tab_2.send_json_to({"type": "heartbeat"})
+            await tab_2.receive_nothing(timeout=0.1)
+
+            # tab_2 re-registered itself, so closing tab_1 leaves alice online
+            await tab_1.disconnect()
+            self.assertEqual(await self._frames(watcher), [])
+            await tab_2.disconnect()
+            self.assertEqual((await self._frame(watcher, "presence_delta"))["offline"], [self.alice.id])
+            await watcher.disconnect()
+
+        async_to_sync(run)()
+
+
+class StreamSocketTests(ChatSocketTestCase):
+    """Room subscriptions, live messages and history paging on the multiplexed socket"""
+
+    def _history(self, count):
+        start = timezone.now() - timedelta(hours=1)
+        return [
+            ChatMessage.objects.create(
+                conversation_id=self.room, sender=self.alice, text=f'message {n}',
+                created_at=start + timedelta(seconds=n),
+            )
+            for n in range(count)
+        ]
+
+    def test_subscribe_sends_history_and_rejects_other_rooms(self):
+        messages = self._history(3)
+        carol = User.objects.create_user('carol-ws@example.com', 'password', role=User.Role.STAFF)
+        others = f"{self.bob.id}_{carol.id}"
+
+        async def run():
+            socket = await self._open(self.alice, "/ws/stream/")
+            await socket.send_json_to({"type": "subscribe", "rooms": [self.room, others, "not-a-room"]})
+            self.assertEqual(await self._frame(socket, "subscribed"), {
+                "event": "subscribed", "rooms": [self.room], "rejected": [others],
+            })
+            history = await self._frame(socket, "history")
+            self.assertEqual(history["room"], self.room)
+            self.assertEqual([m["id"] for m in history["messages"]], [m.id for m in messages])
+
+            # Caught up from the last message held: only what came after it
+            await socket.send_json_to({"type": "unsubscribe", "rooms": [self.room]})
+            await self._frame(socket, "unsubscribed")
+            await socket.send_json_to({"type": "subscribe", "rooms": [self.room], "since": {self.room: messages[1].id}})
+            history = await self._frame(socket, "history")
+            self.assertEqual([m["id"] for m in history["messages"]], [messages[2].id])
+            await socket.disconnect()
+
+        async_to_sync(run)()
+
+    def test_messages_reach_only_subscribed_sockets(self):
+        async def run():
+            alice = await self._open(self.alice, "/ws/stream/")
+            bob = await self._open(self.bob, "/ws/stream/")
+            for socket in (alice, bob):
+                await socket.send_json_to({"type": "subscribe", "rooms": [self.room]})
+                await self._frame(socket, "history")
+
+            await alice.send_json_to({"type": "message", "room": self.room, "text": "hello"})
+            chat = [frame for frame in await self._frames(bob) if "event" not in frame]
+            self.assertEqual([(frame["conversation_id"], frame["text"]) for frame in chat], [(self.room, "hello")])
+
+            await bob.send_json_to({"type": "unsubscribe", "rooms": [self.room]})
+            self.assertEqual((await self._frame(bob, "unsubscribed"))["rooms"], [self.room])
+            await alice.send_json_to({"type": "message", "room": self.room, "text": "still there?"})
+            self.assertEqual([frame for frame in await self._frames(bob) if "event" not in frame], [])
+
+            # Sending needs a subscription too
+            await bob.send_json_to({"type": "message", "room": self.room, "text": "yes"})
+            self.assertEqual((await self._frame(bob, "error"))["detail"], "Not subscribed to this room.")
+            await alice.disconnect()
+            await bob.disconnect()
+
+        async_to_sync(run)()
+        self.assertEqual(
+            list(ChatMessage.objects.order_by('id').values_list('text', flat=True)), ['hello', 'still there?']
+        )
+
+    def test_notifications_skip_sockets_in_the_room(self):
+        async def run():
+            alice = await self._open(self.alice, "/ws/stream/")
+            in_room = await self._open(self.bob, "/ws/stream/")
+            elsewhere = await self._open(self.bob, "/ws/stream/")
+            for socket in (alice, in_room):
+                await socket.send_json_to({"type": "subscribe", "rooms": [self.room]})
+                await self._frame(socket, "history")
+            await self._frames(elsewhere)
+
+            await alice.send_json_to({"type": "message", "room": self.room, "text": "hello"})
+            # The message once, not again as a notification
+            frames = [frame for frame in await self._frames(in_room) if frame.get("event") != "presence_delta"]
+            self.assertEqual([frame.get("event", frame.get("text")) for frame in frames], ["hello"])
+            notification = await self._frame(elsewhere, "notification")
+            self.assertEqual((notification["room"], notification["preview"]), (self.room, "hello"))
+            for socket in (alice, in_room, elsewhere):
+                await socket.disconnect()
+
+        async_to_sync(run)()
+
+    @override_settings(CHAT_FRAME_RATE=0.01, CHAT_FRAME_BURST=2)
+    def test_message_dropped_by_the_frame_limit_is_handed_back(self):
+        async def run():
+            socket = await self._open(self.alice, "/ws/stream/")
+            await socket.send_json_to({"type": "subscribe", "rooms": [self.room]})
+            await self._frame(socket, "history")
+            await socket.send_json_to({"type": "message", "room": self.room, "text": "sent"})
+            await socket.send_json_to({"type": "message", "room": self.room, "text": "dropped"})
+            error = await self._frame(socket, "error")
+            await socket.disconnect()
+            return error
+
+        error = async_to_sync(run)()
+        self.assertEqual(error["detail"], "Sending messages too fast.")
+        self.assertEqual((error["room"], error["text"]), (self.room, "dropped"))
+        self.assertGreater(error["retry_after"], 0)
+        self.assertEqual(list(ChatMessage.objects.values_list('text', flat=True)), ['sent'])
+
+    @override_settings(CHAT_HISTORY_PAGE_SIZE=2)
+    def test_history_pages_back_and_rejects_bad_requests(self):
+        messages = self._history(5)
+        carol = User.objects.create_user('carol-ws@example.com', 'password', role=User.Role.STAFF)
+
+        async def run():
+            socket = await self._open(self.alice, "/ws/stream/")
+            await socket.send_json_to({"type": "subscribe", "rooms": [self.room]})
+            page = await self._frame(socket, "history")
+            seen = [m["id"] for m in page["messages"]]
+            while page["has_more"]:
+                await socket.send_json_to({"type": "history", "room": self.room, "before": page["next_cursor"]})
+                page = await self._frame(socket, "history")
+                seen = [m["id"] for m in page["messages"]] + seen
+            self.assertEqual(seen, [m.id for m in messages])
+
+            await socket.send_json_to({"type": "history", "room": self.room, "before": "not-a-cursor"})
+            self.assertEqual((await self._frame(socket, "error"))["detail"], "Invalid history cursor.")
+            await socket.send_json_to({"type": "history", "room": f"{self.bob.id}_{carol.id}"})
+            self.assertEqual((await self._frame(socket, "error"))["detail"], "Not permitted to read this conversation.")
+            await socket.disconnect()
+
+        async_to_sync(run)()
+
+
+@override_settings(CHAT_WRITE_BEHIND=True, CHAT_WORKER_ID=1, CHAT_WRITE_BEHIND_INTERVAL=60)
+class WriteBehindShutdownTests(ChatSocketTestCase):
+    """Messages broadcast but still buffered are saved when the server stops"""
+
+    async def _send_buffered(self, texts):
+        """Ids of ``texts`` as broadcast to bob, none of them saved yet"""
+        alice = await self._open(self.alice, "/ws/stream/")
+        bob = await self._open(self.bob, "/ws/stream/")
+        for socket in (alice, bob):
+            await socket.send_json_to({"type": "subscribe", "rooms": [self.room]})
+            await self._frame(socket, "history")
+        for text in texts:
+            await alice.send_json_to({"type": "message", "room": self.room, "text": text})
+        ids = [frame["id"] for frame in await self._frames(bob) if "event" not in frame]
+        self.assertEqual(len(ids), len(texts))
+        self.assertEqual(await database_sync_to_async(ChatMessage.objects.count)(), 0)
+        await alice.disconnect()
+        await bob.disconnect()
+        return ids
+
+    def _saved(self, ids):
+        return list(ChatMessage.objects.filter(id__in=ids).order_by('id').values_list('id', 'text'))
+
+    def test_lifespan_shutdown_saves_buffered_messages(self):
+        from config.asgi import application
+
+        async def run():
+            ids = await self._send_buffered(["one", "two"])
+            lifespan = ApplicationCommunicator(application, {"type": "lifespan"})
+            await lifespan.send_input({"type": "lifespan.startup"})
+            await lifespan.receive_output()
+            await lifespan.send_input({"type": "lifespan.shutdown"})
+            self.assertEqual(await lifespan.receive_output(), {"type": "lifespan.shutdown.complete"})
+            return ids
+
+        ids = async_to_sync(run)()
+        self.assertEqual(self._saved(ids), list(zip(ids, ["one", "two"])))
+
+    def test_worker_exit_saves_buffered_messages(self):
+        # No lifespan events, as under Daphne: the worker is stopped with SIGTERM
+        ids = async_to_sync(self._send_buffered)(["one", "two"])
+
+        previous = signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            write_behind.install_exit_handler()
+            with self.assertRaises(SystemExit):
+                signal.raise_signal(signal.SIGTERM)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+        # What atexit runs once the worker has unwound
+        write_behind.flush_all_sync()
+
+        self.assertEqual(self._saved(ids), list(zip(ids, ["one", "two"])))
+
+
+@override_settings(
+    CHAT_OUTBOX_BACKEND='communications.outbox.MemoryOutbox',
+    CHAT_OUTBOX_SIZE=3,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class OutboxTests(TestCase):
+    """New messages reach the recipient's user group and bounded outbox"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice-outbox@example.com', 'password', role=User.Role.STAFF)
+        self.bob = User.objects.create_user('bob-outbox@example.com', 'password', role=User.Role.STAFF)
+        self.room = f"{self.alice.id}_{self.bob.id}"
+        self.client = APIClient()
+
+    def _post(self, layer, text):
+        message = ChatMessage.objects.create(
+            conversation_id=self.room, sender=self.alice, text=text, created_at=timezone.now()
+        )
+        async_to_sync(outbox.notify)(layer, message)
+        return message
+
+    def test_notify_and_drain(self):
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        async_to_sync(layer.group_add)(f"user_{self.bob.id}", "bob-socket")
+
+        first = self._post(layer, "hello")
+        pushed = async_to_sync(layer.receive)("bob-socket")["payload"]
+        self.assertEqual(pushed["event"], "notification")
+        self.assertEqual(pushed["message_id"], first.id)
+
+        for n in range(4):
+            self._post(layer, f"more {n}")
+
+        self.client.force_authenticate(self.bob)
+        response = self.client.get('/api/chat/outbox/')
+        self.assertEqual(response.status_code, 200)
+        # Only the last CHAT_OUTBOX_SIZE are kept
+        self.assertEqual([e['preview'] for e in response.data['results']], ['more 1', 'more 2', 'more 3'])
+
+        after = response.data['results'][0]['cursor']
+        response = self.client.get('/api/chat/outbox/', {'after': after})
+        self.assertEqual([e['preview'] for e in response.data['results']], ['more 2', 'more 3'])
+        self.assertEqual(response.data['next_cursor'], response.data['results'][-1]['cursor'])
+
+        self.assertEqual(self.client.get('/api/chat/outbox/', {'after': 'nope'}).status_code, 400)
+
+
+
+@override_settings(CHAT_OUTBOX_SIZE=3, CHAT_OUTBOX_TTL=60)
+class RedisOutboxTests(FakeRedisTestCase):
+    """One capped stream per user, expiring a TTL after its last entry"""
+
+    def setUp(self):
+        super().setUp()
+        self.outbox = outbox.RedisOutbox()
+
+    def _push(self, *previews):
+        return [async_to_sync(self.outbox.push)([1, 2], {"preview": p})[1] for p in previews]
+
+    def test_keeps_the_newest_up_to_the_cap(self):
+        with mock.patch.object(Pipeline, 'xadd', autospec=True, side_effect=Pipeline.xadd) as xadd:
+            self._push('one', 'two', 'three', 'four', 'five')
+        self.assertEqual({(call.kwargs['maxlen'], call.kwargs['approximate']) for call in xadd.call_args_list}, {(3, True)})
+
+        # Approximate trimming leaves whole stream nodes in place, so the stream can
+        # hold more than the cap; reads return only the newest
+        self.assertGreaterEqual(self.redis.xlen('outbox:1'), 3)
+        self.assertEqual([e['preview'] for e in self.outbox.read(1)], ['three', 'four', 'five'])
+        self.assertEqual([e['preview'] for e in self.outbox.read(2)], ['three', 'four', 'five'])
+        self.assertEqual(self.outbox.read(3), [])
+
+    def test_drains_in_order_after_a_cursor(self):
+        cursors = self._push('one', 'two', 'three')
+        drained = self.outbox.read(1, cursors[0])
+        self.assertEqual([(e['preview'], e['cursor']) for e in drained], [('two', cursors[1]), ('three', cursors[2])])
+        self.assertEqual(self.outbox.read(1, cursors[2]), [])
+        with self.assertRaises(ValueError):
+            self.outbox.read(1, 'nope')
+
+    def test_each_push_renews_the_expiry(self):
+        self._push('one')
+        self.assertTrue(0 < self.redis.ttl('outbox:1') <= 60)
+        self.redis.expire('outbox:1', 5)
+        self._push('two')
+        self.assertGreater(self.redis.ttl('outbox:1'), 5)
+
+        self.redis.delete('outbox:1')
+        self.assertEqual(self.outbox.read(1), [])
+
+
+class ThrottleTests(TestCase):
+    """Chat sockets are rate limited inbound and shed broadcasts outbound"""
+
+    def test_token_bucket(self):
+        bucket = throttle.TokenBucket(rate=1, burst=2)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        self.assertGreater(bucket.take(), 0)
+        # No rate, no limit
+        self.assertEqual(throttle.TokenBucket(None, None).take(), 0)
+
+    @override_settings(CHAT_MESSAGE_RATE=1, CHAT_MESSAGE_BURST=3)
+    def test_per_user_limit(self):
+        limiter = throttle.MemoryRateLimiter()
+        waits = [async_to_sync(limiter.acquire)(1) for _ in range(4)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertGreater(waits[3], 0)
+        self.assertEqual(async_to_sync(limiter.acquire)(2), 0)
+
+    @override_settings(CHAT_SEND_QUEUE_SIZE=2)
+    def test_slow_socket_drops_broadcasts(self):
+        async def run():
+            consumer = StreamConsumer()
+            sent, release = [], asyncio.Event()
+
+            async def base_send(message):
+                await release.wait()
+                sent.append(json.loads(message["text"]))
+
+            consumer.base_send = base_send
+            for n in range(5):
+                consumer._queue_frame({"text": json.dumps({"n": n})}, droppable=True)
+            await consumer.send_json({"reply": 1})
+            release.set()
+            while {"event": "lagged"} not in sent:
+                await asyncio.sleep(0.01)
+            # Back to normal once the client has caught up
+            consumer._queue_frame({"text": json.dumps({"n": 5})}, droppable=True)
+            while len(sent) < 5:
+                await asyncio.sleep(0.01)
+            consumer.writer_task.cancel()
+            return sent
+
+        dropped = throttle.counters["frames_dropped"]
+        sent = async_to_sync(run)()
+        self.assertEqual(sent, [{"n": 0}, {"n": 1}, {"reply": 1}, {"event": "lagged"}, {"n": 5}])
+        self.assertEqual(throttle.counters["frames_dropped"] - dropped, 3)
+
+
+
+class RedisRateLimiterTests(FakeRedisTestCase):
+    """The shared per-user bucket runs as one Lua script registered once per client"""
+
+    @override_settings(CHAT_MESSAGE_RATE=20, CHAT_MESSAGE_BURST=2)
+    def test_bucket_rejects_when_empty_and_refills(self):
+        limiter = throttle.RedisRateLimiter()
+        register = mock.patch.object(
+            fakeredis.FakeAsyncRedis, 'register_script', autospec=True,
+            side_effect=fakeredis.FakeAsyncRedis.register_script,
+        )
+
+        async def run():
+            waits = [await limiter.acquire(1) for _ in range(3)]
+            await asyncio.sleep(waits[-1] + 0.01)
+            return waits, await limiter.acquire(1), await limiter.acquire(2)
+
+        with register as registered:
+            waits, refilled, other_user = async_to_sync(run)()
+        self.assertEqual(waits[:2], [0, 0])
+        # Empty: one token comes back every 1/20 s
+        self.assertGreater(waits[2], 0)
+        self.assertLessEqual(waits[2], 0.05)
+        self.assertEqual((refilled, other_user), (0, 0))
+        self.assertEqual(registered.call_count, 1)
+        self.assertTrue(self.redis.exists('ratelimit:chat:1'))
+
+
+class FramingTests(TestCase):
+    """msgpack sockets get compact frames; broadcasts are forwarded pre-encoded"""
+
+    def setUp(self):
+        self.payload = {
+            "id": 7,
+            "conversation_id": "1_2",
+            "text": "hi",
+            "sender_id": 1,
+            "sender_name": "one@example.com",
+            "created_at": "2025-01-01T00:00:01.500000+00:00",
+        }
+
+    def test_compact_form(self):
+        unpacked = framing.unpack(framing.pack({"event": "history", "messages": [self.payload]}))
+        self.assertEqual(
+            unpacked["messages"][0],
+            {"id": 7, "conversation_id": "1_2", "text": "hi", "sender_id": 1, "created_at": 1735689601500},
+        )
+
+    def test_broadcast_is_forwarded_as_encoded(self):
+        event = {"type": "chat.message", **framing.broadcast(self.payload)}
+        # One encoding on the channel layer, not one per framing
+        self.assertEqual(set(event), {"type", "text"})
+
+        async def run(packed):
+            consumer = StreamConsumer()
+            consumer.packed = packed
+            sent = []
+
+            async def base_send(message):
+                sent.append(message)
+
+            consumer.base_send = base_send
+            await consumer.chat_message(event)
+            while not sent:
+                await asyncio.sleep(0.01)
+            consumer.writer_task.cancel()
+            return sent[0]
+
+        self.assertIs(async_to_sync(run)(False)["text"], event["text"])
+        # msgpack sockets share one encoding, made on first use
+        packed = async_to_sync(run)(True)["bytes"]
+        self.assertIs(async_to_sync(run)(True)["bytes"], packed)
+        self.assertEqual(framing.unpack(packed), framing.compact(self.payload))
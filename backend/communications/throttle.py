@@ -0,0 +1,155 @@
+"""
+Rate limits and counters for chat sockets.
+
+Inbound, every socket has a token bucket for all of its frames
+(``CHAT_FRAME_RATE`` per second, bursts of ``CHAT_FRAME_BURST``); frames
+over it are dropped unhandled, though a dropped chat message gets the same
+error, with its text, as one over the per-user limit. Posting a message also
+takes a token from the sender's per-user bucket (``CHAT_MESSAGE_RATE`` /
+``CHAT_MESSAGE_BURST``), shared by all their sockets in this process with
+``MemoryRateLimiter`` or across processes with ``RedisRateLimiter``
+(``CHAT_RATE_LIMIT_BACKEND``).
+
+Outbound, each consumer queues frames for its socket; see
+``BaseChatConsumer._queue_frame`` and ``CHAT_SEND_QUEUE_SIZE``.
+
+``counters`` counts throttled and dropped frames in this process.
+"""
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .redis_client import get_async_redis, get_script
+
+
+logger = logging.getLogger(__name__)
+
+# frames_throttled, messages_throttled, frames_dropped, sockets_lagged
+counters = Counter()
+
+# Per-user buckets kept by MemoryRateLimiter, least recently used first out
+MAX_USERS = 10000
+
+# KEYS[1] = bucket hash, ARGV[1] = rate per second, ARGV[2] = burst
+# Returns 0 if a token was taken, else the milliseconds until one is available
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens')) or burst
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated')) or now
+tokens = math.min(burst, tokens + (now - updated) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+
+def send_queue_size():
+    return getattr(settings, 'CHAT_SEND_QUEUE_SIZE', 256)
+
+
+class TokenBucket:
+    """``rate`` tokens a second, holding at most ``burst``; a falsy rate never limits"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst or 1
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take a token; returns 0 if there was one, else the seconds until there will be"""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+def frame_bucket():
+    """A new per-socket bucket for inbound frames"""
+    return TokenBucket(getattr(settings, 'CHAT_FRAME_RATE', 20), getattr(settings, 'CHAT_FRAME_BURST', 40))
+
+
+def _message_limits():
+    return getattr(settings, 'CHAT_MESSAGE_RATE', 5), getattr(settings, 'CHAT_MESSAGE_BURST', 20)
+
+
+class RateLimiter(ABC):
+    """Per-user message budget"""
+
+    @abstractmethod
+    async def acquire(self, user_id):
+        """Take one message from ``user_id``'s budget; returns 0, or the seconds to wait"""
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Buckets in this process: each server process allows a user the full rate"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    async def acquire(self, user_id):
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(*_message_limits())
+                while len(self._buckets) > MAX_USERS:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(user_id)
+            return bucket.take()
+
+
+class RedisRateLimiter(RateLimiter):
+    """One bucket per user in Redis, shared by every server process"""
+
+    async def acquire(self, user_id):
+        rate, burst = _message_limits()
+        if not rate:
+            return 0
+        r = get_async_redis()
+        try:
+            wait_ms = await get_script(r, TOKEN_BUCKET_SCRIPT)(
+                keys=[f"ratelimit:chat:{user_id}"], args=[rate, burst or 1]
+            )
+        except Exception:
+            # Fail open: losing the limiter must not stop chat
+            logger.warning("Chat rate limiter unavailable; allowing message", exc_info=True)
+            return 0
+        return int(wait_ms) / 1000
+
+
+_limiter_lock = threading.Lock()
+_limiter = None
+
+
+def get_limiter():
+    """The process-wide limiter named by ``CHAT_RATE_LIMIT_BACKEND``"""
+    global _limiter
+    path = getattr(settings, 'CHAT_RATE_LIMIT_BACKEND', 'communications.throttle.MemoryRateLimiter')
+    with _limiter_lock:
+        if _limiter is None or _limiter[0] != path:
+            _limiter = (path, import_string(path)())
+        return _limiter[1]
+
+
+def stats():
+    return dict(counters)
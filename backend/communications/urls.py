@@ -1,11 +1,23 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path
-from .views import CommunicationViewSet, ChatHistoryView, PresenceOfflineView, PresenceOnlineView
+from .views import (
+    CommunicationViewSet,
+    ChatHistoryView,
+    ChatOutboxView,
+    ConversationReadView,
+    InboxView,
+    PresenceOfflineView,
+    PresenceOnlineView,
+)
 
 router = DefaultRouter()
 router.register(r'communications', CommunicationViewSet, basename='communication')
 
 urlpatterns = router.urls + [
+    path('chat/inbox/', InboxView.as_view(), name='chat-inbox'),
+    path('chat/outbox/', ChatOutboxView.as_view(), name='chat-outbox'),
+    path('chat/<str:room>/read/', ConversationReadView.as_view(), name='chat-read'),
+    path('chat/<str:room>/history/', ChatHistoryView.as_view(), name='chat-history'),
     path('chat/<str:room>/delete/', ChatHistoryView.as_view(), name='chat-delete'),
     path('presence/offline/', PresenceOfflineView.as_view(), name='presence-offline'),
     path('presence/online/', PresenceOnlineView.as_view(), name='presence-online'),
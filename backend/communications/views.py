@@ -1,32 +1,29 @@
-from rest_framework import viewsets, permissions, status
+import asyncio
+
+from rest_framework import generics, viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Q
 from django.utils import timezone
 from datetime import datetime
 
-from .models import (
-    Communication,
-    Memo,
-    Circular,
-    CommunicationDocument,
-    CommunicationEvent,
-    ChatMessage
-)
+from .models import Communication, ConversationMember
 from .serializers import (
     CommunicationSerializer,
     CommunicationListSerializer,
     CommunicationCreateSerializer,
-    MemoSerializer,
-    CircularSerializer,
-    CommunicationDocumentSerializer,
-    CommunicationEventSerializer
+    InboxSerializer,
+    CHILD_RELATIONS
 )
+from . import history, inbox, outbox, purge
+from .presence import get_store, presence_group
 from accounts.models import User
+from config.instrumentation import InstrumentedViewMixin
+from config.pagination import CreatedAtCursorPagination
+from search import backends as search_index
 from rest_framework.views import APIView
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-import redis
 
 
 class CommunicationPermission(permissions.BasePermission):
@@ -52,7 +49,7 @@ class CommunicationPermission(permissions.BasePermission):
         return obj.created_by == user or user.role == User.Role.ADMIN
 
 
-class CommunicationViewSet(viewsets.ModelViewSet):
+class CommunicationViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and managing communications.
     
@@ -76,16 +73,16 @@ class CommunicationViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter communications based on search and filters"""
-        queryset = Communication.objects.all()
+        queryset = Communication.objects.select_related('created_by')
+        if self.action != 'list':
+            # Child rows are LEFT JOINed in the same query; the serializer reads
+            # only the one matching `type`
+            queryset = queryset.select_related(*CHILD_RELATIONS.values())
         
-        # Search functionality
+        # Full-text search (see search.backends)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(target_department__icontains=search)
-            )
+            queryset = search_index.filter_queryset(queryset, 'communication', search)
         
         # Filter by type
         comm_type = self.request.query_params.get('type', None)
@@ -168,6 +165,11 @@ class CommunicationViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+async def _group_send_all(channel_layer, groups, message):
+    """Send one message to several channel-layer groups concurrently"""
+    await asyncio.gather(*(channel_layer.group_send(group, message) for group in groups))
+
+
 def _user_in_room(room_key: str, user_id: int) -> bool:
     """Check if a user id is one of the participants encoded in room_key."""
     try:
@@ -186,19 +188,14 @@ class PresenceOfflineView(APIView):
 
     def post(self, request):
         user_id = request.user.id
-        r = redis.Redis(host="127.0.0.1", port=6379, decode_responses=True)
-        r.delete(f"presence:count:{user_id}")
-        r.srem("presence:online_users", user_id)
+        get_store().set_offline(user_id)
 
         payload = {"event": "presence", "user_id": user_id, "status": "offline"}
         channel_layer = get_channel_layer()
         if channel_layer:
+            # Only sockets watching this user receive it
             async_to_sync(channel_layer.group_send)(
-                "presence",
-                {"type": "presence.update", "payload": payload},
-            )
-            async_to_sync(channel_layer.group_send)(
-                f"user_{user_id}",
+                presence_group(user_id),
                 {"type": "presence.update", "payload": payload},
             )
 
@@ -213,19 +210,15 @@ class PresenceOnlineView(APIView):
 
     def post(self, request):
         user_id = request.user.id
-        r = redis.Redis(host="127.0.0.1", port=6379, decode_responses=True)
-        r.set(f"presence:count:{user_id}", 1)
-        r.sadd("presence:online_users", user_id)
+        # Online for one TTL window without holding a socket's count
+        get_store().set_online(user_id)
 
         payload = {"event": "presence", "user_id": user_id, "status": "online"}
         channel_layer = get_channel_layer()
         if channel_layer:
+            # Only sockets watching this user receive it
             async_to_sync(channel_layer.group_send)(
-                "presence",
-                {"type": "presence.update", "payload": payload},
-            )
-            async_to_sync(channel_layer.group_send)(
-                f"user_{user_id}",
+                presence_group(user_id),
                 {"type": "presence.update", "payload": payload},
             )
 
@@ -234,11 +227,34 @@ class PresenceOnlineView(APIView):
 
 class ChatHistoryView(APIView):
     """
-    Delete chat history for a given conversation room.
-    Only participants in the room can delete.
+    Page through or delete the chat history of a conversation room.
+    Only participants in the room can read or delete.
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request, room):
+        """?before=<cursor> pages back from the latest messages; ?since=<id> returns newer ones"""
+        if not _user_in_room(room, request.user.id):
+            return Response(
+                {"detail": "Not permitted to read this conversation."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        try:
+            page = history.history_payload(
+                room,
+                before=request.query_params.get('before'),
+                since=request.query_params.get('since'),
+                limit=request.query_params.get('limit'),
+            )
+        except ValueError:
+            return Response({'error': 'Invalid cursor or since id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'results': page['messages'],
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more'],
+        })
+
     def delete(self, request, room):
         if not _user_in_room(room, request.user.id):
             return Response(
@@ -251,7 +267,9 @@ class ChatHistoryView(APIView):
         except Exception:
             participants = set()
 
-        deleted_count, _ = ChatMessage.objects.filter(conversation_id=room).delete()
+        # Hidden at once; a background worker removes the rows in chunks
+        through = timezone.now()
+        deleted_count = purge.clear_history(room, through)
 
         # Broadcast deletion to participants and the room
         channel_layer = get_channel_layer()
@@ -260,19 +278,80 @@ class ChatHistoryView(APIView):
             "room": room,
             "by": request.user.id,
             "deleted": deleted_count,
+            "through": through.isoformat(),
         }
         if channel_layer:
-            # room-level broadcast
-            async_to_sync(channel_layer.group_send)(
-                f"chat_{room}",
-                {"type": "chat.deletion", "payload": payload},
-            )
-            # per-user broadcast
-            for uid in participants:
-                async_to_sync(channel_layer.group_send)(
-                    f"user_{uid}",
-                    {"type": "chat.deletion", "payload": payload},
-                )
+            # room-level and per-user broadcasts, sent concurrently
+            groups = [f"chat_{room}", *(f"user_{uid}" for uid in sorted(participants))]
+            async_to_sync(_group_send_all)(channel_layer, groups, {"type": "chat.deletion", "payload": payload})
 
         return Response({"deleted": deleted_count})
 
+
+class InboxPagination(CreatedAtCursorPagination):
+    """Latest conversation first, along the (user, -last_message_at) index"""
+    ordering = ('-last_message_at', '-pk')
+    page_size = 30
+    max_page_size = 100
+
+
+class InboxView(generics.ListAPIView):
+    """
+    The current user's conversations, most recent first, with the last
+    message and unread count of each.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = InboxSerializer
+    pagination_class = InboxPagination
+
+    def get_queryset(self):
+        return (
+            ConversationMember.objects.filter(user=self.request.user, last_message_at__isnull=False)
+            .select_related('conversation', 'peer')
+        )
+
+
+class ConversationReadView(APIView):
+    """
+    Mark a conversation read up to a message (``message_id``), or entirely
+    if none is given.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, room):
+        message_id = request.data.get('message_id')
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return Response({'error': 'message_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        member = inbox.mark_read(room, request.user, message_id)
+        if member is None:
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'room': room,
+            'last_read_message_id': member.last_read_message_id,
+            'unread_count': member.unread_count,
+        })
+
+
+class ChatOutboxView(APIView):
+    """
+    Message notifications the current user missed: every envelope after
+    ``?after=<cursor>`` (the ``cursor`` of the last one received), or all
+    that are kept if omitted.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        after = request.query_params.get('after') or None
+        try:
+            results = outbox.get_outbox().read(request.user.id, after)
+        except ValueError:
+            return Response({'error': 'Invalid outbox cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'results': results,
+            'next_cursor': results[-1]['cursor'] if results else after,
+        })
@@ -0,0 +1,208 @@
+"""
+Write-behind persistence for chat messages (``CHAT_WRITE_BEHIND``).
+
+With it enabled, a consumer gives each message a snowflake id, broadcasts it
+at once and hands it to the ``MessageWriter`` of its event loop, which saves
+buffered messages with one ``bulk_create`` every
+``CHAT_WRITE_BEHIND_INTERVAL`` seconds, or as soon as
+``CHAT_WRITE_BEHIND_BATCH`` are waiting. Chat writes no longer queue one by
+one behind SQLite's single writer lock.
+
+Every server process needs its own ``CHAT_WORKER_ID``; the app refuses to
+start without one. Should an id clash anyway, the message is saved under a
+fresh id (its broadcast already carried the old one).
+
+Durability: a failed flush keeps its batch and retries on the next tick; the
+ASGI lifespan shutdown flushes the running loop's writer, and anything still
+buffered at interpreter exit is saved synchronously. Daphne sends no lifespan
+events, but stops on SIGTERM and exits normally; where nothing else handles
+SIGTERM, ``install_exit_handler`` turns it into a normal exit too. A hard
+kill loses at most one interval of messages. History reads can lag broadcasts by the same
+interval.
+"""
+import asyncio
+import atexit
+import logging
+import signal
+import threading
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import inbox, snowflake
+from .models import ChatMessage
+
+
+logger = logging.getLogger(__name__)
+
+
+def enabled():
+    return getattr(settings, 'CHAT_WRITE_BEHIND', False)
+
+
+def flush_interval():
+    return getattr(settings, 'CHAT_WRITE_BEHIND_INTERVAL', 0.2)
+
+
+def batch_size():
+    return getattr(settings, 'CHAT_WRITE_BEHIND_BATCH', 200)
+
+
+def save_batch(messages):
+    """
+    Insert ``messages`` in one statement and update their conversations. If
+    that hits a constraint, save them one by one so a single bad row does not
+    hold back the rest. A message whose id is already taken is saved under a
+    fresh one rather than dropped; one that still fails (a deleted sender) is
+    dropped.
+    """
+    try:
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create(messages)
+            inbox.record_messages(messages)
+        return
+    except IntegrityError:
+        logger.warning("Bulk insert of %d chat messages failed; saving them one by one", len(messages))
+
+    for message in messages:
+        try:
+            _save_one(message)
+            continue
+        except IntegrityError:
+            holder = ChatMessage.objects.filter(id=message.id).values('conversation_id', 'sender_id', 'text').first()
+            if holder is None:
+                logger.exception("Dropping chat message %s in %s", message.id, message.conversation_id)
+                continue
+            same = {'conversation_id': message.conversation_id, 'sender_id': message.sender_id, 'text': message.text}
+            if holder == same:
+                # Saved by an earlier attempt whose outcome was lost
+                continue
+
+        taken, message.id = message.id, snowflake.next_id()
+        logger.warning("Chat message id %s is taken; saving the message as %s", taken, message.id)
+        try:
+            _save_one(message)
+        except IntegrityError:
+            logger.exception("Dropping chat message %s in %s", message.id, message.conversation_id)
+
+
+def _save_one(message):
+    with transaction.atomic():
+        message.save(force_insert=True)
+        inbox.record_messages([message])
+
+
+class MessageWriter:
+    """Buffers unsaved messages of one event loop and bulk-inserts them"""
+
+    def __init__(self):
+        self.pending = []
+        self._task = None
+        # Running flushes; the loop only keeps weak references to tasks
+        self._tasks = set()
+        self._lock = asyncio.Lock()
+
+    def add(self, message):
+        self.pending.append(message)
+        _unflushed.add(self)
+        if len(self.pending) >= batch_size():
+            self._spawn(self.flush())
+        elif self._task is None:
+            self._task = self._spawn(self._flush_later())
+        return message
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+        return task
+
+    def _finished(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Chat message flush failed", exc_info=task.exception())
+
+    def discard(self, room, through):
+        """Drop buffered messages of ``room`` sent up to ``through``, when its history was deleted"""
+        self.pending = [m for m in self.pending if m.conversation_id != room or m.created_at > through]
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(flush_interval())
+        finally:
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        # One flush at a time keeps batches in insertion order
+        async with self._lock:
+            size = batch_size()
+            while self.pending:
+                batch, self.pending = self.pending[:size], self.pending[size:]
+                try:
+                    await database_sync_to_async(save_batch)(batch)
+                except Exception:
+                    logger.exception("Could not save %d chat messages; retrying", len(batch))
+                    self.pending[:0] = batch
+                    if self._task is None:
+                        self._task = self._spawn(self._flush_later())
+                    return
+            _unflushed.discard(self)
+
+    def flush_sync(self):
+        """Save whatever is buffered, outside the event loop (interpreter exit)"""
+        size = batch_size()
+        while self.pending:
+            batch, self.pending = self.pending[:size], self.pending[size:]
+            save_batch(batch)
+        _unflushed.discard(self)
+
+
+_writers = weakref.WeakKeyDictionary()
+# Writers holding unsaved messages, kept alive until they are flushed
+_unflushed = set()
+
+
+def get_writer():
+    """The writer of the running event loop"""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = MessageWriter()
+    return writer
+
+
+async def aflush():
+    """Flush the running loop's writer (ASGI lifespan shutdown)"""
+    writer = _writers.get(asyncio.get_running_loop())
+    if writer is not None:
+        await writer.flush()
+
+
+def flush_all_sync():
+    for writer in list(_unflushed):
+        try:
+            writer.flush_sync()
+        except Exception:
+            logger.exception("Could not save %d buffered chat messages at exit", len(writer.pending))
+
+
+def install_exit_handler():
+    """
+    Exit normally on SIGTERM, so ``flush_all_sync`` runs, unless the process
+    already handles the signal (Daphne's reactor and uvicorn install their own)
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _exit_on_signal)
+
+
+def _exit_on_signal(signum, frame):
+    # Unwinds any running event loop first: the ORM cannot run sync inside one
+    raise SystemExit(128 + signum)
+
+
+atexit.register(flush_all_sync)
@@ -17,8 +17,14 @@ from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
 
 django.setup()
 import config.routing  # noqa: E402, E401
+from communications.auth import JWTAuthMiddleware  # noqa: E402
+from communications.lifespan import lifespan  # noqa: E402
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": URLRouter(config.routing.websocket_urlpatterns),
+    # Resolves ?token= to scope["user"] once per handshake, cached per user and token
+    "websocket": JWTAuthMiddleware(URLRouter(config.routing.websocket_urlpatterns)),
+    # Servers that speak ASGI lifespan (uvicorn) flush buffered chat writes and close
+    # the shared Redis pools on shutdown; under Daphne the writes are saved at exit
+    "lifespan": lifespan,
 })
@@ -0,0 +1,216 @@
+"""
+Per-request timing for the API.
+
+``InstrumentationMiddleware`` times each request and every database query it
+runs. It adds a ``Server-Timing`` header (``db``, ``serialize`` and ``total``)
+and records the numbers in this process's histograms, labelled by view
+action: ``MemoViewSet.list``, ``MeView.get``. Queries slower than
+``SLOW_QUERY_MS`` are logged with their SQL and view.
+
+Serializer time is only measured for views that use ``InstrumentedViewMixin``,
+and it includes any queries the serializer runs itself.
+
+``/api/_metrics/`` serves the histograms in the Prometheus text format. Each
+server process keeps its own.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# The RequestTimings of the request running in this context, if any
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def slow_query_ms():
+    return getattr(settings, 'SLOW_QUERY_MS', 200)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        # Nesting of instrumented serializers, so only the outermost one is timed
+        self.serializing = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """``connection.execute_wrapper`` hook: counts and times one query"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db += elapsed
+            threshold = slow_query_ms()
+            if threshold is not None and elapsed * 1000 >= threshold:
+                logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, self.view or '-', sql)
+
+
+class Histogram:
+    """Cumulative buckets, sum and count per label value"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, label, value):
+        series = self._series.get(label)
+        if series is None:
+            series = self._series[label] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label, (counts, total, count) in sorted(self._series.items()):
+            view = _escape(label)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{view="{view}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{view="{view}"}} {total}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {count}')
+        return lines
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_lock = threading.Lock()
+HISTOGRAMS = {
+    'total': Histogram('http_request_duration_seconds', 'Time to handle a request.', SECONDS_BUCKETS),
+    'db': Histogram('http_request_db_seconds', 'Time spent in database queries per request.', SECONDS_BUCKETS),
+    'queries': Histogram('http_request_db_queries', 'Database queries per request.', QUERY_BUCKETS),
+    'serialize': Histogram(
+        'http_request_serialize_seconds', 'Time spent serializing responses (instrumented views only).',
+        SECONDS_BUCKETS
+    ),
+}
+
+
+def record(timings, total, serialized):
+    label = timings.view or 'unresolved'
+    with _lock:
+        HISTOGRAMS['total'].observe(label, total)
+        HISTOGRAMS['db'].observe(label, timings.db)
+        HISTOGRAMS['queries'].observe(label, timings.queries)
+        if serialized:
+            HISTOGRAMS['serialize'].observe(label, timings.serialize)
+
+
+def exposition():
+    """All histograms in the Prometheus text format"""
+    with _lock:
+        lines = [line for histogram in HISTOGRAMS.values() for line in histogram.exposition()]
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        for histogram in HISTOGRAMS.values():
+            histogram._series.clear()
+
+
+def view_label(request):
+    """``<class>.<action>`` for DRF views, else the URL name or view function"""
+    match = request.resolver_match
+    func = match.func
+    cls = getattr(func, 'cls', None)
+    if cls is not None:
+        method = request.method.lower()
+        actions = getattr(func, 'actions', None)
+        return f"{cls.__name__}.{actions.get(method, method) if actions else method}"
+    return match.view_name or getattr(func, '__name__', type(func).__name__)
+
+
+class InstrumentationMiddleware:
+    """Times every request and its queries; see the module docstring"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        serialized = timings.serialize > 0
+        record(timings, total, serialized)
+        if getattr(settings, 'SERVER_TIMING', True):
+            metrics = [f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"']
+            if serialized:
+                metrics.append(f'serialize;dur={timings.serialize * 1000:.1f}')
+            metrics.append(f'total;dur={total * 1000:.1f}')
+            response['Server-Timing'] = ', '.join(metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.view = view_label(request)
+        return None
+
+
+_timed_classes = {}
+
+
+def _timed(serializer_class):
+    """A subclass of ``serializer_class`` that adds its output time to the request's"""
+    timed = _timed_classes.get(serializer_class)
+    if timed is not None:
+        return timed
+
+    def to_representation(self, instance):
+        timings = _current.get()
+        # Nested serializers of the same class are already inside the outer timing
+        if timings is None or timings.serializing:
+            return super(timed, self).to_representation(instance)
+        timings.serializing += 1
+        started = time.perf_counter()
+        try:
+            return super(timed, self).to_representation(instance)
+        finally:
+            timings.serialize += time.perf_counter() - started
+            timings.serializing -= 1
+
+    timed = type(serializer_class.__name__, (serializer_class,), {
+        '__module__': serializer_class.__module__,
+        'to_representation': to_representation,
+    })
+    return _timed_classes.setdefault(serializer_class, timed)
+
+
+class InstrumentedViewMixin:
+    """For DRF generic views: reports serializer output time as ``serialize``"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = _timed(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
@@ -0,0 +1,128 @@
+import json
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Default keyset pagination for list endpoints.
+
+    Pages walk the `-created_at` index; the trailing primary key keeps the
+    order (and therefore every cursor) stable when timestamps tie.
+    Clients may ask for smaller or larger pages with ?page_size=, capped at
+    `max_page_size` per endpoint.
+
+    Unlike DRF's CursorPagination, which keys the cursor on the first
+    ordering field only and skips ties with an OFFSET, the cursor holds
+    every ordering field and pages resume with a row-value comparison, so
+    long runs of equal names or dates cost nothing extra. Subclasses must
+    end `ordering` with a unique field. NULLs sort first.
+    """
+    ordering = ('-created_at', '-pk')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # DRF's implementation, with the position filter and ordering swapped
+        # for composite ones; positions are unique, so offsets stay 0
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*[_order_expression(field) for field in ordering])
+        if current_position is not None:
+            queryset = queryset.filter(self._after(ordering, current_position))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _attname(self, field_name):
+        if field_name == 'pk':
+            return self.model._meta.pk.attname
+        return self.model._meta.get_field(field_name).attname
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            attname = self._attname(field.lstrip('-'))
+            value = instance[attname] if isinstance(instance, dict) else getattr(instance, attname)
+            values.append(None if value is None else str(value))
+        return json.dumps(values)
+
+    def _after(self, ordering, position):
+        """Rows that follow `position` in `ordering`: (a > x) | (a = x & b > y) | ..."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            condition |= equal & _beyond(name, value, descending=field.startswith('-'))
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return condition
+
+
+def _order_expression(field):
+    # Pin NULLs first so the cursor comparison matches on every database
+    if field.startswith('-'):
+        return F(field[1:]).desc(nulls_last=True)
+    return F(field).asc(nulls_first=True)
+
+
+def _beyond(name, value, descending):
+    """Rows strictly past `value` on one field, with NULL as the smallest value"""
+    if descending:
+        if value is None:
+            return Q(pk__in=[])
+        return Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+    if value is None:
+        return Q(**{f'{name}__isnull': False})
+    return Q(**{f'{name}__gt': value})
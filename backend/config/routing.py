@@ -1,8 +1,10 @@
 from django.urls import path
 
-from communications.consumers import ChatConsumer
+from communications.consumers import ChatConsumer, StreamConsumer
 
 websocket_urlpatterns = [
+    # One multiplexed socket per user: subscribe to any number of rooms over it
+    path("ws/stream/", StreamConsumer.as_asgi()),
     # room is a string key built from the two participant IDs (e.g., "1_7")
     path("ws/messages/<str:room>/", ChatConsumer.as_asgi()),
 ]
@@ -49,9 +49,14 @@ INSTALLED_APPS = [
     'memos',
     'tickets',
     'events',
+    'reports',
+    'sequences',
+    'search',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'config.instrumentation.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -165,19 +170,122 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Keyset pagination; endpoints override ordering/max_page_size where needed
+    'DEFAULT_PAGINATION_CLASS': 'config.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            # Redis running on the backend host; adjust if using a different server/port
-            'hosts': [('127.0.0.1', 6379)],
+# Request metrics (config.instrumentation, /api/_metrics/): queries slower than SLOW_QUERY_MS
+# are logged as warnings (None turns that off); SERVER_TIMING adds the Server-Timing header
+SLOW_QUERY_MS = 200
+SERVER_TIMING = True
+
+# Redis running on the backend host; adjust if using a different server/port
+REDIS_URL = 'redis://127.0.0.1:6379/0'
+
+# Shared per-process pools for presence (communications.redis_client); callers wait
+# up to REDIS_POOL_TIMEOUT seconds for a free connection instead of opening more
+REDIS_MAX_CONNECTIONS = 50
+REDIS_POOL_TIMEOUT = 5
+
+# Chat presence expires PRESENCE_TTL seconds after the last heartbeat or sweep;
+# each process renews its own connected users every PRESENCE_SWEEP_INTERVAL seconds
+PRESENCE_TTL = 120
+PRESENCE_SWEEP_INTERVAL = 30
+
+# Presence changes go only to sockets watching that user (conversation partners and
+# explicit subscriptions, at most PRESENCE_MAX_WATCHED per socket), batched per tick
+PRESENCE_BATCH_INTERVAL = 0.5
+PRESENCE_MAX_WATCHED = 500
+
+# Rooms one ws/stream/ socket may subscribe to (the messages page joins one per conversation)
+STREAM_MAX_ROOMS = 500
+
+# Messages per chat history page (WebSocket and /api/chat/<room>/history/), at most 100
+CHAT_HISTORY_PAGE_SIZE = 30
+
+# Write-behind chat persistence: messages get a snowflake id, are broadcast at once and
+# saved with bulk_create every CHAT_WRITE_BEHIND_INTERVAL seconds or CHAT_WRITE_BEHIND_BATCH
+# messages. Every server process needs its own CHAT_WORKER_ID (0-31) when enabled; startup
+# fails without one.
+CHAT_WRITE_BEHIND = False
+CHAT_WRITE_BEHIND_INTERVAL = 0.2
+CHAT_WRITE_BEHIND_BATCH = 200
+CHAT_WORKER_ID = None
+
+# Deleted chat history is hidden at once and purged in the background, this many rows per
+# transaction, so a large delete does not hold SQLite's write lock
+CHAT_PURGE_CHUNK_SIZE = 1000
+
+# WebSocket handshakes reuse the user resolved for the same user id and token jti for
+# WS_AUTH_CACHE_TTL seconds (per process, at most WS_AUTH_CACHE_USERS users); saving or
+# deleting a user drops their entries at once
+WS_AUTH_CACHE_TTL = 60
+WS_AUTH_CACHE_USERS = 10000
+
+# New chat messages are also sent to each recipient's user_<id> group and kept in their
+# outbox (/api/chat/outbox/), the last CHAT_OUTBOX_SIZE per user, for CHAT_OUTBOX_TTL
+# seconds after the latest one
+CHAT_OUTBOX_SIZE = 200
+CHAT_OUTBOX_TTL = 7 * 24 * 3600
+
+# Inbound chat limits (token buckets): CHAT_FRAME_RATE frames a second per socket, bursts
+# of CHAT_FRAME_BURST, over which frames are dropped; CHAT_MESSAGE_RATE messages a second
+# per user, bursts of CHAT_MESSAGE_BURST, over which the sender gets an error frame.
+# None disables a limit. Per-user buckets live in this process (MemoryRateLimiter) or in
+# Redis, shared by all processes (communications.throttle.RedisRateLimiter).
+CHAT_FRAME_RATE = 20
+CHAT_FRAME_BURST = 40
+CHAT_MESSAGE_RATE = 5
+CHAT_MESSAGE_BURST = 20
+CHAT_RATE_LIMIT_BACKEND = 'communications.throttle.MemoryRateLimiter'
+
+# Broadcast frames waiting for one slow socket; past this they are dropped and the client
+# is sent {"event": "lagged"} to catch up from history
+CHAT_SEND_QUEUE_SIZE = 256
+
+# 'redis' shares chat groups and presence between server processes through REDIS_URL;
+# 'memory' keeps both in this process, for a single-node deploy without Redis and for
+# load tests (python manage.py benchmark_chat_fanout)
+REALTIME_BACKEND = 'redis'
+
+if REALTIME_BACKEND == 'memory':
+    PRESENCE_BACKEND = 'communications.presence.MemoryPresenceStore'
+    CHAT_OUTBOX_BACKEND = 'communications.outbox.MemoryOutbox'
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
-    },
-}
+    }
+else:
+    PRESENCE_BACKEND = 'communications.presence.RedisPresenceStore'
+    CHAT_OUTBOX_BACKEND = 'communications.outbox.RedisOutbox'
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_URL],
+            },
+        },
+    }
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
+
+# Background report generation (POST /api/reports/generate/?async=1)
+REPORT_WORKER_THREADS = 2
+
+# Running reports stamp a heartbeat every REPORT_JOB_HEARTBEAT seconds. Queued or running
+# reports without one for REPORT_JOB_TIMEOUT seconds (at least three heartbeats) are marked
+# FAILED (their worker was lost to a crash or restart); checked whenever a job status is polled
+REPORT_JOB_HEARTBEAT = 30
+REPORT_JOB_TIMEOUT = 15 * 60
+
+# Sum whole months from the FacultyActivity rollups instead of scanning documents/events
+REPORT_USE_ROLLUPS = True
+
+# Rendered report exports (PDF/Excel) are cached on disk, least recently used first out
+REPORT_EXPORT_CACHE_DIR = MEDIA_ROOT / 'report_exports'
+REPORT_EXPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024
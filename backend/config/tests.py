@@ -0,0 +1,180 @@
+from datetime import date, time
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from config import instrumentation
+from communications.models import Communication
+from documents.models import Document
+from events.models import Event
+from memos.models import Memo
+from reports.models import Report
+from tickets.models import Ticket
+
+
+class ListEndpointQueryCountTests(TestCase):
+    """
+    Guard against N+1 queries: every list endpoint must run the same number
+    of queries whether it returns a few rows or a full page.
+    """
+
+    endpoints = [
+        '/api/documents/',
+        '/api/memos/',
+        '/api/tickets/',
+        '/api/events/',
+        '/api/communications/',
+        '/api/users/',
+        '/api/reports/',
+        '/api/faculty-activities/',
+    ]
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin@example.com', 'password', role=User.Role.ADMIN)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.created = 0
+
+    def _add_rows(self, count):
+        """Create `count` rows per endpoint, each owned by a different user"""
+        for _ in range(count):
+            self.created += 1
+            n = self.created
+            author = User.objects.create_user(f'author{n}@example.com', 'password', role=User.Role.FACULTY)
+            Document.objects.create(name=f'Document {n}', file=f'documents/{n}.pdf', uploaded_by=author)
+            Memo.objects.create(title=f'Memo {n}', created_by=author)
+            Ticket.objects.create(title=f'Ticket {n}', description='...', created_by=author, assigned_to=self.admin)
+            Event.objects.create(title=f'Event {n}', date=date(2025, 1, 1 + n % 28), created_by=author)
+            Communication.objects.create(type=Communication.CommunicationType.MEMO, title=f'Comm {n}', created_by=author)
+            Report.objects.create(
+                title=f'Report {n}',
+                date_from=date(2025, 1, 1),
+                date_to=date(2025, 12, 31),
+                generated_by=author,
+                report_data=[],
+            )
+
+    def _query_counts(self):
+        counts = {}
+        for url in self.endpoints:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, {'page_size': 50})
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(ctx.captured_queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self._add_rows(2)
+        few = self._query_counts()
+        self._add_rows(10)
+        many = self._query_counts()
+
+        for url in self.endpoints:
+            self.assertEqual(
+                few[url], many[url],
+                f"{url} ran {few[url]} queries for a few rows but {many[url]} for more (N+1?)"
+            )
+
+
+class CursorPaginationTieTests(TestCase):
+    """Paging through long runs of equal leading keys: no duplicates, no gaps, no OFFSET"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin@example.com', 'password', role=User.Role.ADMIN, first_name='Zed')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _walk(self, url, page_size):
+        """Ids on every page following `next`, then following `previous` back"""
+        forward, pages = [], []
+        response = self.client.get(url, {'page_size': page_size})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            forward.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                break
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(response.data['next'])
+            self.assertFalse(any('OFFSET' in query['sql'] for query in ctx.captured_queries), url)
+
+        backward = []
+        response_data = pages[-1]
+        while response_data['previous']:
+            response_data = self.client.get(response_data['previous']).data
+            backward[:0] = [row['id'] for row in response_data['results']]
+        backward.extend(row['id'] for row in pages[-1]['results'])
+        return forward, backward
+
+    def test_users_with_the_same_name(self):
+        for n in range(23):
+            User.objects.create_user(f'maria{n:02}@example.com', 'password', first_name='Maria', last_name='Santos')
+        expected = list(User.objects.order_by('first_name', 'last_name', 'email').values_list('id', flat=True))
+
+        forward, backward = self._walk('/api/users/', page_size=5)
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_events_on_the_same_day(self):
+        for n in range(17):
+            start = None if n % 3 == 0 else time(9 + n % 2)
+            Event.objects.create(title=f'Event {n}', date=date(2025, 3, 1), start_time=start, created_by=self.admin)
+        Event.objects.create(title='Next day', date=date(2025, 3, 2), created_by=self.admin)
+        expected = [
+            event.id for event in sorted(
+                Event.objects.all(), key=lambda e: (e.date, e.start_time is not None, e.start_time or time(), e.id)
+            )
+        ]
+
+        forward, backward = self._walk('/api/events/', page_size=4)
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get('/api/users/', {'cursor': 'cD1ub3QtanNvbg=='}).status_code, 404)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.admin = User.objects.create_user('admin@example.com', 'password', role=User.Role.ADMIN)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        Memo.objects.create(title='Memo', created_by=self.admin)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/memos/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_metrics_are_labelled_by_view_action(self):
+        self.client.get('/api/memos/')
+        self.client.get('/api/memos/')
+        self.client.get('/api/auth/me/')
+
+        response = self.client.get('/api/_metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{view="MemoViewSet.list"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="MemoViewSet.list",le="+Inf"} 2', body)
+        self.assertIn('http_request_serialize_seconds_count{view="MemoViewSet.list"} 2', body)
+        self.assertIn('http_request_db_queries_count{view="MeView.get"} 1', body)
+        # MeView does not use InstrumentedViewMixin, so it has no serializer time
+        self.assertNotIn('http_request_serialize_seconds_count{view="MeView.get"}', body)
+
+    def test_metrics_are_admin_only(self):
+        staff = User.objects.create_user('staff@example.com', 'password', role=User.Role.STAFF)
+        self.client.force_authenticate(staff)
+        self.assertEqual(self.client.get('/api/_metrics/').status_code, 403)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged(self):
+        with self.assertLogs('config.instrumentation', 'WARNING') as logs:
+            self.client.get('/api/memos/')
+        self.assertIn('in MemoViewSet.list: SELECT', logs.output[0])
@@ -20,6 +20,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenRefreshView
 from accounts.views import MeView, AdminOnlyView, EmailTokenObtainPairView
+from config.views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -35,6 +36,9 @@ urlpatterns = [
 
     # Example admin-only endpoint
     path('api/admin-only/', AdminOnlyView.as_view(), name='admin_only'),
+
+    # Request metrics, Prometheus text format (admin only)
+    path('api/_metrics/', MetricsView.as_view(), name='metrics'),
     
     # Documents API
     path('api/', include('documents.urls')),
@@ -53,6 +57,12 @@ urlpatterns = [
     
     # Users/Directory API
     path('api/', include('accounts.urls')),
+    
+    # Reports API
+    path('api/', include('reports.urls')),
+    
+    # Search API
+    path('api/', include('search.urls')),
 ]
 
 # Serve media files in development
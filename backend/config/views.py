@@ -0,0 +1,22 @@
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from accounts.models import User
+from . import instrumentation
+
+
+class IsAdminRole(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role == User.Role.ADMIN
+
+
+class MetricsView(APIView):
+    """
+    GET /api/_metrics/
+    This process's request histograms in the Prometheus text format (admins only)
+    """
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        return HttpResponse(instrumentation.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -2,10 +2,11 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.http import FileResponse, Http404
-from django.db.models import Q
 from .models import Document
 from .serializers import DocumentSerializer, DocumentListSerializer
 from accounts.models import User
+from config.instrumentation import InstrumentedViewMixin
+from search import backends as search_index
 
 
 class DocumentPermission(permissions.BasePermission):
@@ -32,7 +33,7 @@ class DocumentPermission(permissions.BasePermission):
         return obj.uploaded_by == user
 
 
-class DocumentViewSet(viewsets.ModelViewSet):
+class DocumentViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and managing documents.
     
@@ -57,16 +58,12 @@ class DocumentViewSet(viewsets.ModelViewSet):
         """
         Filter documents based on search and route_to.
         """
-        queryset = Document.objects.all()
+        queryset = Document.objects.select_related('uploaded_by')
         
-        # Search functionality
+        # Full-text search (see search.backends)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(route_to__icontains=search)
-            )
+            queryset = search_index.filter_queryset(queryset, 'document', search)
         
         # Filter by route_to
         route_to = self.request.query_params.get('route_to', None)
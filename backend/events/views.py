@@ -6,6 +6,8 @@ from datetime import datetime, date
 from .models import Event
 from .serializers import EventSerializer, EventListSerializer
 from accounts.models import User
+from config.instrumentation import InstrumentedViewMixin
+from config.pagination import CreatedAtCursorPagination
 
 
 class EventPermission(permissions.BasePermission):
@@ -31,7 +33,13 @@ class EventPermission(permissions.BasePermission):
         return obj.created_by == user
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventCursorPagination(CreatedAtCursorPagination):
+    """Calendar order, walking the `date` index"""
+    ordering = ('date', 'start_time', 'id')
+    max_page_size = 500
+
+
+class EventViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and managing calendar events.
     
@@ -45,6 +53,7 @@ class EventViewSet(viewsets.ModelViewSet):
     
     queryset = Event.objects.all()
     permission_classes = [permissions.IsAuthenticated, EventPermission]
+    pagination_class = EventCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -55,7 +64,7 @@ class EventViewSet(viewsets.ModelViewSet):
         """
         Filter events based on date range and other parameters.
         """
-        queryset = Event.objects.all()
+        queryset = Event.objects.select_related('created_by')
         
         # Filter by date (exact match)
         date_filter = self.request.query_params.get('date', None)
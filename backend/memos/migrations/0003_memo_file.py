@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:00
+
+import memos.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memos', '0002_delete_circular'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memo',
+            name='file',
+            field=models.FileField(blank=True, null=True, upload_to=memos.models.memo_upload_path),
+        ),
+    ]
@@ -1,9 +1,10 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
-from django.db.models import Max
 from django.utils import timezone
 import os
 
+from sequences.allocator import allocate, allocate_block, highest_number, reseed
+
 def memo_upload_path(instance, filename):
     """Store memo attachments under media/memos/{user_id}/{filename}"""
     user_id = instance.created_by.id if instance and instance.created_by_id else 'anonymous'
@@ -62,29 +63,37 @@ class Memo(models.Model):
     
     def save(self, *args, **kwargs):
         """Auto-generate memo_id if not set"""
-        if not self.memo_id:
-            self.memo_id = self.generate_memo_id()
-        super().save(*args, **kwargs)
+        if self.memo_id:
+            return super().save(*args, **kwargs)
+        self.memo_id = self.generate_memo_id()
+        try:
+            with transaction.atomic():
+                return super().save(*args, **kwargs)
+        except IntegrityError:
+            if not Memo.objects.filter(memo_id=self.memo_id).exists():
+                raise
+        # Taken by a row numbered outside the sequence: catch the sequence up and retry
+        reseed('memo', Memo.highest_memo_number)
+        self.memo_id = self.generate_memo_id()
+        return super().save(*args, **kwargs)
     
     @staticmethod
     def generate_memo_id():
         """Generate unique memo ID in format MEMO-001, MEMO-002, etc."""
-        # Get the highest memo number
-        last_memo = Memo.objects.aggregate(Max('memo_id'))
-        last_id = last_memo.get('memo_id__max', None)
-        
-        if last_id:
-            # Extract the number part (e.g., "MEMO-001" -> 1)
-            try:
-                last_num = int(last_id.split('-')[1])
-                new_num = last_num + 1
-            except (IndexError, ValueError):
-                new_num = 1
-        else:
-            new_num = 1
-        
-        # Format as MEMO-XXX with leading zeros
-        return f"MEMO-{new_num:03d}"
+        # One atomic update on the 'memo' sequence row; no scan of existing IDs
+        number = allocate('memo', initial=Memo.highest_memo_number)
+        return f"MEMO-{number:03d}"
+
+    @staticmethod
+    def generate_memo_ids(count):
+        """Reserve `count` consecutive memo IDs at once, e.g. for bulk imports"""
+        numbers = allocate_block('memo', count, initial=Memo.highest_memo_number)
+        return [f"MEMO-{number:03d}" for number in numbers]
+
+    @staticmethod
+    def highest_memo_number():
+        """Highest number among existing memo IDs, compared numerically"""
+        return highest_number(Memo.objects.values_list('memo_id', flat=True).iterator())
     
     @property
     def is_published(self):
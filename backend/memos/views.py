@@ -11,6 +11,8 @@ from .serializers import (
     MemoListSerializer
 )
 from accounts.models import User
+from config.instrumentation import InstrumentedViewMixin
+from search import backends as search_index
 
 
 class MemoPermission(permissions.BasePermission):
@@ -34,7 +36,7 @@ class MemoPermission(permissions.BasePermission):
         return obj.created_by == user or user.role == User.Role.ADMIN
 
 
-class MemoViewSet(viewsets.ModelViewSet):
+class MemoViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and managing memos.
     
@@ -56,17 +58,12 @@ class MemoViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter memos based on search and filters"""
-        queryset = Memo.objects.all()
+        queryset = Memo.objects.select_related('created_by')
         
-        # Search functionality
+        # Full-text search (see search.backends)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(memo_id__icontains=search) |
-                Q(target_department__icontains=search)
-            )
+            queryset = search_index.filter_queryset(queryset, 'memo', search)
         
         # Filter by department
         department = self.request.query_params.get('department', None)
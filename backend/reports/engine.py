@@ -0,0 +1,161 @@
+import calendar
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from accounts.models import User
+from documents.models import Document
+from events.models import Event
+from .models import FacultyActivity
+
+
+# Estimated service hours credited per event (no per-event duration is tracked yet)
+HOURS_PER_EVENT = 2
+
+# Events whose title mentions one of these are counted as trainings attended
+TRAINING_KEYWORDS = ('workshop', 'seminar')
+
+
+def month_bounds(day):
+    """First and last day of the month containing ``day``"""
+    start = day.replace(day=1)
+    last = calendar.monthrange(day.year, day.month)[1]
+    return start, day.replace(day=last)
+
+
+def _period_bounds(date_from, date_to):
+    """
+    Convert an inclusive date range into [start, end) aware datetimes so the
+    created_at filters can use the index instead of a per-row __date cast.
+    """
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+def faculty_queryset(unit_filter=None):
+    """Active faculty users included in activity reports"""
+    queryset = User.objects.filter(role=User.Role.FACULTY, is_active=True)
+    if unit_filter:
+        queryset = queryset.filter(department__iexact=unit_filter)
+    return queryset
+
+
+def training_filter():
+    """Q matching events counted as trainings attended"""
+    condition = Q()
+    for keyword in TRAINING_KEYWORDS:
+        condition |= Q(title__icontains=keyword)
+    return condition
+
+
+def _whole_months(date_from, date_to):
+    """First and last day of the whole calendar months inside the range, or None"""
+    first = date_from if date_from.day == 1 else month_bounds(date_from)[1] + timedelta(days=1)
+    last = date_to if date_to == month_bounds(date_to)[1] else date_to.replace(day=1) - timedelta(days=1)
+    if first > last:
+        return None
+    return first, last
+
+
+def _raw_totals(totals, faculty, ranges):
+    """Add publications, service hours and trainings scanned from the raw tables"""
+    document_range = Q()
+    event_range = Q()
+    for range_from, range_to in ranges:
+        start, end = _period_bounds(range_from, range_to)
+        document_range |= Q(created_at__gte=start, created_at__lt=end)
+        event_range |= Q(date__gte=range_from, date__lte=range_to)
+
+    publications = (
+        Document.objects.filter(document_range, uploaded_by__in=faculty)
+        .order_by()
+        .values('uploaded_by')
+        .annotate(total=Count('id'))
+    )
+    for row in publications:
+        totals[row['uploaded_by']][0] += row['total']
+
+    events = (
+        Event.objects.filter(event_range, created_by__in=faculty)
+        .order_by()
+        .values('created_by')
+        .annotate(
+            events=Count('id'),
+            trainings=Count('id', filter=training_filter()),
+        )
+    )
+    for row in events:
+        totals[row['created_by']][1] += row['events'] * HOURS_PER_EVENT
+        totals[row['created_by']][2] += row['trainings']
+
+
+def _rollup_totals(totals, faculty, first, last):
+    """Add totals summed from the monthly FacultyActivity buckets"""
+    buckets = (
+        FacultyActivity.objects.filter(
+            faculty__in=faculty,
+            period_start__gte=first,
+            period_end__lte=last,
+        )
+        .order_by()
+        .values('faculty')
+        .annotate(
+            publications=Sum('publications_count'),
+            hours=Sum('service_hours'),
+            trainings=Sum('trainings_attended'),
+        )
+    )
+    for row in buckets:
+        totals[row['faculty']][0] += row['publications'] or 0
+        totals[row['faculty']][1] += float(row['hours'] or 0)
+        totals[row['faculty']][2] += row['trainings'] or 0
+
+
+def generate_faculty_activity_report(date_from, date_to, unit_filter=None, progress=None):
+    """
+    Build faculty activity report rows for every active faculty user.
+
+    Runs a fixed number of queries regardless of faculty count. Whole
+    calendar months are summed from the pre-aggregated FacultyActivity
+    rollups; only the partial months at either end of the range are
+    scanned from documents and events. ``progress`` is called with a
+    percentage after each stage when given.
+    """
+    faculty = faculty_queryset(unit_filter)
+    totals = defaultdict(lambda: [0, 0, 0])
+
+    ranges = [(date_from, date_to)]
+    months = _whole_months(date_from, date_to) if getattr(settings, 'REPORT_USE_ROLLUPS', True) else None
+    if months:
+        first, last = months
+        _rollup_totals(totals, faculty, first, last)
+        ranges = []
+        if date_from < first:
+            ranges.append((date_from, first - timedelta(days=1)))
+        if last < date_to:
+            ranges.append((last + timedelta(days=1), date_to))
+    if progress:
+        progress(30)
+
+    if ranges:
+        _raw_totals(totals, faculty, ranges)
+    if progress:
+        progress(60)
+
+    report_rows = []
+    for member in faculty.only('id', 'email', 'first_name', 'last_name', 'department').order_by('id'):
+        publications, hours, trainings = totals.get(member.id, (0, 0, 0))
+        report_rows.append({
+            'facultyName': member.get_full_name(),
+            'unit': member.department or "N/A",
+            'publications': publications,
+            'serviceHours': float(hours),
+            'trainingsAttended': trainings,
+            'faculty_id': member.id
+        })
+
+    return report_rows
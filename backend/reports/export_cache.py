@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .exporters import EXPORT_FORMATS
+
+
+def cache_dir():
+    path = Path(getattr(settings, 'REPORT_EXPORT_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'report_exports'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def content_hash(report):
+    """
+    Hash everything a rendered export depends on: the report data plus the
+    header fields printed above the table.
+    """
+    payload = json.dumps(
+        [
+            report.report_data,
+            report.title,
+            report.date_from,
+            report.date_to,
+            report.unit_filter,
+            report.generated_at,
+        ],
+        sort_keys=True,
+        separators=(',', ':'),
+        cls=DjangoJSONEncoder,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def etag(digest, export_format):
+    return f'"{digest}-{export_format}"'
+
+
+def open_export(report, export_format, digest=None):
+    """
+    Open the rendered export for reading, rendering it only on a miss.
+    Hits bump the file's mtime, which is what LRU eviction orders on.
+    """
+    digest = digest or content_hash(report)
+    writer, extension, _, _ = EXPORT_FORMATS[export_format]
+    path = cache_dir() / f"{report.pk}-{export_format}-{digest}.{extension}"
+    try:
+        fileobj = open(path, 'rb')
+    except FileNotFoundError:
+        fileobj = None
+    if fileobj is not None:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return fileobj
+
+    # Render to a private temp file and rename so readers never see a partial file
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.render-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            writer(report, tmp)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+    # Open before evicting so the new file stays readable even if it is evicted
+    fileobj = open(path, 'rb')
+    evict(keep=path)
+    return fileobj
+
+
+def evict(keep=None):
+    """Delete least recently used exports until the cache fits its size limit"""
+    max_bytes = getattr(settings, 'REPORT_EXPORT_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir()):
+        if not entry.is_file() or entry.name.startswith('.'):
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if keep is not None and path == str(keep):
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def purge(report_id):
+    """Drop every cached export of a report"""
+    for path in cache_dir().glob(f"{report_id}-*"):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,132 @@
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF_CONTENT_TYPE = 'application/pdf'
+
+EXCEL_HEADERS = ['Faculty Name', 'Unit', 'Publications', 'Service Hours', 'Trainings Attended']
+EXCEL_COLUMN_WIDTHS = {'A': 25, 'B': 20, 'C': 15, 'D': 15, 'E': 20}
+PDF_HEADERS = ['Faculty Name', 'Unit', 'Publications', 'Service Hours', 'Trainings']
+
+
+def write_excel(report, fileobj):
+    """
+    Write a report to ``fileobj`` as an .xlsx workbook.
+
+    Uses openpyxl's write-only mode, which streams rows to disk as they are
+    appended instead of holding a cell object for every value, so memory
+    stays flat as the row count grows.
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Report")
+
+    # Column widths must be set before any rows are written
+    for column, width in EXCEL_COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+
+    # Title (write-only sheets cannot merge cells, the title simply overflows)
+    title = WriteOnlyCell(ws, value=report.title)
+    title.font = Font(size=16, bold=True)
+    ws.append([title])
+    ws.append([])
+
+    # Report info
+    ws.append([f"Period: {report.date_from} to {report.date_to}"])
+    ws.append([f"Unit: {report.unit_filter}"] if report.unit_filter else [])
+    ws.append([f"Generated: {report.generated_at.strftime('%Y-%m-%d %H:%M')}"])
+    ws.append([])
+
+    # Headers
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_cells = []
+    for header in EXCEL_HEADERS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    # Data rows
+    for row_data in report.report_data or []:
+        ws.append([
+            row_data.get('facultyName', ''),
+            row_data.get('unit', ''),
+            row_data.get('publications', 0),
+            row_data.get('serviceHours', 0),
+            row_data.get('trainingsAttended', 0),
+        ])
+
+    wb.save(fileobj)
+
+
+def write_pdf(report, fileobj):
+    """Write a report to ``fileobj`` as a PDF table"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+
+    doc = SimpleDocTemplate(fileobj, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Title
+    title = Paragraph(f"<b>{report.title}</b>", styles['Heading1'])
+    elements.append(title)
+    elements.append(Spacer(1, 12))
+
+    # Report info
+    info_text = f"Period: {report.date_from} to {report.date_to}<br/>"
+    if report.unit_filter:
+        info_text += f"Unit: {report.unit_filter}<br/>"
+    info_text += f"Generated: {report.generated_at.strftime('%Y-%m-%d %H:%M')}"
+    info = Paragraph(info_text, styles['Normal'])
+    elements.append(info)
+    elements.append(Spacer(1, 12))
+
+    # Data table
+    data = report.report_data or []
+    if data:
+        table_data = [PDF_HEADERS]
+        for row in data:
+            table_data.append([
+                row.get('facultyName', ''),
+                row.get('unit', ''),
+                str(row.get('publications', 0)),
+                str(row.get('serviceHours', 0)),
+                str(row.get('trainingsAttended', 0))
+            ])
+
+        table = Table(table_data)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        elements.append(table)
+
+    doc.build(elements)
+
+
+# ?format= value -> (writer, file extension, content type, missing-library message)
+EXPORT_FORMATS = {
+    'pdf': (
+        write_pdf,
+        'pdf',
+        PDF_CONTENT_TYPE,
+        'PDF generation requires reportlab. Install with: pip install reportlab',
+    ),
+    'excel': (
+        write_excel,
+        'xlsx',
+        EXCEL_CONTENT_TYPE,
+        'Excel generation requires openpyxl. Install with: pip install openpyxl',
+    ),
+}
@@ -0,0 +1,151 @@
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .engine import generate_faculty_activity_report
+from .models import Report
+
+
+logger = logging.getLogger(__name__)
+
+INTERRUPTED_ERROR = 'Report generation was interrupted (server restart or crash). Please generate it again.'
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'REPORT_WORKER_THREADS', 2),
+            thread_name_prefix='report-worker',
+        )
+    return _executor
+
+
+def enqueue_report(report):
+    """
+    Schedule background generation for a PENDING report.
+    The job is submitted once the surrounding transaction commits so the
+    worker always sees the row.
+    """
+    transaction.on_commit(lambda: _get_executor().submit(run_report, report.pk))
+
+
+def _notify(report):
+    """Push the report's job status to the requesting user's channel group"""
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+    payload = {
+        "event": "report_status",
+        "report_id": report.pk,
+        "status": report.status,
+        "progress": report.progress,
+    }
+    try:
+        async_to_sync(channel_layer.group_send)(
+            f"user_{report.generated_by_id}",
+            {"type": "report.status", "payload": payload},
+        )
+    except Exception:
+        logger.exception("Could not push status for report %s", report.pk)
+
+
+def heartbeat_interval():
+    return getattr(settings, 'REPORT_JOB_HEARTBEAT', 30)
+
+
+def stale_after():
+    """Seconds without a heartbeat before a job counts as lost; always several heartbeats"""
+    return max(getattr(settings, 'REPORT_JOB_TIMEOUT', 15 * 60), 3 * heartbeat_interval())
+
+
+def _beat(report_id, stop):
+    """Stamp the job's heartbeat every REPORT_JOB_HEARTBEAT seconds until ``stop`` is set"""
+    try:
+        while not stop.wait(heartbeat_interval()):
+            Report.objects.filter(pk=report_id).update(heartbeat_at=timezone.now())
+    except Exception:
+        logger.exception("Heartbeat of report %s stopped", report_id)
+    finally:
+        connection.close()
+
+
+def run_report(report_id):
+    """Generate report data for a queued report (runs on a worker thread)"""
+    close_old_connections()
+    try:
+        report = Report.objects.get(pk=report_id)
+
+        def set_progress(value):
+            Report.objects.filter(pk=report_id).update(progress=value, heartbeat_at=timezone.now())
+
+        Report.objects.filter(pk=report_id).update(
+            status=Report.Status.RUNNING, progress=0, heartbeat_at=timezone.now()
+        )
+        # Progress only moves between stages; the heartbeat shows the render is alive
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_beat, args=(report_id, stop), name=f'report-heartbeat-{report_id}')
+        heartbeat.start()
+        try:
+            report.report_data = generate_faculty_activity_report(
+                report.date_from,
+                report.date_to,
+                report.unit_filter or None,
+                progress=set_progress,
+            )
+            report.status = Report.Status.COMPLETED
+            report.error = ''
+        except Exception as exc:
+            logger.exception("Report %s failed", report_id)
+            report.status = Report.Status.FAILED
+            report.error = str(exc)
+        finally:
+            stop.set()
+            heartbeat.join()
+        report.progress = 100
+        report.completed_at = timezone.now()
+        report.save(update_fields=['report_data', 'status', 'error', 'progress', 'completed_at'])
+        _notify(report)
+    except Report.DoesNotExist:
+        pass
+    except Exception:
+        # The executor would keep this to itself; fail_stale_jobs() marks the report later
+        logger.exception("Report job %s crashed", report_id)
+    finally:
+        connection.close()
+
+
+def fail_stale_jobs():
+    """
+    Mark FAILED the PENDING/RUNNING reports without a heartbeat for
+    ``stale_after()`` seconds. Jobs live in a worker process's memory, so
+    a crash or restart loses them; without this their status never changes.
+    Returns the number of reports marked.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after())
+    stale = Report.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, generated_at__lt=cutoff),
+        status__in=[Report.Status.PENDING, Report.Status.RUNNING],
+    )
+    reports = list(stale)
+    if not reports:
+        return 0
+    now = timezone.now()
+    # Re-check the status so a job that just finished is not overwritten
+    stale.filter(pk__in=[report.pk for report in reports]).update(
+        status=Report.Status.FAILED, error=INTERRUPTED_ERROR, progress=100, completed_at=now
+    )
+    for report in Report.objects.filter(pk__in=[report.pk for report in reports], error=INTERRUPTED_ERROR):
+        logger.warning("Report %s was interrupted; marked failed", report.pk)
+        _notify(report)
+    return len(reports)
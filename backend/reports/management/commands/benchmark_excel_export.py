@@ -0,0 +1,92 @@
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reports.exporters import EXCEL_HEADERS, write_excel
+from reports.models import Report
+
+
+def _in_memory_export(report):
+    """The previous full-workbook export, kept here as the baseline."""
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Report"
+    ws['A1'] = report.title
+    ws['A1'].font = Font(size=16, bold=True)
+    ws.merge_cells('A1:E1')
+    ws['A3'] = f"Period: {report.date_from} to {report.date_to}"
+    ws['A5'] = f"Generated: {report.generated_at.strftime('%Y-%m-%d %H:%M')}"
+    for col, header in enumerate(EXCEL_HEADERS, start=1):
+        cell = ws.cell(row=7, column=col, value=header)
+        cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        cell.font = Font(bold=True, color="FFFFFF")
+    for row_idx, row_data in enumerate(report.report_data, start=8):
+        ws.cell(row=row_idx, column=1, value=row_data.get('facultyName', ''))
+        ws.cell(row=row_idx, column=2, value=row_data.get('unit', ''))
+        ws.cell(row=row_idx, column=3, value=row_data.get('publications', 0))
+        ws.cell(row=row_idx, column=4, value=row_data.get('serviceHours', 0))
+        ws.cell(row=row_idx, column=5, value=row_data.get('trainingsAttended', 0))
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    # HttpResponse copies the buffer into its own content
+    return b''.join([buffer.getvalue()])
+
+
+def _streaming_export(report):
+    with tempfile.TemporaryFile() as buffer:
+        write_excel(report, buffer)
+        buffer.seek(0)
+        # Drain in FileResponse-sized blocks as the response would
+        while buffer.read(8192):
+            pass
+
+
+class Command(BaseCommand):
+    help = "Compare peak Python memory of the in-memory and streaming Excel exports."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', nargs='+', type=int, default=[1000, 10000, 50000],
+            help='Report row counts to benchmark (default: 1000 10000 50000)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>8} {'mode':>10} {'peak MiB':>9} {'seconds':>9}")
+        for rows in options['rows']:
+            report = Report(
+                id=0,
+                title="Benchmark Report",
+                date_from=timezone.now().date(),
+                date_to=timezone.now().date(),
+                generated_at=timezone.now(),
+                report_data=[
+                    {
+                        'facultyName': f"Faculty Member {i}",
+                        'unit': f"Unit {i % 10}",
+                        'publications': i % 7,
+                        'serviceHours': float(i % 40),
+                        'trainingsAttended': i % 5,
+                        'faculty_id': i,
+                    }
+                    for i in range(rows)
+                ],
+            )
+            self._measure(rows, 'in-memory', _in_memory_export, report)
+            self._measure(rows, 'streaming', _streaming_export, report)
+
+    def _measure(self, rows, label, func, report):
+        tracemalloc.start()
+        started = time.perf_counter()
+        func(report)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"{rows:>8} {label:>10} {peak / (1024 * 1024):>9.1f} {elapsed:>9.2f}")
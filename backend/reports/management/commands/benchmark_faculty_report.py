@@ -0,0 +1,127 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+from documents.models import Document
+from events.models import Event
+from reports.engine import (
+    HOURS_PER_EVENT,
+    faculty_queryset,
+    generate_faculty_activity_report,
+    training_filter,
+)
+from reports.rollups import rebuild_rollups
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _per_faculty_report(date_from, date_to, unit_filter=None):
+    """The previous per-faculty query loop, kept here as the baseline."""
+    rows = []
+    for faculty in faculty_queryset(unit_filter):
+        publications = Document.objects.filter(
+            uploaded_by=faculty,
+            created_at__date__gte=date_from,
+            created_at__date__lte=date_to
+        ).count()
+        events = Event.objects.filter(
+            created_by=faculty,
+            date__gte=date_from,
+            date__lte=date_to
+        )
+        service_hours = len(events) * HOURS_PER_EVENT
+        trainings = events.filter(training_filter()).count()
+        rows.append({
+            'facultyName': faculty.get_full_name(),
+            'unit': faculty.department or "N/A",
+            'publications': publications,
+            'serviceHours': float(service_hours),
+            'trainingsAttended': trainings,
+            'faculty_id': faculty.id
+        })
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark faculty activity report generation (query count and wall time) "
+        "against synthetic faculty. All generated rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[100, 1000, 10000],
+            help='Faculty counts to benchmark (default: 100 1000 10000)'
+        )
+        parser.add_argument(
+            '--per-faculty', type=int, default=3,
+            help='Documents and events generated per faculty member (default: 3)'
+        )
+        parser.add_argument(
+            '--skip-legacy', action='store_true',
+            help='Only time the set-based engine'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'faculty':>8} {'mode':>10} {'queries':>8} {'seconds':>9}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    self._seed(size, options['per_faculty'])
+                    self._run(size, 'engine', generate_faculty_activity_report)
+                    if not options['skip_legacy']:
+                        self._run(size, 'per-row', _per_faculty_report)
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+    def _run(self, size, label, func):
+        date_to = date.today()
+        date_from = date_to - timedelta(days=365)
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            rows = func(date_from, date_to)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"{size:>8} {label:>10} {len(ctx.captured_queries):>8} {elapsed:>9.3f}  ({len(rows)} rows)")
+
+    def _seed(self, size, per_faculty):
+        now = timezone.now()
+        # Clear any real faculty from the measurement; restored on rollback
+        User.objects.filter(role=User.Role.FACULTY).update(is_active=False)
+        User.objects.bulk_create([
+            User(
+                email=f"bench-faculty-{i}@bench.invalid",
+                role=User.Role.FACULTY,
+                first_name="Bench",
+                last_name=str(i),
+                department=f"Unit {i % 10}",
+                password='!',
+            )
+            for i in range(size)
+        ], batch_size=1000)
+        users = list(User.objects.filter(email__endswith='@bench.invalid'))
+        Document.objects.bulk_create([
+            Document(
+                name=f"Document {n}",
+                file=f"documents/bench/{user.id}-{n}.pdf",
+                uploaded_by=user,
+            )
+            for user in users for n in range(per_faculty)
+        ], batch_size=1000)
+        Event.objects.bulk_create([
+            Event(
+                title="Workshop" if n % 2 else "Meeting",
+                date=(now - timedelta(days=n * 30)).date(),
+                created_by=user,
+            )
+            for user in users for n in range(per_faculty)
+        ], batch_size=1000)
+        # bulk_create skips the rollup signals
+        rebuild_rollups()
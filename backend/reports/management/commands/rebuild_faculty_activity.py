@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.rollups import compute_rollups, rebuild_rollups, stored_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the monthly FacultyActivity rollups from documents and events, "
+        "or with --check compare them against the raw data without writing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only verify the stored rollups; exit non-zero on any mismatch'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            count = rebuild_rollups()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} faculty activity buckets."))
+            return
+
+        expected = {key: value for key, value in compute_rollups().items() if any(value)}
+        stored = stored_rollups()
+        mismatches = 0
+        for key in sorted(set(expected) | set(stored), key=lambda k: (k[0], k[1])):
+            want = expected.get(key, [0, 0, 0])
+            have = stored.get(key, [0, 0, 0])
+            if want != have:
+                mismatches += 1
+                user_id, period_start = key
+                self.stdout.write(
+                    f"user {user_id} {period_start:%Y-%m}: stored "
+                    f"(publications, events, trainings)={tuple(have)}, expected {tuple(want)}"
+                )
+
+        if mismatches:
+            raise CommandError(f"{mismatches} of {len(expected)} buckets differ from the raw data.")
+        self.stdout.write(self.style.SUCCESS(f"All {len(expected)} buckets match the raw data."))
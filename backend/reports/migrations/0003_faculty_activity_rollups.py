@@ -0,0 +1,72 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:56
+
+import calendar
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build monthly FacultyActivity buckets from existing documents and events"""
+    Document = apps.get_model('documents', 'Document')
+    Event = apps.get_model('events', 'Event')
+    FacultyActivity = apps.get_model('reports', 'FacultyActivity')
+    User = apps.get_model('accounts', 'User')
+
+    totals = defaultdict(lambda: [0, 0, 0])
+    documents = (
+        Document.objects.order_by()
+        .annotate(month=TruncMonth('created_at'))
+        .values('uploaded_by', 'month')
+        .annotate(total=Count('id'))
+    )
+    for row in documents:
+        totals[(row['uploaded_by'], row['month'].date())][0] += row['total']
+
+    trainings = Q(title__icontains='workshop') | Q(title__icontains='seminar')
+    events = (
+        Event.objects.order_by()
+        .annotate(month=TruncMonth('date'))
+        .values('created_by', 'month')
+        .annotate(total=Count('id'), trainings=Count('id', filter=trainings))
+    )
+    for row in events:
+        bucket = totals[(row['created_by'], row['month'])]
+        bucket[1] += row['total']
+        bucket[2] += row['trainings']
+
+    units = dict(User.objects.values_list('id', 'department'))
+    FacultyActivity.objects.all().delete()
+    FacultyActivity.objects.bulk_create([
+        FacultyActivity(
+            faculty_id=user_id,
+            unit=units.get(user_id) or "N/A",
+            publications_count=publications,
+            service_hours=events_count * 2,
+            trainings_attended=training_count,
+            period_start=month,
+            period_end=month.replace(day=calendar.monthrange(month.year, month.month)[1]),
+        )
+        for (user_id, month), (publications, events_count, training_count) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_report_status'),
+        ('documents', '0002_remove_document_documents_d_documen_40c475_idx_and_more'),
+        ('events', '0002_remove_event_events_even_event_t_a87b5c_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='facultyactivity',
+            constraint=models.UniqueConstraint(fields=('faculty', 'period_start'), name='unique_faculty_activity_period'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_faculty_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -6,7 +6,8 @@ from django.utils import timezone
 class FacultyActivity(models.Model):
     """
     Tracks faculty activity metrics for reporting.
-    This can be populated from various sources (documents, events, etc.)
+    One row per user per calendar month, kept up to date from document and
+    event writes (see reports.rollups).
     """
     faculty = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -40,6 +41,9 @@ class FacultyActivity(models.Model):
             models.Index(fields=['faculty', 'period_start', 'period_end']),
             models.Index(fields=['unit']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['faculty', 'period_start'], name='unique_faculty_activity_period'),
+        ]
     
     def __str__(self):
         return f"{self.faculty.get_full_name()} - {self.unit} ({self.period_start} to {self.period_end})"
@@ -49,6 +53,13 @@ class Report(models.Model):
     """
     Stores generated reports metadata
     """
+    
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        RUNNING = "RUNNING", "Running"
+        COMPLETED = "COMPLETED", "Completed"
+        FAILED = "FAILED", "Failed"
+    
     report_type = models.CharField(max_length=100, default='FACULTY_ACTIVITY')
     title = models.CharField(max_length=255)
     date_from = models.DateField()
@@ -64,11 +75,24 @@ class Report(models.Model):
     # Store report data as JSON (optional, for caching)
     report_data = models.JSONField(blank=True, null=True, help_text="Cached report data")
     
+    # Background generation state (reports generated inline are COMPLETED on creation)
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.COMPLETED
+    )
+    progress = models.PositiveSmallIntegerField(default=100, help_text="Generation progress (0-100)")
+    error = models.TextField(blank=True, default='')
+    completed_at = models.DateTimeField(blank=True, null=True)
+    # Last sign of life from the worker running the job; see reports.jobs.fail_stale_jobs
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    
     class Meta:
         ordering = ['-generated_at']
         indexes = [
             models.Index(fields=['-generated_at']),
             models.Index(fields=['report_type']),
+            models.Index(fields=['status']),
         ]
     
     def __str__(self):
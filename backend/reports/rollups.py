@@ -0,0 +1,151 @@
+"""
+Monthly FacultyActivity rollups.
+
+Each (user, calendar month) has at most one FacultyActivity row holding the
+publications, service hours and trainings credited to that user in that
+month. Signal handlers in reports.signals keep the rows current as documents
+and events are written; ``rebuild_faculty_activity`` recomputes them in bulk.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from accounts.models import User
+from documents.models import Document
+from events.models import Event
+from .engine import HOURS_PER_EVENT, TRAINING_KEYWORDS, month_bounds, training_filter
+from .models import FacultyActivity
+
+
+def is_training(title):
+    title = (title or '').lower()
+    return any(keyword in title for keyword in TRAINING_KEYWORDS)
+
+
+def document_contribution(user_id, created_at):
+    """Rollup key and (publications, events, trainings) counted for one document"""
+    if not user_id or not created_at:
+        return None
+    return (user_id, month_bounds(timezone.localdate(created_at))[0]), (1, 0, 0)
+
+
+def event_contribution(user_id, event_date, title):
+    """Rollup key and (publications, events, trainings) counted for one event"""
+    if not user_id or not event_date:
+        return None
+    if isinstance(event_date, str):
+        event_date = date.fromisoformat(event_date)
+    return (user_id, month_bounds(event_date)[0]), (0, 1, 1 if is_training(title) else 0)
+
+
+def apply_delta(key, publications=0, events=0, trainings=0):
+    """Atomically add to a user's monthly bucket, creating it if needed"""
+    if not (publications or events or trainings):
+        return
+    user_id, period_start = key
+    bucket = FacultyActivity.objects.filter(faculty_id=user_id, period_start=period_start)
+    changes = {
+        'publications_count': F('publications_count') + publications,
+        'service_hours': F('service_hours') + Decimal(events * HOURS_PER_EVENT),
+        'trainings_attended': F('trainings_attended') + trainings,
+        'updated_at': timezone.now(),
+    }
+    if bucket.update(**changes):
+        return
+
+    unit = User.objects.filter(pk=user_id).values_list('department', flat=True).first()
+    try:
+        with transaction.atomic():
+            FacultyActivity.objects.create(
+                faculty_id=user_id,
+                unit=unit or "N/A",
+                publications_count=publications,
+                service_hours=Decimal(events * HOURS_PER_EVENT),
+                trainings_attended=trainings,
+                period_start=period_start,
+                period_end=month_bounds(period_start)[1],
+            )
+    except IntegrityError:
+        # Another writer created the bucket first
+        bucket.update(**changes)
+
+
+def apply_contribution(contribution, sign=1):
+    if contribution is None:
+        return
+    key, (publications, events, trainings) = contribution
+    apply_delta(key, sign * publications, sign * events, sign * trainings)
+
+
+def compute_rollups():
+    """
+    Recompute every monthly bucket from the raw tables.
+    Returns {(user_id, period_start): [publications, events, trainings]}.
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+
+    documents = (
+        Document.objects.order_by()
+        .annotate(month=TruncMonth('created_at'))
+        .values('uploaded_by', 'month')
+        .annotate(total=Count('id'))
+    )
+    for row in documents:
+        month = row['month']
+        if hasattr(month, 'date'):
+            month = month.date()
+        totals[(row['uploaded_by'], month)][0] += row['total']
+
+    events = (
+        Event.objects.order_by()
+        .annotate(month=TruncMonth('date'))
+        .values('created_by', 'month')
+        .annotate(total=Count('id'), trainings=Count('id', filter=training_filter()))
+    )
+    for row in events:
+        bucket = totals[(row['created_by'], row['month'])]
+        bucket[1] += row['total']
+        bucket[2] += row['trainings']
+
+    return totals
+
+
+def stored_rollups():
+    """Current FacultyActivity buckets in the same shape as compute_rollups()"""
+    return {
+        (row['faculty_id'], row['period_start']): [
+            row['publications_count'],
+            int(row['service_hours'] / HOURS_PER_EVENT),
+            row['trainings_attended'],
+        ]
+        for row in FacultyActivity.objects.values(
+            'faculty_id', 'period_start', 'publications_count', 'service_hours', 'trainings_attended'
+        )
+        if row['publications_count'] or row['service_hours'] or row['trainings_attended']
+    }
+
+
+@transaction.atomic
+def rebuild_rollups(batch_size=1000):
+    """Replace all FacultyActivity buckets with freshly computed ones"""
+    totals = compute_rollups()
+    units = dict(User.objects.values_list('id', 'department'))
+    FacultyActivity.objects.all().delete()
+    FacultyActivity.objects.bulk_create([
+        FacultyActivity(
+            faculty_id=user_id,
+            unit=units.get(user_id) or "N/A",
+            publications_count=publications,
+            service_hours=Decimal(events * HOURS_PER_EVENT),
+            trainings_attended=trainings,
+            period_start=period_start,
+            period_end=month_bounds(period_start)[1],
+        )
+        for (user_id, period_start), (publications, events, trainings) in totals.items()
+    ], batch_size=batch_size)
+    return len(totals)
@@ -41,8 +41,12 @@ class ReportSerializer(serializers.ModelSerializer):
             'generated_by_email',
             'generated_at',
             'report_data',
+            'status',
+            'progress',
+            'error',
+            'completed_at',
         ]
-        read_only_fields = ['generated_by', 'generated_at']
+        read_only_fields = ['generated_by', 'generated_at', 'status', 'progress', 'error', 'completed_at']
 
 
 class ReportGenerateSerializer(serializers.Serializer):
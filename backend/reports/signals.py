@@ -0,0 +1,70 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from documents.models import Document
+from events.models import Event
+from .rollups import apply_contribution, document_contribution, event_contribution
+
+
+# Keep monthly FacultyActivity rollups in step with document and event writes.
+# Queryset.update() and bulk_create() bypass these; run rebuild_faculty_activity after bulk loads.
+
+
+def _document_contribution(values):
+    return document_contribution(values['uploaded_by_id'], values['created_at'])
+
+
+def _event_contribution(values):
+    return event_contribution(values['created_by_id'], values['date'], values['title'])
+
+
+@receiver(pre_save, sender=Document)
+def remember_document(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if raw or instance._state.adding or not instance.pk:
+        return
+    previous = Document.objects.filter(pk=instance.pk).values('uploaded_by_id', 'created_at').first()
+    if previous:
+        instance._rollup_previous = _document_contribution(previous)
+
+
+@receiver(post_save, sender=Document)
+def rollup_document(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = document_contribution(instance.uploaded_by_id, instance.created_at)
+    previous = getattr(instance, '_rollup_previous', None)
+    if current != previous:
+        apply_contribution(previous, sign=-1)
+        apply_contribution(current)
+
+
+@receiver(post_delete, sender=Document)
+def unroll_document(sender, instance, **kwargs):
+    apply_contribution(document_contribution(instance.uploaded_by_id, instance.created_at), sign=-1)
+
+
+@receiver(pre_save, sender=Event)
+def remember_event(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if raw or instance._state.adding or not instance.pk:
+        return
+    previous = Event.objects.filter(pk=instance.pk).values('created_by_id', 'date', 'title').first()
+    if previous:
+        instance._rollup_previous = _event_contribution(previous)
+
+
+@receiver(post_save, sender=Event)
+def rollup_event(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = event_contribution(instance.created_by_id, instance.date, instance.title)
+    previous = getattr(instance, '_rollup_previous', None)
+    if current != previous:
+        apply_contribution(previous, sign=-1)
+        apply_contribution(current)
+
+
+@receiver(post_delete, sender=Event)
+def unroll_event(sender, instance, **kwargs):
+    apply_contribution(event_contribution(instance.created_by_id, instance.date, instance.title), sign=-1)
@@ -1,4 +1,331 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
 
+from accounts.models import User
+from documents.models import Document
+from events.models import Event
+
+from . import export_cache, jobs
+from .engine import generate_faculty_activity_report
+from .exporters import EXPORT_FORMATS
+from .models import Report
+from .rollups import compute_rollups, stored_rollups
+
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ReportJobTests(TransactionTestCase):
+    """
+    Background report jobs: run_report closes its own connection, so these
+    run outside a test transaction.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('faculty@example.com', 'password', role=User.Role.FACULTY)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(f"user_{self.user.id}", self.channel)
+
+    def _pending_report(self, **fields):
+        fields = {'status': Report.Status.PENDING, 'progress': 0, **fields}
+        return Report.objects.create(
+            title='Report', date_from=date(2025, 1, 1), date_to=date(2025, 12, 31), generated_by=self.user, **fields
+        )
+
+    def _pushed(self):
+        return async_to_sync(self.layer.receive)(self.channel)
+
+    def test_run_report_completes_and_pushes_status(self):
+        report = self._pending_report()
+
+        jobs.run_report(report.pk)
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, Report.Status.COMPLETED)
+        self.assertEqual(report.progress, 100)
+        self.assertIsNotNone(report.report_data)
+        self.assertIsNotNone(report.completed_at)
+        self.assertEqual(self._pushed(), {
+            'type': 'report.status',
+            'payload': {'event': 'report_status', 'report_id': report.pk, 'status': 'COMPLETED', 'progress': 100},
+        })
+
+    def test_run_report_records_failure(self):
+        report = self._pending_report()
+
+        with mock.patch('reports.jobs.generate_faculty_activity_report', side_effect=ValueError('boom')):
+            with self.assertLogs('reports.jobs', 'ERROR'):
+                jobs.run_report(report.pk)
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, Report.Status.FAILED)
+        self.assertEqual(report.error, 'boom')
+        self.assertEqual(self._pushed()['payload']['status'], 'FAILED')
+
+    def test_async_generate_runs_on_worker(self):
+        # A worker of our own, so the test can wait for it instead of polling: on the
+        # shared-cache test database a poll can lock the worker's update out
+        executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch('reports.jobs._get_executor', return_value=executor):
+            response = self.client.post(
+                '/api/reports/generate/?async=1', {'date_from': '2025-01-01', 'date_to': '2025-12-31'}, format='json'
+            )
+        self.assertEqual(response.status_code, 202)
+        executor.shutdown(wait=True)
+
+        job = self.client.get(f'/api/reports/{response.data["job_id"]}/status/').data
+        self.assertEqual(job['status'], Report.Status.COMPLETED)
+        self.assertEqual(job['progress'], 100)
+
+    @override_settings(REPORT_JOB_TIMEOUT=60)
+    def test_polling_fails_jobs_lost_by_a_restart(self):
+        long_ago = timezone.now() - timedelta(minutes=5)
+        lost = self._pending_report(status=Report.Status.RUNNING, heartbeat_at=long_ago)
+        running = self._pending_report(status=Report.Status.RUNNING, heartbeat_at=timezone.now())
+
+        with self.assertLogs('reports.jobs', 'WARNING'):
+            job = self.client.get(f'/api/reports/{lost.pk}/status/').data
+
+        self.assertEqual(job['status'], Report.Status.FAILED)
+        self.assertEqual(job['error'], jobs.INTERRUPTED_ERROR)
+        self.assertEqual(self._pushed()['payload'], {
+            'event': 'report_status', 'report_id': lost.pk, 'status': 'FAILED', 'progress': 100,
+        })
+        running.refresh_from_db()
+        self.assertEqual(running.status, Report.Status.RUNNING)
+
+    @override_settings(REPORT_JOB_TIMEOUT=60)
+    def test_queued_job_without_heartbeat_goes_stale_by_age(self):
+        report = self._pending_report()
+        Report.objects.filter(pk=report.pk).update(generated_at=timezone.now() - timedelta(minutes=5))
+
+        with self.assertLogs('reports.jobs', 'WARNING'):
+            self.assertEqual(jobs.fail_stale_jobs(), 1)
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, Report.Status.FAILED)
+
+
+    @override_settings(REPORT_JOB_HEARTBEAT=0.05, REPORT_JOB_TIMEOUT=0)
+    def test_long_render_between_progress_updates_is_not_stale(self):
+        report = self._pending_report()
+        rendering, release = threading.Event(), threading.Event()
+
+        def slow_render(*args, progress=None, **kwargs):
+            progress(30)
+            rendering.set()
+            release.wait(5)
+            return {}
+
+        with mock.patch('reports.jobs.generate_faculty_activity_report', side_effect=slow_render):
+            worker = threading.Thread(target=jobs.run_report, args=(report.pk,))
+            worker.start()
+            self.assertTrue(rendering.wait(5))
+            stamped = Report.objects.get(pk=report.pk).heartbeat_at
+            # Well past jobs.stale_after() with no progress update
+            time.sleep(0.4)
+            self.assertGreater(Report.objects.get(pk=report.pk).heartbeat_at, stamped)
+            self.assertEqual(jobs.fail_stale_jobs(), 0)
+            release.set()
+            worker.join(5)
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, Report.Status.COMPLETED)
+
+
+class FacultyActivityRollupTests(TestCase):
+    """The signal-maintained monthly buckets must always equal a recount of the raw rows"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice@example.com', 'password', role=User.Role.FACULTY, department='CS')
+        self.bob = User.objects.create_user('bob@example.com', 'password', role=User.Role.FACULTY, department='Math')
+
+    def assertInStep(self):
+        self.assertEqual(stored_rollups(), dict(compute_rollups()))
+
+    def _document(self, user, when):
+        document = Document.objects.create(name='Paper', file='documents/paper.pdf', uploaded_by=user)
+        # created_at is auto_now_add; later saves keep an explicit value
+        document.created_at = timezone.make_aware(when)
+        document.save()
+        return document
+
+    def test_create_update_and_delete_documents(self):
+        document = self._document(self.alice, datetime(2025, 1, 15, 9))
+        self._document(self.alice, datetime(2025, 1, 20, 9))
+        self.assertInStep()
+        self.assertEqual(stored_rollups()[(self.alice.id, date(2025, 1, 1))], [2, 0, 0])
+
+        # Moved to another month, then to another user
+        document.created_at = timezone.make_aware(datetime(2025, 3, 1, 0, 30))
+        document.save()
+        self.assertInStep()
+        document.uploaded_by = self.bob
+        document.save()
+        self.assertInStep()
+        self.assertEqual(stored_rollups()[(self.bob.id, date(2025, 3, 1))], [1, 0, 0])
+        self.assertNotIn((self.alice.id, date(2025, 3, 1)), stored_rollups())
+
+        document.delete()
+        self.assertInStep()
+
+    def test_create_update_and_delete_events(self):
+        event = Event.objects.create(title='Faculty meeting', date=date(2025, 2, 10), created_by=self.alice)
+        Event.objects.create(title='Research seminar', date=date(2025, 2, 28), created_by=self.alice)
+        self.assertInStep()
+        self.assertEqual(stored_rollups()[(self.alice.id, date(2025, 2, 1))], [0, 2, 1])
+
+        # Becomes a training, moves month, then changes owner
+        event.title = 'Teaching workshop'
+        event.save()
+        self.assertInStep()
+        event.date = date(2025, 4, 1)
+        event.save()
+        self.assertInStep()
+        event.created_by = self.bob
+        event.save()
+        self.assertInStep()
+        self.assertEqual(stored_rollups()[(self.bob.id, date(2025, 4, 1))], [0, 1, 1])
+
+        event.delete()
+        self.assertInStep()
+        self.assertEqual(stored_rollups(), {(self.alice.id, date(2025, 2, 1)): [0, 1, 1]})
+
+    def test_unchanged_save_does_not_double_count(self):
+        event = Event.objects.create(title='Faculty meeting', date=date(2025, 2, 10), created_by=self.alice)
+        event.save()
+        event.save()
+        self.assertEqual(stored_rollups()[(self.alice.id, date(2025, 2, 1))], [0, 1, 0])
+
+    def test_rollup_report_matches_raw_scan_across_partial_months(self):
+        for day in (date(2025, 1, 5), date(2025, 1, 20), date(2025, 2, 14), date(2025, 3, 31), date(2025, 4, 2)):
+            self._document(self.alice, datetime.combine(day, datetime.min.time()).replace(hour=12))
+            Event.objects.create(title='Workshop', date=day, created_by=self.bob)
+            Event.objects.create(title='Meeting', date=day, created_by=self.alice)
+
+        ranges = [
+            (date(2025, 1, 10), date(2025, 4, 1)),   # partial months at both ends
+            (date(2025, 1, 1), date(2025, 3, 31)),   # whole months only
+            (date(2025, 2, 3), date(2025, 2, 20)),   # inside one month
+            (date(2024, 12, 31), date(2025, 4, 30)),
+        ]
+        for date_from, date_to in ranges:
+            with self.subTest(date_from=date_from, date_to=date_to):
+                with override_settings(REPORT_USE_ROLLUPS=True):
+                    from_rollups = generate_faculty_activity_report(date_from, date_to)
+                with override_settings(REPORT_USE_ROLLUPS=False):
+                    from_raw = generate_faculty_activity_report(date_from, date_to)
+                # Every range holds some activity, so an empty report cannot pass
+                self.assertTrue(any(row['publications'] for row in from_raw))
+                self.assertTrue(any(row['trainingsAttended'] for row in from_raw))
+                self.assertEqual(from_rollups, from_raw)
+
+
+class ExportCacheTests(TestCase):
+    """Rendered exports are served from disk by content hash and evicted least recently used first"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        cache_settings = override_settings(REPORT_EXPORT_CACHE_DIR=Path(directory))
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+        self.user = User.objects.create_user('exporter@example.com', 'password', role=User.Role.FACULTY)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.report = Report.objects.create(
+            title='Report', date_from=date(2025, 1, 1), date_to=date(2025, 12, 31), generated_by=self.user,
+            status=Report.Status.COMPLETED, report_data=[{'name': 'Faculty', 'publications': 1}],
+        )
+        self.renders = 0
+
+        def render(report, fileobj):
+            self.renders += 1
+            fileobj.write(b'rendered export')
+
+        _, extension, content_type, missing = EXPORT_FORMATS['excel']
+        formats = mock.patch.dict(EXPORT_FORMATS, {'excel': (render, extension, content_type, missing)})
+        formats.start()
+        self.addCleanup(formats.stop)
+
+    def _export(self, report=None, **headers):
+        response = self.client.get(f'/api/reports/{(report or self.report).pk}/export/', {'format': 'excel'}, **headers)
+        if response.status_code == 200:
+            response.body = b''.join(response.streaming_content)
+            response.close()
+        return response
+
+    def _cached_files(self):
+        return sorted(path.name for path in export_cache.cache_dir().iterdir() if not path.name.startswith('.'))
+
+    def test_etag_and_not_modified(self):
+        response = self._export()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, b'rendered export')
+        digest = export_cache.content_hash(self.report)
+        self.assertEqual(response['ETag'], export_cache.etag(digest, 'excel'))
+
+        response = self._export(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.renders, 1)
+
+    def test_cache_hit_does_not_render_again(self):
+        first = self._export()
+        second = self._export()
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(len(self._cached_files()), 1)
+
+    @override_settings(REPORT_EXPORT_CACHE_MAX_BYTES=250)
+    def test_evict_removes_least_recently_used_first(self):
+        directory = export_cache.cache_dir()
+        now = time.time()
+        for age, name in ((30, 'a'), (20, 'b'), (10, 'c')):
+            path = directory / f'{name}.xlsx'
+            path.write_bytes(b'x' * 100)
+            os.utime(path, (now - age, now - age))
+        # A cache hit on the oldest file makes it the most recent
+        os.utime(directory / 'a.xlsx')
+
+        export_cache.evict()
+
+        self.assertEqual(self._cached_files(), ['a.xlsx', 'c.xlsx'])
+        self.assertLessEqual(sum(path.stat().st_size for path in directory.iterdir()), 250)
+
+    def test_destroy_purges_cached_exports(self):
+        other = Report.objects.create(
+            title='Other', date_from=date(2025, 1, 1), date_to=date(2025, 12, 31), generated_by=self.user,
+            status=Report.Status.COMPLETED, report_data=[],
+        )
+        self._export()
+        self._export(other)
+        self.assertEqual(len(self._cached_files()), 2)
+
+        self.assertEqual(self.client.delete(f'/api/reports/{self.report.pk}/').status_code, 204)
+        self.assertEqual([name.split('-')[0] for name in self._cached_files()], [str(other.pk)])
+
+    def test_reports_not_completed_cannot_be_exported(self):
+        for report_status in (Report.Status.PENDING, Report.Status.RUNNING, Report.Status.FAILED):
+            Report.objects.filter(pk=self.report.pk).update(status=report_status)
+            with self.subTest(status=report_status):
+                self.assertEqual(self._export().status_code, 409)
+        self.assertEqual(self.renders, 0)
+        self.assertEqual(self._cached_files(), [])
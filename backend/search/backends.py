@@ -0,0 +1,116 @@
+"""
+Full-text queries against the search index.
+
+SQLite uses the FTS5 table ``search_fts`` (BM25 ranking); PostgreSQL uses a
+GIN-indexed tsvector expression (ts_rank). Any other database falls back to
+substring matching on the SearchEntry table, unranked.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import SearchEntry
+
+
+FTS_TABLE = 'search_fts'
+
+# Title matches count ten times as much as body matches
+TITLE_WEIGHT = 10.0
+
+# Must match the expression of the GIN index created in 0002_fulltext_index
+PG_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(body, '')), 'B')"
+)
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def terms(query):
+    """Words of a user query; punctuation and operators are dropped"""
+    return TERM_RE.findall(query or '')[:20]
+
+
+def _fts5_query(words):
+    # Every word must match, each as a prefix ("memo 00" finds "MEMO-001")
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _tsquery(words):
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def _matches_sql(words):
+    """SQL selecting (entity, object_id, rank) of the entries matching ``words``, and its params"""
+    if connection.vendor == 'sqlite':
+        sql = (
+            f"SELECT e.entity, e.object_id, bm25({FTS_TABLE}, {TITLE_WEIGHT}, 1.0) AS rank "
+            f"FROM {FTS_TABLE} JOIN search_searchentry e ON e.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s"
+        )
+        return sql, [_fts5_query(words)]
+    sql = (
+        f"SELECT e.entity, e.object_id, -ts_rank({PG_VECTOR}, to_tsquery('english', %s)) AS rank "
+        f"FROM search_searchentry e WHERE {PG_VECTOR} @@ to_tsquery('english', %s)"
+    )
+    return sql, [_tsquery(words)] * 2
+
+
+def _fulltext():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _fallback_entries(words):
+    condition = Q()
+    for word in words:
+        condition &= Q(title__icontains=word) | Q(body__icontains=word)
+    return SearchEntry.objects.filter(condition)
+
+
+def filter_queryset(queryset, entity, query):
+    """
+    Restrict ``queryset`` to rows of ``entity`` matching ``query``. Used by
+    the list endpoints' ``search`` parameter in place of icontains scans.
+    """
+    words = terms(query)
+    if not words:
+        return queryset.none()
+    if not _fulltext():
+        ids = _fallback_entries(words).filter(entity=entity).values('object_id')
+        return queryset.filter(pk__in=ids)
+
+    sql, params = _matches_sql(words)
+    sql = f"SELECT object_id FROM ({sql}) AS matches WHERE entity = %s"
+    return queryset.filter(pk__in=RawSQL(sql, params + [entity]))
+
+
+def ranked_matches(query, entities, limit, visible=None):
+    """
+    Best ``limit`` matches across ``entities`` as (entity, object_id, rank)
+    tuples, best first; lower rank is better. ``visible`` optionally maps an
+    entity to a queryset of the rows the caller may see.
+    """
+    words = terms(query)
+    if not words or not entities:
+        return []
+    visible = visible or {}
+    if not _fulltext():
+        entries = _fallback_entries(words).filter(entity__in=entities)
+        for entity, queryset in visible.items():
+            entries = entries.exclude(Q(entity=entity) & ~Q(object_id__in=queryset.values('pk')))
+        rows = entries.order_by('-created_at').values_list('entity', 'object_id')[:limit]
+        return [(entity, object_id, 0.0) for entity, object_id in rows]
+
+    sql, params = _matches_sql(words)
+    placeholders = ', '.join(['%s'] * len(entities))
+    sql = f"SELECT * FROM ({sql}) AS matches WHERE entity IN ({placeholders})"
+    params += list(entities)
+    for entity, queryset in visible.items():
+        visible_sql, visible_params = queryset.values('pk').query.sql_with_params()
+        sql += f" AND (entity <> %s OR object_id IN ({visible_sql}))"
+        params += [entity, *visible_params]
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} ORDER BY rank LIMIT %s", params + [limit])
+        return cursor.fetchall()
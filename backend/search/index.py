@@ -0,0 +1,76 @@
+"""
+What each searchable model contributes to the search index.
+
+ENTITIES maps the entity name used in the API (``?types=memo,ticket``) to
+the model and a function returning its (title, body) text.
+"""
+from communications.models import Communication
+from documents.models import Document
+from memos.models import Memo
+from tickets.models import Ticket
+from .models import SearchEntry
+
+
+def _join(*parts):
+    return ' '.join(part for part in parts if part)
+
+
+ENTITIES = {
+    'memo': (Memo, lambda memo: (
+        memo.title, _join(memo.memo_id, memo.description, memo.target_department)
+    )),
+    'document': (Document, lambda document: (
+        document.name, _join(document.description, document.route_to)
+    )),
+    'ticket': (Ticket, lambda ticket: (
+        ticket.title, _join(ticket.ticket_id, ticket.description)
+    )),
+    'communication': (Communication, lambda communication: (
+        communication.title, _join(communication.description, communication.target_department)
+    )),
+}
+
+ENTITY_FOR_MODEL = {model: entity for entity, (model, _) in ENTITIES.items()}
+
+
+def entry_for(entity, instance):
+    title, body = ENTITIES[entity][1](instance)
+    return SearchEntry(
+        entity=entity,
+        object_id=instance.pk,
+        title=title or '',
+        body=body or '',
+        created_at=instance.created_at,
+    )
+
+
+def index_instance(instance):
+    """Insert or refresh the search entry of one saved object"""
+    entity = ENTITY_FOR_MODEL[type(instance)]
+    entry = entry_for(entity, instance)
+    SearchEntry.objects.update_or_create(
+        entity=entity,
+        object_id=instance.pk,
+        defaults={'title': entry.title, 'body': entry.body, 'created_at': entry.created_at},
+    )
+
+
+def unindex_instance(instance):
+    SearchEntry.objects.filter(entity=ENTITY_FOR_MODEL[type(instance)], object_id=instance.pk).delete()
+
+
+def rebuild_index(batch_size=1000):
+    """Replace every search entry with one built from the current rows"""
+    SearchEntry.objects.all().delete()
+    total = 0
+    for entity, (model, _) in ENTITIES.items():
+        batch = []
+        for instance in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(entry_for(entity, instance))
+            if len(batch) >= batch_size:
+                SearchEntry.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        SearchEntry.objects.bulk_create(batch)
+        total += len(batch)
+    return total
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from search.index import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from memos, documents, tickets and communications."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} search entries."))
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.9 on 2026-10-18 10:40
+
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    # External-content FTS5 table over search_searchentry; triggers keep it in sync
+    "CREATE VIRTUAL TABLE search_fts USING fts5("
+    "title, body, content='search_searchentry', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER search_fts_insert AFTER INSERT ON search_searchentry BEGIN "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER search_fts_delete AFTER DELETE ON search_searchentry BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER search_fts_update AFTER UPDATE ON search_searchentry BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS search_fts_update",
+    "DROP TRIGGER IF EXISTS search_fts_delete",
+    "DROP TRIGGER IF EXISTS search_fts_insert",
+    "DROP TABLE IF EXISTS search_fts",
+]
+
+# Expression must match search.backends.PG_VECTOR
+POSTGRES_FORWARD = [
+    "CREATE INDEX search_entry_vector_gin ON search_searchentry USING GIN (("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(body, '')), 'B')))",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS search_entry_vector_gin",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+
+
+def drop_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD})
+
+
+def _join(*parts):
+    return ' '.join(part for part in parts if part)
+
+
+def backfill_entries(apps, schema_editor):
+    """Index existing memos, documents, tickets and communications"""
+    SearchEntry = apps.get_model('search', 'SearchEntry')
+    sources = [
+        ('memo', apps.get_model('memos', 'Memo'), lambda o: (
+            o.title, _join(o.memo_id, o.description, o.target_department))),
+        ('document', apps.get_model('documents', 'Document'), lambda o: (
+            o.name, _join(o.description, o.route_to))),
+        ('ticket', apps.get_model('tickets', 'Ticket'), lambda o: (
+            o.title, _join(o.ticket_id, o.description))),
+        ('communication', apps.get_model('communications', 'Communication'), lambda o: (
+            o.title, _join(o.description, o.target_department))),
+    ]
+    for entity, model, text in sources:
+        entries = []
+        for obj in model.objects.order_by('pk').iterator():
+            title, body = text(obj)
+            entries.append(SearchEntry(
+                entity=entity, object_id=obj.pk, title=title or '', body=body or '', created_at=obj.created_at
+            ))
+        SearchEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('memos', '0003_memo_file'),
+        ('documents', '0002_remove_document_documents_d_documen_40c475_idx_and_more'),
+        ('tickets', '0002_alter_ticket_status'),
+        ('communications', '0002_chatmessage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_entries, migrations.RunPython.noop),
+    ]
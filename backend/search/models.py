@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class SearchEntry(models.Model):
+    """
+    Searchable text of one memo, document, ticket or communication.
+
+    The full-text index itself lives outside the ORM: an FTS5 table kept in
+    step by triggers on SQLite, or a GIN expression index on PostgreSQL
+    (see migrations/0002_fulltext_index.py).
+    """
+
+    entity = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    title = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    created_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entity', 'object_id'], name='unique_search_entry'),
+        ]
+        verbose_name = "Search Entry"
+        verbose_name_plural = "Search Entries"
+
+    def __str__(self):
+        return f"{self.entity} #{self.object_id} - {self.title}"
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .index import ENTITY_FOR_MODEL, index_instance, unindex_instance
+
+
+# Keep the search index in step with memo, document, ticket and communication writes.
+# Queryset.update() and bulk_create() bypass these; run rebuild_search_index after bulk loads.
+
+
+@receiver(post_save)
+def index_saved(sender, instance, raw=False, **kwargs):
+    if raw or sender not in ENTITY_FOR_MODEL:
+        return
+    index_instance(instance)
+
+
+@receiver(post_delete)
+def unindex_deleted(sender, instance, **kwargs):
+    if sender in ENTITY_FOR_MODEL:
+        unindex_instance(instance)
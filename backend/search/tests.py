@@ -0,0 +1,57 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from communications.models import Communication
+from documents.models import Document
+from memos.models import Memo
+from tickets.models import Ticket
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin@example.com', 'password', role=User.Role.ADMIN)
+        self.faculty = User.objects.create_user('faculty@example.com', 'password', role=User.Role.FACULTY)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(result['type'], result['id']) for result in response.data['results']]
+
+    def test_ranks_title_matches_first_across_types(self):
+        body_match = Memo.objects.create(title='Budget', description='Enrollment figures attached', created_by=self.admin)
+        title_match = Document.objects.create(name='Enrollment summary', file='documents/e.pdf', uploaded_by=self.admin)
+        Communication.objects.create(type=Communication.CommunicationType.MEMO, title='Unrelated', created_by=self.admin)
+
+        self.assertEqual(
+            self.search(q='enrollment'),
+            [('document', title_match.pk), ('memo', body_match.pk)]
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        memo = Memo.objects.create(title='Faculty meeting', created_by=self.admin)
+        memo.title = 'Department assembly'
+        memo.save()
+
+        self.assertEqual(self.search(q='meeting'), [])
+        self.assertEqual(self.search(q='assembly'), [('memo', memo.pk)])
+        memo.delete()
+        self.assertEqual(self.search(q='assembly'), [])
+
+    def test_list_search_matches_id_prefixes(self):
+        ticket = Ticket.objects.create(title='Projector broken', description='Room 101', created_by=self.admin)
+
+        response = self.client.get('/api/tickets/', {'search': ticket.ticket_id[:5]})
+        self.assertEqual([row['id'] for row in response.data['results']], [ticket.pk])
+        response = self.client.get('/api/tickets/', {'search': 'projec'})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_faculty_only_find_their_own_tickets(self):
+        Ticket.objects.create(title='Network outage', description='...', created_by=self.admin)
+        own = Ticket.objects.create(title='Network request', description='...', created_by=self.faculty)
+        self.client.force_authenticate(self.faculty)
+
+        self.assertEqual(self.search(q='network'), [('ticket', own.pk)])
@@ -0,0 +1,77 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.models import User
+from communications.serializers import CommunicationListSerializer
+from documents.serializers import DocumentListSerializer
+from memos.serializers import MemoListSerializer
+from tickets.serializers import TicketListSerializer
+from .backends import ranked_matches
+from .index import ENTITIES
+
+
+RESULT_SERIALIZERS = {
+    'memo': (MemoListSerializer, ('created_by',)),
+    'document': (DocumentListSerializer, ('uploaded_by',)),
+    'ticket': (TicketListSerializer, ('created_by', 'assigned_to')),
+    'communication': (CommunicationListSerializer, ('created_by',)),
+}
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class SearchView(APIView):
+    """
+    Ranked full-text search across memos, documents, tickets and communications.
+
+    GET /api/search/?q=<text>[&types=memo,ticket][&limit=20]
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        types = request.query_params.get('types', None)
+        entities = [t for t in types.split(',') if t] if types else list(ENTITIES)
+        unknown = [t for t in entities if t not in ENTITIES]
+        if unknown:
+            return Response(
+                {'error': f"Unknown types: {', '.join(unknown)}. Choose from {', '.join(ENTITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        matches = ranked_matches(query, entities, limit, visible=self._visible(request.user))
+
+        # One query per type that matched, not per result
+        wanted = {}
+        for entity, object_id, _ in matches:
+            wanted.setdefault(entity, []).append(object_id)
+        data = {}
+        for entity, ids in wanted.items():
+            serializer_class, related = RESULT_SERIALIZERS[entity]
+            objects = list(ENTITIES[entity][0].objects.select_related(*related).filter(pk__in=ids))
+            serialized = serializer_class(objects, many=True, context={'request': request}).data
+            data[entity] = {obj.pk: item for obj, item in zip(objects, serialized)}
+
+        results = [
+            {'type': entity, 'id': object_id, 'rank': rank, 'data': data[entity][object_id]}
+            for entity, object_id, rank in matches
+            if object_id in data.get(entity, {})
+        ]
+        return Response({'query': query, 'count': len(results), 'results': results})
+
+    def _visible(self, user):
+        """Per-type restrictions matching the list endpoints"""
+        if user.role in (User.Role.ADMIN, User.Role.STAFF):
+            return {}
+        # Faculty can only see their own tickets
+        return {'ticket': ENTITIES['ticket'][0].objects.filter(created_by=user)}
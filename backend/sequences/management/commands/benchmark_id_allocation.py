@@ -0,0 +1,131 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection
+from django.db.models import Max
+
+from accounts.models import User
+from sequences.allocator import allocate, highest_number
+from sequences.models import Sequence
+from tickets.models import Ticket
+
+
+BENCHMARK_SEQUENCE = 'benchmark-ticket'
+PREFIXES = {'sequence': 'BSEQ', 'max-scan': 'BMAX'}
+
+
+def _max_scan_id(prefix):
+    """The previous aggregate(Max(...)) allocation, kept here as the baseline."""
+    last_id = Ticket.objects.filter(ticket_id__startswith=f'{prefix}-').aggregate(Max('ticket_id'))['ticket_id__max']
+    try:
+        new_num = int(last_id.split('-')[1]) + 1
+    except (AttributeError, IndexError, ValueError):
+        new_num = 1
+    return f"{prefix}-{new_num:03d}"
+
+
+def _sequence_id(prefix):
+    number = allocate(
+        BENCHMARK_SEQUENCE,
+        initial=lambda: highest_number(
+            Ticket.objects.filter(ticket_id__startswith=f'{prefix}-').values_list('ticket_id', flat=True)
+        ),
+    )
+    return f"{prefix}-{number:03d}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Create tickets from concurrent threads with the sequence allocator and the old "
+        "max-scan allocator, reporting ID collisions and insert latency. Benchmark tickets "
+        "use their own ID prefixes and are deleted afterwards; run against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent writers (default: 8)')
+        parser.add_argument('--per-thread', type=int, default=50, help='Tickets created per thread (default: 50)')
+        parser.add_argument(
+            '--existing', type=int, default=1000,
+            help='Tickets pre-created per mode before timing, to show scan cost (default: 1000)'
+        )
+        parser.add_argument(
+            '--modes', nargs='+', choices=list(PREFIXES), default=list(PREFIXES),
+            help='Allocators to benchmark (default: both)'
+        )
+
+    def handle(self, *args, **options):
+        author, created = User.objects.get_or_create(
+            email='id-benchmark@example.com',
+            defaults={'first_name': 'ID', 'last_name': 'Benchmark', 'is_active': False},
+        )
+        try:
+            self.stdout.write(
+                f"{'mode':>9} {'created':>8} {'collisions':>10} {'errors':>7} "
+                f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'seconds':>8}"
+            )
+            for mode in options['modes']:
+                self._seed(mode, author, options['existing'])
+                self._run(mode, author, options['threads'], options['per_thread'])
+        finally:
+            Ticket.objects.filter(created_by=author).delete()
+            Sequence.objects.filter(name=BENCHMARK_SEQUENCE).delete()
+            if created:
+                author.delete()
+
+    def _seed(self, mode, author, existing):
+        prefix = PREFIXES[mode]
+        Ticket.objects.bulk_create([
+            Ticket(ticket_id=f'{prefix}-{n:03d}', title='Benchmark', description='', created_by=author)
+            for n in range(1, existing + 1)
+        ], batch_size=1000)
+        if mode == 'sequence':
+            Sequence.objects.update_or_create(name=BENCHMARK_SEQUENCE, defaults={'value': existing})
+
+    def _run(self, mode, author, threads, per_thread):
+        prefix = PREFIXES[mode]
+        next_id = _sequence_id if mode == 'sequence' else _max_scan_id
+        latencies = []
+        counts = {'created': 0, 'collisions': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker():
+            close_old_connections()
+            mine = []
+            tally = {'created': 0, 'collisions': 0, 'errors': 0}
+            try:
+                for _ in range(per_thread):
+                    started = time.perf_counter()
+                    try:
+                        Ticket.objects.create(
+                            ticket_id=next_id(prefix), title='Benchmark', description='', created_by=author
+                        )
+                        tally['created'] += 1
+                    except IntegrityError:
+                        tally['collisions'] += 1
+                    except DatabaseError:
+                        tally['errors'] += 1
+                    mine.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(mine)
+                for key, value in tally.items():
+                    counts[key] += value
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f"{mode:>9} {counts['created']:>8} {counts['collisions']:>10} {counts['errors']:>7} "
+            f"{statistics.median(latencies) * 1000 if latencies else 0:>8.2f} {p95 * 1000:>8.2f} "
+            f"{(latencies[-1] if latencies else 0) * 1000:>8.2f} {elapsed:>8.2f}"
+        )
@@ -0,0 +1,11 @@
+from django.db import models
+
+
+class Sequence(models.Model):
+    """Named counter handing out sequential numbers (memo and ticket IDs)"""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0, help_text="Last number handed out")
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
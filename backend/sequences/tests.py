@@ -0,0 +1,49 @@
+from django.test import TestCase
+
+from accounts.models import User
+from memos.models import Memo
+from tickets.models import Ticket
+from .allocator import BlockAllocator, allocate_block
+from .models import Sequence
+
+
+class SequenceAllocationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author@example.com', 'password')
+
+    def test_numbering_continues_past_999(self):
+        Memo.objects.create(memo_id='MEMO-999', title='Old', created_by=self.user)
+        Memo.objects.create(memo_id='MEMO-1000', title='Old', created_by=self.user)
+
+        self.assertEqual(Memo.objects.create(title='New', created_by=self.user).memo_id, 'MEMO-1001')
+        self.assertEqual(Memo.objects.create(title='New', created_by=self.user).memo_id, 'MEMO-1002')
+
+    def test_each_model_has_its_own_sequence(self):
+        first = Ticket.objects.create(title='Ticket', description='...', created_by=self.user)
+        memo = Memo.objects.create(title='Memo', created_by=self.user)
+        second = Ticket.objects.create(title='Ticket', description='...', created_by=self.user)
+
+        self.assertEqual((first.ticket_id, memo.memo_id, second.ticket_id), ('TCK-001', 'MEMO-001', 'TCK-002'))
+        self.assertEqual(Sequence.objects.get(name='ticket').value, 2)
+
+    def test_blocks_do_not_overlap(self):
+        allocator = BlockAllocator('import', block_size=3)
+        taken = allocator.take(5)
+
+        self.assertEqual(taken, [1, 2, 3, 4, 5])
+        self.assertEqual(list(allocate_block('import', 2)), [7, 8])
+        self.assertEqual(allocator.next(), 6)
+
+    def test_explicit_numbers_after_seeding_do_not_clash(self):
+        Memo.objects.create(title='Seeds the sequence', created_by=self.user)
+        Memo.objects.create(memo_id='MEMO-002', title='Admin', created_by=self.user)
+        Memo.objects.create(memo_id='MEMO-003', title='Fixture', created_by=self.user)
+        Ticket.objects.create(title='Ticket', description='...', created_by=self.user)
+        Ticket.objects.create(ticket_id='TCK-002', title='Admin', description='...', created_by=self.user)
+
+        self.assertEqual(Memo.objects.create(title='New', created_by=self.user).memo_id, 'MEMO-004')
+        self.assertEqual(
+            Ticket.objects.create(title='New', description='...', created_by=self.user).ticket_id, 'TCK-003'
+        )
+        self.assertEqual(Sequence.objects.get(name='memo').value, 4)
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
-from django.db.models import Max
+
+from sequences.allocator import allocate, allocate_block, highest_number, reseed
 
 
 class Ticket(models.Model):
@@ -58,29 +59,37 @@ class Ticket(models.Model):
 
     def save(self, *args, **kwargs):
         """Auto-generate ticket_id if not set"""
-        if not self.ticket_id:
-            self.ticket_id = self.generate_ticket_id()
-        super().save(*args, **kwargs)
+        if self.ticket_id:
+            return super().save(*args, **kwargs)
+        self.ticket_id = self.generate_ticket_id()
+        try:
+            with transaction.atomic():
+                return super().save(*args, **kwargs)
+        except IntegrityError:
+            if not Ticket.objects.filter(ticket_id=self.ticket_id).exists():
+                raise
+        # Taken by a row numbered outside the sequence: catch the sequence up and retry
+        reseed('ticket', Ticket.highest_ticket_number)
+        self.ticket_id = self.generate_ticket_id()
+        return super().save(*args, **kwargs)
 
     @staticmethod
     def generate_ticket_id():
         """Generate unique ticket ID in format TCK-001, TCK-002, etc."""
-        # Get the highest ticket number
-        last_ticket = Ticket.objects.aggregate(Max('ticket_id'))
-        last_id = last_ticket.get('ticket_id__max', None)
-        
-        if last_id:
-            # Extract the number part (e.g., "TCK-001" -> 1)
-            try:
-                last_num = int(last_id.split('-')[1])
-                new_num = last_num + 1
-            except (IndexError, ValueError):
-                new_num = 1
-        else:
-            new_num = 1
-        
-        # Format as TCK-XXX with leading zeros
-        return f"TCK-{new_num:03d}"
+        # One atomic update on the 'ticket' sequence row; no scan of existing IDs
+        number = allocate('ticket', initial=Ticket.highest_ticket_number)
+        return f"TCK-{number:03d}"
+
+    @staticmethod
+    def generate_ticket_ids(count):
+        """Reserve `count` consecutive ticket IDs at once, e.g. for bulk imports"""
+        numbers = allocate_block('ticket', count, initial=Ticket.highest_ticket_number)
+        return [f"TCK-{number:03d}" for number in numbers]
+
+    @staticmethod
+    def highest_ticket_number():
+        """Highest number among existing ticket IDs, compared numerically"""
+        return highest_number(Ticket.objects.values_list('ticket_id', flat=True).iterator())
 
     @property
     def creator_email(self):
@@ -1,10 +1,11 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
 from .models import Ticket
 from .serializers import TicketSerializer, TicketListSerializer, TicketCreateSerializer
 from accounts.models import User
+from config.instrumentation import InstrumentedViewMixin
+from search import backends as search_index
 
 
 class TicketPermission(permissions.BasePermission):
@@ -47,7 +48,7 @@ class TicketPermission(permissions.BasePermission):
         return False
 
 
-class TicketViewSet(viewsets.ModelViewSet):
+class TicketViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and managing support tickets.
     
@@ -74,7 +75,7 @@ class TicketViewSet(viewsets.ModelViewSet):
         Filter tickets based on user role.
         """
         user = self.request.user
-        queryset = Ticket.objects.all()
+        queryset = Ticket.objects.select_related('created_by', 'assigned_to')
         
         # Admin can see all tickets
         if user.role == User.Role.ADMIN:
@@ -86,14 +87,10 @@ class TicketViewSet(viewsets.ModelViewSet):
         else:
             queryset = queryset.filter(created_by=user)
         
-        # Search functionality
+        # Full-text search (see search.backends)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(ticket_id__icontains=search)
-            )
+            queryset = search_index.filter_queryset(queryset, 'ticket', search)
         
         # Filter by status
         status_filter = self.request.query_params.get('status', None)
@@ -49,5 +49,22 @@ api.interceptors.request.use(config => {
   return config
 })
 
+// List endpoints are cursor-paginated ({ next, previous, results })
+const listResults = (data) =>
+  Array.isArray(data) ? data : Array.isArray(data?.results) ? data.results : []
 
-export { axios, api }
+// Follow `next` cursors until the list is exhausted
+async function fetchAllPages(url, config = {}) {
+  const items = []
+  let nextUrl = url
+  let nextConfig = config
+  while (nextUrl) {
+    const res = await api.get(nextUrl, nextConfig)
+    items.push(...listResults(res.data))
+    nextUrl = res.data?.next || null
+    nextConfig = {}
+  }
+  return items
+}
+
+export { axios, api, listResults, fetchAllPages }